@@ -6,6 +6,9 @@ import csv
 from datetime import datetime
 import statistics
 
+from results_store import ResultsStore
+from cross_analysis import analyze_all, run_default_baselines, BASELINE_DIR
+
 def find_latest_per_tls(scenario, run_id=None):
     pattern = f"per_tls_{scenario}_*.csv"
     files = glob.glob(pattern)
@@ -45,64 +48,109 @@ def find_generations(scenario, run_id):
             return max(gens) if gens else None
     return None
 
-def analyze(scenario, run_id=None, rounds=None, k_phases_default=8):
-    per_tls_file = find_latest_per_tls(scenario, run_id)
-    if not per_tls_file:
-        print("No se encontró archivo per_tls para ese escenario/run_id.")
-        return
-
-    # si run_id no fue dado, extraerlo del nombre del archivo encontrado
-    if not run_id:
-        basename = os.path.basename(per_tls_file)
-        # formato per_tls_{scenario}_{run_id}.csv
-        parts = basename.split("_")
-        if len(parts) >= 3:
-            run_id = parts[-1].replace(".csv", "")
-
-    resultados_row = find_resultados_for_run(scenario, run_id)
-    gens = rounds if rounds is not None else find_generations(scenario, run_id)
+def load_from_store(db_path, scenario, run_id=None):
+    """
+    NUEVO: misma búsqueda que las funciones find_* pero con consultas por el índice
+    (scenario, run_id) del store SQLite. Retorna (run_id, filas per_tls, fila de resultados, generaciones)
+    o None si el store no tiene datos de ese escenario/run_id.
+    """
+    store = ResultsStore(db_path)
+    try:
+        run_id = run_id or store.latest_run_id(scenario)
+        if not run_id:
+            return None
+        rows = store.per_tls(scenario, run_id)
+        if not rows:
+            return None
+        evaluations = store.evaluations(scenario, run_id)
+        resultados_row = evaluations[0] if evaluations else store.last_evaluation(scenario)
+        generations = store.generations(scenario, run_id)
+        gens = max(int(g["generation"]) for g in generations) if generations else None
+        return run_id, rows, resultados_row, gens
+    finally:
+        store.close()
+
+
+def analyze(scenario, run_id=None, rounds=None, k_phases_default=8, db_path="resultados.sqlite", bytes_per_value=8):
+    loaded = load_from_store(db_path, scenario, run_id) if db_path and os.path.exists(db_path) else None
+    if loaded is not None:
+        run_id, rows, resultados_row, gens = loaded
+    else:
+        # Sin store (o corrida hecha con --no-results-db): lectura de los CSV
+        per_tls_file = find_latest_per_tls(scenario, run_id)
+        if not per_tls_file:
+            print("No se encontró archivo per_tls para ese escenario/run_id.")
+            return
+
+        # si run_id no fue dado, extraerlo del nombre del archivo encontrado
+        if not run_id:
+            basename = os.path.basename(per_tls_file)
+            # formato per_tls_{scenario}_{run_id}.csv
+            parts = basename.split("_")
+            if len(parts) >= 3:
+                run_id = parts[-1].replace(".csv", "")
+
+        resultados_row = find_resultados_for_run(scenario, run_id)
+        gens = find_generations(scenario, run_id)
+
+        # leer per_tls file
+        rows = []
+        with open(per_tls_file, newline="") as fh:
+            reader = csv.DictReader(fh)
+            for r in reader:
+                rows.append(r)
+
+    gens = rounds if rounds is not None else gens
     gens = gens if gens is not None else 15  # fallback
 
-    # leer per_tls file
-    rows = []
-    with open(per_tls_file, newline="") as fh:
-        reader = csv.DictReader(fh)
-        for r in reader:
-            rows.append(r)
+    # NUEVO: corridas de online_control.py: latencia de decisión real por TLS (no el eval_time global)
+    latency = {}
+    online_file = f"online_{scenario}_{run_id}.csv"
+    if os.path.exists(online_file):
+        with open(online_file, newline="") as fh:
+            latency = {r["tls"]: r["latency_p95_ms"] for r in csv.DictReader(fh)}
 
     # construir la tabla solicitada
     table = []
     for r in rows:
         tls = r.get("tls")
-        avg_queue = float(r.get("avg_queue_tls", 0))
-        avg_wait = float(r.get("avg_wait_tls", 0))
-        vehicle_count = float(r.get("vehicle_count_tls", 0))
-        flow_tls = float(r.get("flow_tls", 0))
+        avg_queue = float(r.get("avg_queue_tls") or 0)
+        avg_wait = float(r.get("avg_wait_tls") or 0)
+        vehicle_count = float(r.get("vehicle_count_tls") or 0)
+        flow_tls = float(r.get("flow_tls") or 0)
         road_rage = avg_queue * 10  # misma fórmula del sistema
 
         # Tiempo de inferencia: usamos eval_time global (no por TLS)
-        eval_time = float(resultados_row.get("eval_time", 0)) if resultados_row else None
+        eval_time = float(resultados_row.get("eval_time") or 0) if resultados_row else None
 
-        # Ancho de banda estimado (por TLS): 2 * R * K * 8 bytes (up + down)
-        K = None
-        # intentar inferir K (número de fases) mirando el genoma no está en este CSV; fallback:
-        K = k_phases_default
+        # Ancho de banda estimado (por TLS): 2 * R * K * bytes_per_value (up + down)
+        # NUEVO: 8 = float64; con el formato binario de phase_codec.py cada fase ocupa 1 byte
+        # NUEVO: K = número de fases del programa aplicado a este TLS (columna phase_durations);
+        # los CSV anteriores no la tienen: fallback a --k
+        durations = r.get("phase_durations")
+        K = len(durations.split(";")) if durations else k_phases_default
 
-        upstream_per_round_bytes = K * 8  # bytes (float64)
+        upstream_per_round_bytes = K * bytes_per_value  # bytes
         total_tls_bytes = 2 * gens * upstream_per_round_bytes  # up+down * R
 
-        table.append({
+        row = {
             "tls": tls,
             "Tiempo de tapón (avg_queue)": round(avg_queue, 3),
             "Road rage": round(road_rage, 3),
             "Flujo vehicular por segundo": round(flow_tls, 6),
             "Tiempo de inferencia (s) [global]": round(eval_time, 6) if eval_time is not None else None,
             "Ancho de banda estimado (bytes, total por TLS)": int(total_tls_bytes)
-        })
+        }
+        if latency:
+            value = latency.get(tls)
+            row["Latencia de decisión p95 (ms)"] = round(float(value), 4) if value else None
+        table.append(row)
 
     # guardar tabla como CSV y mostrar
     out_csv = f"table_{scenario}_{run_id}.csv"
     fieldnames = ["tls", "Tiempo de tapón (avg_queue)", "Road rage", "Flujo vehicular por segundo", "Tiempo de inferencia (s) [global]", "Ancho de banda estimado (bytes, total por TLS)"]
+    if latency:
+        fieldnames.append("Latencia de decisión p95 (ms)")
     with open(out_csv, "w", newline="") as fh:
         writer = csv.DictWriter(fh, fieldnames=fieldnames)
         writer.writeheader()
@@ -116,10 +164,35 @@ def analyze(scenario, run_id=None, rounds=None, k_phases_default=8):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--scenario", type=str, required=True, help="Nombre del escenario (ej. RUSH)")
+    parser.add_argument("--scenario", type=str, default=None, help="Nombre del escenario (ej. RUSH)")
     parser.add_argument("--run_id", type=str, default=None, help="run_id (opcional). Si no se da, se toma el más reciente")
     parser.add_argument("--rounds", type=int, default=None, help="Número de rondas/generaciones (opcional). Si no se da, se intenta leer summary file")
     parser.add_argument("--k", type=int, default=8, help="Número de fases (K) para estimación de ancho de banda (por TLS)")
+    parser.add_argument("--bytes-per-value", type=int, default=8,
+                        help="Bytes por fase en la estimación de ancho de banda (8 = float64, 1 = phase_codec uint8)")
+    parser.add_argument("--db", type=str, default="resultados.sqlite", help="Store SQLite de resultados (si no existe se leen los CSV)")
+    parser.add_argument("--all", action="store_true",
+                        help="Análisis de todas las corridas/escenarios de --dir (agregados, percentiles, convergencia)")
+    parser.add_argument("--dir", type=str, default=".", help="Carpeta con los CSV para --all")
+    parser.add_argument("--baseline", type=str, nargs="*", default=None, metavar="ESCENARIO=FITNESS",
+                        help="Fitness del programa por defecto (default: último baseline_default_*.csv)")
+    parser.add_argument("--default-baselines", action="store_true",
+                        help="Con --all, evaluar antes el programa propio de cada red (cross_analysis.run_default_baselines)")
+    parser.add_argument("--baseline-horizon", type=float, default=None,
+                        help="Horizonte de las evaluaciones de --default-baselines (el mismo de las corridas del GA)")
+    parser.add_argument("--no-cache", action="store_true", help="Con --all, re-parsear los CSV sin usar el sidecar .npz")
     args = parser.parse_args()
 
-    analyze(args.scenario, run_id=args.run_id, rounds=args.rounds, k_phases_default=args.k)
+    if args.all:
+        baselines = None
+        if args.default_baselines:
+            run_default_baselines(horizon=args.baseline_horizon, outdir=os.path.join(args.dir, BASELINE_DIR))
+        if args.baseline is not None:
+            baselines = {k: float(v) for k, v in (b.split("=", 1) for b in args.baseline)}
+        analyze_all(args.dir, baselines=baselines, use_cache=not args.no_cache)
+        raise SystemExit(0)
+    if not args.scenario:
+        parser.error("--scenario es obligatorio (o usar --all)")
+
+    analyze(args.scenario, run_id=args.run_id, rounds=args.rounds, k_phases_default=args.k, db_path=args.db,
+            bytes_per_value=args.bytes_per_value)
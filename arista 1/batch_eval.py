@@ -0,0 +1,301 @@
+# batch_eval.py
+import gzip
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import quoteattr
+
+from scenarios import net_index
+from sim_eval import _fitness_terms, _write_results
+
+# Modo de evaluación sin TraCI (evaluate_genome(..., mode="batch")):
+#   1. el programa TLS del genoma se escribe como additional (mismo formato que 1_arista_semaforo.xml)
+#   2. se definen laneData y edgeData (un solo intervalo, restringidos a las aristas controladas) y
+#      un E2 (laneAreaDetector) de período 1 por carril controlado
+#   3. SUMO corre de principio a fin sin que Python intervenga en cada paso
+#   4. las salidas se leen con iterparse (incremental, memoria constante)
+# Las métricas salen de contadores de los detectores, no de IDs de vehículos:
+#   queue = waitingTime del laneData (segundos-vehículo con v < 0.1 m/s: la suma por paso de
+#           lane.getLastStepHaltingNumber)
+#   wait  = suma por paso de haltingDurationSum - intervalHaltingDurationSum del E2 (las detenciones
+#           en curso, como lane.getWaitingTime; la resta descuenta las que terminaron en el paso)
+#   vehicle_count = entered + departed del edgeData en las aristas del TLS
+#   total_veh = llegadas del último paso (simulation.getArrivedNumber al cerrar), desde el tripinfo
+# Los valores quedan cerca de los del modo TraCI pero no son idénticos (el laneData reparte el paso en
+# que un vehículo cruza el borde del carril, el E2 cuenta lo que ocupa el detector y no solo el frente,
+# y con snapshot los detectores no ven a los vehículos que ya estaban ni lo que ya llevaban esperando),
+# por eso el modo entra en la clave del cache.
+
+# Velocidad de detención de SUMO (la misma que usa getLastStepHaltingNumber)
+HALTING_SPEED = 0.1
+BATCH_PROGRAM_ID = "ga"
+
+
+def _net_topology(net_file):
+    """
+    Topología desde el índice cacheado de la red (scenarios.net_index): {tls: (programa original,
+    carriles controlados)} y el índice. Los carriles siguen el orden de linkIndex, con duplicados,
+    igual que traci.trafficlight.getControlledLanes.
+    """
+    index = net_index(net_file)
+    topology = {tls: (program, tuple(program["lanes"])) for tls, program in index["tls"].items()}
+    return topology, index
+
+
+def _first_switch(program, begin=0.0):
+    """
+    Fase del programa original de la red en el instante begin y segundos hasta su cambio.
+    Retorna (índice de fase, segundos).
+    """
+    durations = [float(phase[0]) for phase in program["phases"]]
+    pos = (begin - float(program["offset"] or 0)) % sum(durations)
+    for phase_index, dur in enumerate(durations):
+        if pos < dur:
+            return phase_index, dur - pos
+        pos -= dur
+    return 0, durations[0]
+
+
+def _read_state(state_file):
+    """
+    Instante del snapshot y estado de cada TLS guardado en él: (begin, {tls: (fase, instante del
+    próximo cambio)}). Los tiempos del snapshot están en milisegundos salvo el del propio snapshot.
+    """
+    opener = gzip.open if state_file.endswith(".gz") else open
+    begin = 0.0
+    tls_state = {}
+    with opener(state_file, "rb") as f:
+        for _, elem in ET.iterparse(f, events=("start",)):
+            if elem.tag == "snapshot":
+                begin = float(elem.get("time"))
+            elif elem.tag == "tlLogic":
+                tls_state[elem.get("id")] = (int(elem.get("phase")), int(elem.get("until")) / 1000.0)
+    return begin, tls_state
+
+
+def _write_tls_program(path, topology, genome, durations=None, begin=0.0, tls_state=None):
+    """
+    Additional con el programa TLS del genoma (misma regla de duraciones que el modo TraCI).
+    Retorna {tls: [duraciones aplicadas]}.
+    En modo TraCI setCompleteRedYellowGreenDefinition cambia las fases pero conserva el cambio de fase
+    que ya estaba agendado: la fase en curso dura lo que le quedaba y desde la siguiente rige el
+    genoma. Para reproducirlo, cada TLS sigue con su programa original y un WAUT lo pasa en ese
+    instante al programa del genoma, con un offset que lo deja justo al inicio de la fase siguiente.
+    Los instantes del WAUT son relativos a su refTime (begin).
+    begin/tls_state: instante y estado de los TLS del snapshot cargado (ver _read_state); sin
+    snapshot la fase en curso sale del programa original.
+    """
+    applied = {}
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<additional>\n")
+        for tls, (program, _) in topology.items():
+            applied[tls] = []
+            for phase_index in range(len(program["phases"])):
+                if durations is not None:
+                    dur = max(1, durations[tls][phase_index])
+                else:
+                    dur = max(1, int(genome[phase_index % len(genome)]))
+                applied[tls].append(dur)
+            if tls_state and tls in tls_state:
+                phase, switch = tls_state[tls]
+            else:
+                phase, remaining = _first_switch(program, begin)
+                switch = begin + remaining
+            # Posición del ciclo del genoma al inicio de la fase siguiente a la que está en curso
+            cycle = sum(applied[tls])
+            offset = (switch - sum(applied[tls][:phase + 1])) % cycle
+            f.write(f'    <tlLogic id={quoteattr(tls)} type="{program["type"]}" '
+                    f'programID="{BATCH_PROGRAM_ID}" offset="{offset:g}">\n')
+            for phase_index, (_, state, _, _) in enumerate(program["phases"]):
+                f.write(f'        <phase duration="{applied[tls][phase_index]:g}" state="{state}"/>\n')
+            f.write("    </tlLogic>\n")
+            waut = quoteattr(f"{BATCH_PROGRAM_ID}_{tls}")
+            f.write(f'    <WAUT id={waut} refTime="{begin:g}" startProg={quoteattr(program["program_id"])}>\n'
+                    f'        <wautSwitch time="{switch - begin:g}" to="{BATCH_PROGRAM_ID}"/>\n'
+                    f'    </WAUT>\n'
+                    f'    <wautJunction wautID={waut} junctionID={quoteattr(tls)}/>\n')
+        f.write("</additional>\n")
+    return applied
+
+
+def _write_detectors(path, lanes, index, lanedata_file, edgedata_file, e2_file):
+    """
+    Additional con el laneData y el edgeData (un intervalo, solo las aristas de los carriles dados) y
+    un E2 de período 1 por carril que cubre el carril completo.
+    """
+    edges = quoteattr(" ".join(sorted({index["lanes"][lane]["edge"] for lane in lanes})))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<additional>\n")
+        f.write(f'    <laneData id="{BATCH_PROGRAM_ID}_lanes" file={quoteattr(lanedata_file)} edges={edges} '
+                f'excludeEmpty="true" writeAttributes="waitingTime"/>\n')
+        f.write(f'    <edgeData id="{BATCH_PROGRAM_ID}_edges" file={quoteattr(edgedata_file)} edges={edges} '
+                f'excludeEmpty="true" writeAttributes="entered departed"/>\n')
+        for lane in sorted(lanes):
+            f.write(f'    <laneAreaDetector id={quoteattr(lane)} lane={quoteattr(lane)} pos="0" '
+                    f'endPos="{index["lanes"][lane]["length"]:g}" period="1" file={quoteattr(e2_file)} '
+                    f'speedThreshold="{HALTING_SPEED:g}" timeThreshold="0"/>\n')
+        f.write("</additional>\n")
+
+
+def _parse_meandata(path, tag, attributes):
+    """Suma por id (carril o arista) de los atributos dados en todos los intervalos de un meandata."""
+    acc = {}
+    for _, elem in ET.iterparse(path):
+        if elem.tag == tag:
+            values = acc.setdefault(elem.get("id"), [0.0] * len(attributes))
+            for i, attr in enumerate(attributes):
+                values[i] += float(elem.get(attr, 0))
+        elif elem.tag == "interval":
+            elem.clear()
+    return acc
+
+
+def _parse_e2_waiting(path):
+    """Suma por carril de haltingDurationSum - intervalHaltingDurationSum de cada intervalo (paso) del E2."""
+    acc = {}
+    for _, elem in ET.iterparse(path):
+        if elem.tag == "interval":
+            lane = elem.get("id")
+            acc[lane] = (acc.get(lane, 0.0) + float(elem.get("haltingDurationSum"))
+                         - float(elem.get("intervalHaltingDurationSum")))
+            elem.clear()
+    return acc
+
+
+def _parse_tripinfo_last_arrivals(path, end_time, dt=1.0):
+    """
+    Vehículos que llegaron en el último paso (lo que reporta getArrivedNumber al cerrar en modo TraCI).
+    El tripinfo registra la llegada con el tiempo de inicio del paso: end_time - dt.
+    """
+    arrived = 0
+    for _, elem in ET.iterparse(path):
+        if elem.tag == "tripinfo" and float(elem.get("arrival", -1)) >= end_time - dt - 1e-6:
+            arrived += 1
+        elem.clear()
+    return arrived
+
+
+def _parse_statistics(path):
+    root = ET.parse(path).getroot()
+    perf = root.find("performance")
+    veh = root.find("vehicles")
+    return {
+        "begin": float(perf.get("begin")),
+        "end": float(perf.get("end")),
+        "pending": int(veh.get("running", 0)) + int(veh.get("waiting", 0)),
+    }
+
+
+def run_batch_evaluation(genome, net_file, route_file, scenario, run_id, sumo_binary, logfile, start_eval,
+                         horizon=None, drain=0, state_file=None, store=None, durations=None, seed=None):
+    """
+    Evalúa el genoma con una corrida de SUMO sin TraCI. Escribe las mismas filas/columnas que el modo
+    TraCI y retorna (fitness, status). Si SUMO termina con error se lanza RuntimeError.
+    durations: duraciones por TLS del layout "topology" (None = regla genome[i % len(genome)]).
+    """
+    topology, index = _net_topology(net_file)
+    controlled = {lane for _, lanes in topology.values() for lane in lanes}
+    workdir = tempfile.mkdtemp(prefix=f"batch_{scenario}_")
+    try:
+        tls_file = os.path.join(workdir, "tls_program.add.xml")
+        detectors_file = os.path.join(workdir, "detectors.add.xml")
+        lanedata_file = os.path.join(workdir, "lanedata.xml")
+        edgedata_file = os.path.join(workdir, "edgedata.xml")
+        e2_file = os.path.join(workdir, "e2.xml")
+        tripinfo_file = os.path.join(workdir, "tripinfo.xml")
+        stats_file = os.path.join(workdir, "statistics.xml")
+        # Con snapshot, el cambio de fase agendado de cada TLS sale del estado guardado
+        begin, tls_state = _read_state(state_file) if state_file is not None else (0.0, None)
+        applied = _write_tls_program(tls_file, topology, genome, durations, begin, tls_state)
+        _write_detectors(detectors_file, controlled, index, lanedata_file, edgedata_file, e2_file)
+
+        cmd = [
+            sumo_binary,
+            "-n", net_file,
+            "-r", route_file,
+            "-a", f"{tls_file},{detectors_file}",
+            "--tripinfo-output", tripinfo_file,
+            "--statistic-output", stats_file,
+            "--no-step-log",
+            "--log-file", logfile
+        ]
+        if "sumo-gui" in os.path.basename(sumo_binary):
+            cmd += ["--start", "--quit-on-end"]
+        if state_file is not None:
+            cmd += ["--load-state", state_file]
+        if horizon is not None:
+            cmd += ["--end", str(horizon + drain)]
+        if seed is not None:
+            cmd += ["--seed", str(seed)]
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if proc.returncode != 0:
+            raise RuntimeError(f"SUMO terminó con código {proc.returncode}")
+
+        stats = _parse_statistics(stats_file)
+        lanes_halting = _parse_meandata(lanedata_file, "lane", ("waitingTime",))
+        edges_count = _parse_meandata(edgedata_file, "edge", ("entered", "departed"))
+        lanes_wait = _parse_e2_waiting(e2_file)
+        end_time = stats["end"]
+        total_veh = _parse_tripinfo_last_arrivals(tripinfo_file, end_time)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # Misma normalización que el modo TraCI: pasos de 1 s desde el inicio (o desde el snapshot)
+    total_steps = int(round(end_time - stats["begin"]))
+    norm_steps = int(round(horizon + drain - stats["begin"])) if horizon is not None else total_steps
+    status = "truncated" if horizon is not None and stats["pending"] > 0 else "ok"
+
+    total_queue = 0
+    total_wait = 0
+    tls_rows = []
+    # Misma convención que el modo TraCI (getTime() / 1000)
+    sim_time = end_time / 1000.0
+    steps = norm_steps if norm_steps > 0 else 1
+    for tls, (_, lanes) in topology.items():
+        # queue/wait suman sobre la lista con duplicados, igual que el loop por paso del modo TraCI;
+        # los vehículos se cuentan una vez por arista (un cambio de carril no los cuenta de nuevo)
+        queue = sum(lanes_halting.get(lane, [0.0])[0] for lane in lanes)
+        wait = sum(lanes_wait.get(lane, 0.0) for lane in lanes)
+        edges = {index["lanes"][lane]["edge"] for lane in lanes}
+        vehicle_count = int(sum(sum(edges_count.get(edge, [0.0, 0.0])) for edge in edges))
+        total_queue += queue
+        total_wait += wait
+        tls_rows.append({
+            "scenario": scenario,
+            "run_id": run_id,
+            "tls": tls,
+            "avg_queue_tls": queue / steps,
+            "avg_wait_tls": wait / steps,
+            "vehicle_count_tls": vehicle_count,
+            "flow_tls": vehicle_count / sim_time if sim_time > 0 else 0,
+            "fidelity": "full",
+            "phase_durations": ";".join(str(d) for d in applied[tls]),
+            "seed": seed
+        })
+
+    avg_queue, avg_wait, jam_penalty, avg_travel, fitness = _fitness_terms(
+        total_queue, total_wait, norm_steps, len(topology)
+    )
+    flow = total_veh / sim_time if sim_time > 0 else 0
+
+    _write_results(scenario, run_id, {
+        "scenario": scenario,
+        "run_id": run_id,
+        "fitness": fitness,
+        "avg_travel": avg_travel,
+        "avg_wait": avg_wait,
+        "avg_queue": avg_queue,
+        "jam_penalty": jam_penalty,
+        "flow": flow,
+        "eval_time": time.time() - start_eval,
+        "sim_time_sec": sim_time,
+        "total_veh": total_veh,
+        "status": status,
+        "fidelity": "full",
+        "seed": seed
+    }, tls_rows, store, genome)
+
+    return fitness, status
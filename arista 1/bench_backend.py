@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# bench_backend.py
+import argparse
+import csv
+import os
+import time
+from datetime import datetime
+
+from scenarios import discover_scenarios
+from sim_eval import evaluate_genome, resolve_backend
+
+# Benchmark traci vs libsumo: evalúa el mismo genoma fijo en cada arista con ambos backends
+# y reporta el tiempo de evaluación y el speedup. Los CSV/logs de cada evaluación se escriben
+# en --outdir para no mezclarlos con los resultados del GA.
+
+DEFAULT_GENOME = [38, 3, 6, 3, 37, 3, 30, 30]
+
+
+def run_benchmark(aristas=None, backends=("traci", "libsumo"), repeat=1, genome=None, outdir="bench_backend_out"):
+    genome = genome or DEFAULT_GENOME
+    scenarios = discover_scenarios()
+    if aristas:
+        scenarios = {k: v for k, v in scenarios.items() if v["arista"] in aristas}
+
+    run_id = datetime.now().strftime("%Y%m%dT%H%M%S")
+    os.makedirs(outdir, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(outdir)
+    rows = []
+    try:
+        for name, sc in scenarios.items():
+            times = {}
+            for backend in backends:
+                used = resolve_backend(backend, "sumo")
+                # Sin libsumo resolve_backend cae a traci: no se mide dos veces ni se reporta un speedup falso
+                if used in times:
+                    continue
+                elapsed = []
+                for rep in range(repeat):
+                    t0 = time.perf_counter()
+                    fitness = evaluate_genome(genome, sc["net"], sc["route"], f"bench_{name}_{used}",
+                                              f"{run_id}_{rep}", "sumo", backend=used)
+                    elapsed.append(time.perf_counter() - t0)
+                times[used] = min(elapsed)
+                rows.append({
+                    "scenario": name,
+                    "backend": used,
+                    "repeat": repeat,
+                    "best_eval_time": times[used],
+                    "mean_eval_time": sum(elapsed) / len(elapsed),
+                    "fitness": fitness,
+                })
+            if "traci" in times and "libsumo" in times and times["libsumo"] > 0:
+                print(f"{name}: traci={times['traci']:.2f}s libsumo={times['libsumo']:.2f}s "
+                      f"speedup={times['traci'] / times['libsumo']:.2f}x")
+    finally:
+        os.chdir(cwd)
+
+    out_csv = os.path.join(outdir, f"bench_backend_{run_id}.csv")
+    with open(out_csv, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["scenario", "backend", "repeat", "best_eval_time",
+                                               "mean_eval_time", "fitness"])
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Benchmark guardado en {out_csv}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--aristas", type=int, nargs="*", default=None, help="Aristas a medir (default: todas)")
+    parser.add_argument("--repeat", type=int, default=1, help="Repeticiones por backend (se reporta el mínimo)")
+    parser.add_argument("--outdir", type=str, default="bench_backend_out", help="Carpeta para CSV/logs del benchmark")
+    args = parser.parse_args()
+
+    run_benchmark(aristas=args.aristas, repeat=args.repeat, outdir=args.outdir)
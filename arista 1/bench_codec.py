@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# bench_codec.py
+import argparse
+import csv
+import json
+import os
+import random
+import struct
+import time
+from datetime import datetime
+
+from scenarios import discover_scenarios
+from federated import tls_phase_counts, expand_genome
+from phase_codec import encode_update, decode_update, _quantize
+
+# Benchmark del formato de las actualizaciones del runner federado: bytes por ronda y tiempos de
+# encode/decode de cada variante de phase_codec frente a los baselines float64 (lo que supone la
+# estimación de analyze_results.py) y JSON (el formato por defecto de federated.py).
+# Las rondas se generan con la estructura de fases real de cada arista: cada cliente parte de un
+# genoma al azar y en cada ronda muta algunos genes (como el mejor individuo de un GA local).
+
+
+def _float64(params, round_index, weight, reference, tls_order):
+    return b"".join(struct.pack(f"!{len(v)}d", *[float(x) for x in v]) for v in params.values())
+
+
+def _float64_decode(data, reference, tls_order, phase_counts):
+    values = struct.unpack(f"!{len(data) // 8}d", data)
+    params, pos = {}, 0
+    for tls in tls_order:
+        params[tls] = list(values[pos:pos + phase_counts[tls]])
+        pos += phase_counts[tls]
+    return params
+
+
+def _json(params, round_index, weight, reference, tls_order):
+    return json.dumps({"type": "update", "round": round_index, "n_samples": weight, "params": params},
+                      separators=(",", ":")).encode("utf-8")
+
+
+VARIANTS = {
+    "float64": (_float64, lambda data, ref, order, counts: _float64_decode(data, ref, order, counts)),
+    "json": (_json, lambda data, ref, order, counts: json.loads(data.decode("utf-8"))["params"]),
+    "uint8_ids": (lambda p, r, w, ref, order: encode_update(p, r, w),
+                  lambda data, ref, order, counts: decode_update(data)[2]),
+    "uint8": (lambda p, r, w, ref, order: encode_update(p, r, w, tls_order=order),
+              lambda data, ref, order, counts: decode_update(data, tls_order=order)[2]),
+    "uint8_zlib": (lambda p, r, w, ref, order: encode_update(p, r, w, compress=True, tls_order=order),
+                   lambda data, ref, order, counts: decode_update(data, tls_order=order)[2]),
+    "delta": (lambda p, r, w, ref, order: encode_update(p, r, w, reference=ref, delta=True, tls_order=order),
+              lambda data, ref, order, counts: decode_update(data, ref, order)[2]),
+    "delta_zlib": (lambda p, r, w, ref, order: encode_update(p, r, w, reference=ref, delta=True, compress=True,
+                                                             tls_order=order),
+                   lambda data, ref, order, counts: decode_update(data, ref, order)[2]),
+}
+
+
+def _rounds(phase_counts, rounds, rng, mutation_rate=0.25, sigma=5):
+    """Secuencia de parámetros por TLS de un cliente: un genoma inicial y mutaciones gaussianas por ronda."""
+    genome = [rng.randint(10, 60) for _ in range(8)]
+    sequence = []
+    for _ in range(rounds):
+        genome = [max(10, min(60, int(round(g + rng.gauss(0, sigma))))) if rng.random() < mutation_rate else g
+                  for g in genome]
+        sequence.append(expand_genome(genome, phase_counts))
+    return sequence
+
+
+def run_codec_benchmark(aristas=None, rounds=15, repeat=200, seed=0, outdir="bench_codec_out"):
+    scenarios = discover_scenarios()
+    if aristas:
+        scenarios = {k: v for k, v in scenarios.items() if v["arista"] in aristas}
+    rng = random.Random(seed)
+    clients = []
+    for name, sc in scenarios.items():
+        counts = tls_phase_counts(sc["net"])
+        clients.append((name, counts, list(counts), _rounds(counts, rounds, rng)))
+
+    rows = []
+    for variant, (encode, decode) in VARIANTS.items():
+        total_bytes = 0
+        enc_time = dec_time = 0.0
+        n_messages = 0
+        for name, counts, order, sequence in clients:
+            reference = None
+            for r, params in enumerate(sequence, start=1):
+                t0 = time.perf_counter()
+                for _ in range(repeat):
+                    data = encode(params, r, 100, reference, order)
+                t1 = time.perf_counter()
+                for _ in range(repeat):
+                    decoded = decode(data, reference, order, counts)
+                t2 = time.perf_counter()
+                if {k: _quantize(v) for k, v in decoded.items()} != {k: _quantize(v) for k, v in params.items()}:
+                    raise AssertionError(f"{variant}: decode distinto del original ({name}, ronda {r})")
+                enc_time += (t1 - t0) / repeat
+                dec_time += (t2 - t1) / repeat
+                total_bytes += len(data)
+                n_messages += 1
+                reference = params
+        rows.append({
+            "variant": variant,
+            "clients": len(clients),
+            "rounds": rounds,
+            "bytes_per_round": total_bytes / rounds,
+            "bytes_per_message": total_bytes / n_messages,
+            "encode_us": 1e6 * enc_time / n_messages,
+            "decode_us": 1e6 * dec_time / n_messages,
+        })
+
+    base = rows[0]["bytes_per_round"]
+    for row in rows:
+        row["ratio_vs_float64"] = row["bytes_per_round"] / base if base else 0.0
+        print(f"{row['variant']:>10}: {row['bytes_per_round']:8.1f} B/ronda ({row['ratio_vs_float64']:.3f}x float64) "
+              f"encode={row['encode_us']:.1f}us decode={row['decode_us']:.1f}us")
+
+    os.makedirs(outdir, exist_ok=True)
+    out_csv = os.path.join(outdir, f"bench_codec_{datetime.now().strftime('%Y%m%dT%H%M%S')}.csv")
+    with open(out_csv, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Benchmark de codec -> {out_csv}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--aristas", type=int, nargs="*", default=None, help="Aristas a incluir (default: todas)")
+    parser.add_argument("--rounds", type=int, default=15, help="Rondas simuladas por cliente")
+    parser.add_argument("--repeat", type=int, default=200, help="Repeticiones por mensaje para medir tiempos")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--outdir", type=str, default="bench_codec_out")
+    args = parser.parse_args()
+    run_codec_benchmark(aristas=args.aristas, rounds=args.rounds, repeat=args.repeat, seed=args.seed,
+                        outdir=args.outdir)
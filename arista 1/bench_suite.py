@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# bench_suite.py
+import argparse
+import csv
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from scenarios import discover_scenarios
+from sim_eval import evaluate_genome, resolve_backend, _logfile_name, _append_rows
+from ga_opt import run_ga_optimization
+from bench_backend import DEFAULT_GENOME
+
+# Suite de benchmark reproducible sobre las aristas 1..5 para saber si un cambio en sim_eval.py o
+# ga_opt.py hizo más rápidas (o más lentas) las evaluaciones. Por arista se mide:
+#   - genomas fijos (FIXED_GENOMES), repeat veces cada uno (se reporta la repetición más rápida):
+#     wall time, evaluaciones/s, segundos simulados por segundo real y el bloque "Performance:" del
+#     log de SUMO (Duration, TraCI-Duration, Real time factor, UPS)
+#   - un GA corto con semilla fija (random.seed(42) de run_ga_optimization, sin cache): wall time y
+#     evaluaciones/s
+# Todas las corridas usan un horizonte fijo para que el costo no dependa del genoma.
+# Cada corrida agrega sus filas a bench_history.csv (con commit y host) y las compara con
+# bench_baseline.json: una métrica de velocidad que cae más de tolerance respecto de la línea base,
+# o un fitness distinto (la simulación cambió), queda en la columna "regression".
+
+FIXED_GENOMES = {
+    "default": DEFAULT_GENOME,
+    "uniform": [30] * 8,
+}
+
+HISTORY_FIELDS = ["timestamp", "commit", "host", "backend", "horizon", "scenario", "kind", "repeat", "wall_s",
+                  "evals", "evals_per_sec", "sim_s", "sim_s_per_wall_s", "sumo_duration_s", "traci_duration_s",
+                  "real_time_factor", "ups", "fitness", "regression"]
+
+# Métricas donde más es mejor (las que se comparan contra la línea base)
+SPEED_METRICS = ("evals_per_sec", "sim_s_per_wall_s", "real_time_factor", "ups")
+
+# Líneas del bloque "Performance:" del log de SUMO -> columna
+_PERF_KEYS = {
+    "Duration": "sumo_duration_s",
+    "TraCI-Duration": "traci_duration_s",
+    "Real time factor": "real_time_factor",
+    "UPS": "ups",
+}
+
+
+def _seconds(value):
+    # SUMO imprime las duraciones como "88.80s" (versiones viejas: "88796ms")
+    if value.endswith("ms"):
+        return float(value[:-2]) / 1000.0
+    return float(value.rstrip("s"))
+
+
+def parse_performance(logfile):
+    """Bloque "Performance:" y tiempo final de un log de SUMO. Retorna {columna: valor} (vacío si no hay)."""
+    perf = {}
+    if not os.path.exists(logfile):
+        return perf
+    with open(logfile, encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            m = re.match(r"Simulation ended at time: (\d+(?:\.\d+)?)", line)
+            if m:
+                perf["sim_s"] = float(m.group(1))
+                continue
+            m = re.match(r"\s+([A-Za-z -]+): ([\d.]+m?s?)\s*$", line)
+            if m and m.group(1) in _PERF_KEYS:
+                key = _PERF_KEYS[m.group(1)]
+                perf[key] = _seconds(m.group(2)) if key.endswith("_s") else float(m.group(2))
+    return perf
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _baseline_key(row):
+    return f"{row['scenario']}|{row['kind']}|{row['backend']}|{row['horizon']}"
+
+
+def check_regressions(rows, baseline, tolerance=0.15):
+    """Marca en row["regression"] las métricas que empeoraron respecto de la línea base."""
+    for row in rows:
+        ref = baseline.get(_baseline_key(row))
+        flags = []
+        if ref:
+            for metric in SPEED_METRICS:
+                if row.get(metric) is not None and ref.get(metric) and row[metric] < ref[metric] * (1 - tolerance):
+                    flags.append(f"{metric}:{row[metric] / ref[metric]:.2f}x")
+            if ref.get("fitness") is not None and row.get("fitness") is not None and \
+                    abs(row["fitness"] - ref["fitness"]) > 1e-6 * max(1.0, abs(ref["fitness"])):
+                flags.append("fitness")
+        row["regression"] = ";".join(flags)
+    return [row for row in rows if row["regression"]]
+
+
+def _bench_genome(name, sc, kind, genome, backend, horizon, repeat, run_id):
+    best = None
+    for rep in range(repeat):
+        rep_id = f"{run_id}_{kind}_{rep}"
+        t0 = time.perf_counter()
+        fitness = evaluate_genome(genome, sc["net"], sc["route"], f"bench_{name}", rep_id, "sumo",
+                                  backend=backend, horizon=horizon)
+        wall = time.perf_counter() - t0
+        if best is None or wall < best[0]:
+            best = (wall, fitness, parse_performance(_logfile_name(f"bench_{name}", rep_id)))
+    wall, fitness, perf = best
+    sim_s = perf.get("sim_s")
+    return dict(perf, kind=f"genome:{kind}", wall_s=wall, evals=1, evals_per_sec=1 / wall if wall > 0 else None,
+                sim_s_per_wall_s=sim_s / wall if sim_s and wall > 0 else None, fitness=fitness)
+
+
+def _bench_ga(name, sc, backend, horizon, pop, gens, run_id):
+    scenario = f"bench_{name}"
+    ga_run_id = f"{run_id}_ga"
+    t0 = time.perf_counter()
+    _, best_fitness = run_ga_optimization(pop, gens, sc["net"], sc["route"], scenario, ga_run_id, backend=backend,
+                                          cache_db=None, horizon=horizon, results_db=None, checkpoint_every=None)
+    wall = time.perf_counter() - t0
+    with open(f"resultados_eval_1_{scenario}.csv", newline="") as f:
+        evals = sum(1 for r in csv.DictReader(f) if r["run_id"] == ga_run_id)
+    return {"kind": f"ga:p{pop}g{gens}", "wall_s": wall, "evals": evals,
+            "evals_per_sec": evals / wall if wall > 0 else None, "fitness": best_fitness}
+
+
+def run_suite(aristas=None, backend="traci", horizon=1800, repeat=1, ga_pop=4, ga_gens=2, outdir="bench_suite_out",
+              tolerance=0.15, update_baseline=False):
+    """
+    Corre la suite y retorna (filas, regresiones). Las salidas (CSV, logs de SUMO) quedan en outdir,
+    junto con bench_history.csv y bench_baseline.json. Sin línea base (o con update_baseline) las
+    métricas de esta corrida pasan a ser la línea base.
+    """
+    scenarios = discover_scenarios()
+    if aristas:
+        scenarios = {k: v for k, v in scenarios.items() if v["arista"] in aristas}
+    backend = resolve_backend(backend, "sumo")
+    run_id = datetime.now().strftime("%Y%m%dT%H%M%S")
+    common = {"timestamp": run_id, "commit": _git_commit(), "host": platform.node(), "backend": backend,
+              "horizon": horizon}
+
+    os.makedirs(outdir, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(outdir)
+    rows = []
+    try:
+        for name, sc in scenarios.items():
+            for kind, genome in FIXED_GENOMES.items():
+                row = _bench_genome(name, sc, kind, genome, backend, horizon, repeat, run_id)
+                rows.append(dict(common, scenario=name, repeat=repeat, **row))
+            if ga_pop and ga_gens:
+                row = _bench_ga(name, sc, backend, horizon, ga_pop, ga_gens, run_id)
+                rows.append(dict(common, scenario=name, repeat=1, **row))
+
+        baseline_file = "bench_baseline.json"
+        baseline = {}
+        if os.path.exists(baseline_file):
+            with open(baseline_file) as f:
+                baseline = json.load(f)
+        regressions = check_regressions(rows, baseline, tolerance)
+        _append_rows("bench_history.csv", HISTORY_FIELDS, rows)
+        if update_baseline or not baseline:
+            baseline.update({_baseline_key(r): {k: r.get(k) for k in SPEED_METRICS + ("fitness", "commit")}
+                             for r in rows})
+            with open(baseline_file, "w") as f:
+                json.dump(baseline, f, indent=1, sort_keys=True)
+    finally:
+        os.chdir(cwd)
+
+    for row in rows:
+        speed = row.get("sim_s_per_wall_s")
+        rtf = row.get("real_time_factor")
+        print(f"{row['scenario']:>9} {row['kind']:<16} wall={row['wall_s']:7.2f}s evals/s={row['evals_per_sec'] or 0:6.2f} "
+              f"sim/wall={f'{speed:.1f}' if speed is not None else '-'} RTF={rtf if rtf is not None else '-'} "
+              f"{'REGRESIÓN ' + row['regression'] if row['regression'] else ''}")
+    print(f"Historial -> {os.path.join(outdir, 'bench_history.csv')} ({len(regressions)} regresiones)")
+    return rows, regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--aristas", type=int, nargs="*", default=None, help="Aristas a medir (default: todas)")
+    parser.add_argument("--backend", choices=["traci", "libsumo"], default="traci")
+    parser.add_argument("--horizon", type=float, default=1800, help="Horizonte fijo de cada simulación (s)")
+    parser.add_argument("--repeat", type=int, default=1, help="Repeticiones por genoma fijo (se reporta la más rápida)")
+    parser.add_argument("--ga-pop", type=int, default=4, help="Población del GA corto (0 = sin GA)")
+    parser.add_argument("--ga-gen", type=int, default=2, help="Generaciones del GA corto")
+    parser.add_argument("--outdir", type=str, default="bench_suite_out", help="Carpeta de salidas, historial y línea base")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Caída relativa tolerada antes de marcar una regresión")
+    parser.add_argument("--update-baseline", action="store_true", help="Guardar esta corrida como línea base")
+    args = parser.parse_args()
+
+    _, regressions = run_suite(aristas=args.aristas, backend=args.backend, horizon=args.horizon, repeat=args.repeat,
+                               ga_pop=args.ga_pop, ga_gens=args.ga_gen, outdir=args.outdir, tolerance=args.tolerance,
+                               update_baseline=args.update_baseline)
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,41 @@
+# checkpoint.py
+import os
+import pickle
+
+# Checkpoints del GA generacional (run_ga_optimization(checkpoint_every=N, resume=True)).
+# Al cerrar cada N generaciones se guarda todo lo necesario para continuar como si la corrida no se
+# hubiera cortado: población (genomas, fitness y marcas predicted/fidelity), estado de random y de
+# numpy.random, generación, mejor individuo, fitness de fidelidad completa, datos del sustituto,
+# incumbentes de replicación y el contenido de los caches de fitness que viven solo en memoria
+# (los de SQLite ya persisten cada evaluación, también las de la generación interrumpida).
+# El archivo se escribe en un temporal y se reemplaza con os.replace: un corte a mitad de escritura
+# deja el checkpoint anterior intacto.
+# Al reanudar se rehace la generación interrumpida: población, resumen y mejor individuo quedan iguales
+# a los de la corrida sin corte, pero el log de evaluaciones puede repetir las que ya se habían escrito.
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_DIR = "checkpoints"
+
+
+def checkpoint_path(scenario, run_id, checkpoint_dir=CHECKPOINT_DIR):
+    return os.path.join(checkpoint_dir, f"ga_{scenario}_{run_id}.pkl")
+
+
+def save_checkpoint(path, state):
+    """Guarda state (dict picklable) de forma atómica."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(dict(state, version=CHECKPOINT_VERSION), f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_checkpoint(path):
+    """Lee un checkpoint de save_checkpoint; FileNotFoundError si no existe, ValueError si es de otra versión."""
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"Checkpoint {path} con versión {state.get('version')}, se esperaba {CHECKPOINT_VERSION}")
+    return state
@@ -0,0 +1,342 @@
+# cross_analysis.py
+import os
+import csv
+import glob
+import json
+from datetime import datetime
+
+import numpy as np
+
+from genome_layout import build_layout
+from scenarios import discover_scenarios
+from sim_eval import RESULTS_FIELDS, PER_TLS_FIELDS, FAILED_FITNESS, evaluate_genome
+
+# Análisis entre corridas: carga una sola vez todos los resultados_eval_1_*, per_tls_* y summary_*
+# de una carpeta en arreglos columnares de numpy y calcula los agregados con operaciones vectorizadas
+# (agrupación con np.unique + np.bincount, percentiles por grupo sobre arreglos ordenados).
+# Lo parseado se guarda en un sidecar .npz; mientras ningún CSV cambie (mtime/tamaño) los análisis
+# siguientes leen el binario en vez de volver a parsear los CSV.
+
+CACHE_FILE = ".analysis_cache.npz"
+BASELINE_DIR = "baseline_out"
+BASELINE_FIELDS = ["scenario", "horizon", "backend", "fitness", "status", "genome"]
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Columnas de texto de cada tabla; el resto se guarda como float64 (vacío -> NaN)
+_TABLES = {
+    "evals": ("resultados_eval_1_*.csv", RESULTS_FIELDS, ("scenario", "run_id", "status", "fidelity")),
+    "tls": ("per_tls_*.csv", PER_TLS_FIELDS, ("scenario", "run_id", "tls", "fidelity", "phase_durations")),
+    "summary": ("summary_*.csv", ["scenario", "run_id", "generation", "best_fitness", "mean_fitness", "std_fitness"],
+                ("scenario", "run_id")),
+}
+
+
+def _source_files(directory):
+    return {name: sorted(glob.glob(os.path.join(directory, pattern))) for name, (pattern, _, _) in _TABLES.items()}
+
+
+def _cache_key(files):
+    """Firma de los CSV de entrada (nombre, mtime y tamaño de cada archivo) y de las columnas esperadas."""
+    entries = [[name, list(fields)] for name, (_, fields, _) in sorted(_TABLES.items())]
+    for name in sorted(files):
+        for path in files[name]:
+            st = os.stat(path)
+            entries.append([os.path.basename(path), st.st_mtime_ns, st.st_size])
+    return json.dumps(entries)
+
+
+def _parse_table(paths, fields, text_columns):
+    """Concatena los CSV en {columna: arreglo}. Columnas que faltan en un archivo viejo quedan vacías/NaN."""
+    raw = {c: [] for c in fields}
+    for path in paths:
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                for c in fields:
+                    raw[c].append(row.get(c) or "")
+    columns = {}
+    for c in fields:
+        if c in text_columns:
+            columns[c] = np.array(raw[c], dtype=str)
+        else:
+            columns[c] = np.array([float(v) if v != "" else np.nan for v in raw[c]], dtype=np.float64)
+    return columns
+
+
+def load_tables(directory=".", use_cache=True):
+    """
+    Retorna {"evals": {...}, "tls": {...}, "summary": {...}} con una columna por campo.
+    Usa el sidecar CACHE_FILE si la firma de los CSV coincide; si no, parsea y lo reescribe.
+    """
+    files = _source_files(directory)
+    key = _cache_key(files)
+    cache_path = os.path.join(directory, CACHE_FILE)
+    if use_cache and os.path.exists(cache_path):
+        with np.load(cache_path) as data:
+            if str(data["__key__"]) == key:
+                tables = {name: {} for name in _TABLES}
+                for k in data.files:
+                    if k != "__key__":
+                        name, column = k.split("__", 1)
+                        tables[name][column] = data[k]
+                return tables
+
+    tables = {name: _parse_table(files[name], fields, text) for name, (_, fields, text) in _TABLES.items()}
+    if use_cache:
+        arrays = {f"{name}__{c}": a for name, cols in tables.items() for c, a in cols.items()}
+        # np.savez agrega ".npz" si falta, por eso el temporal termina en .npz
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, __key__=np.array(key), **arrays)
+        os.replace(tmp_path, cache_path)
+    return tables
+
+
+def _groups(*keys):
+    """Índice de grupo por fila para la combinación de columnas de texto keys. Retorna (etiquetas, inverse)."""
+    if len(keys) == 1:
+        labels, inverse = np.unique(keys[0], return_inverse=True)
+        return [(label,) for label in labels], inverse
+    joined = np.char.add(np.char.add(keys[0], "\x1f"), keys[1])
+    labels, inverse = np.unique(joined, return_inverse=True)
+    return [tuple(label.split("\x1f")) for label in labels], inverse
+
+
+def _group_mean(values, inverse, n_groups):
+    """Media por grupo ignorando NaN."""
+    valid = ~np.isnan(values)
+    sums = np.bincount(inverse[valid], weights=values[valid], minlength=n_groups)
+    counts = np.bincount(inverse[valid], minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
+
+def _group_percentiles(values, inverse, n_groups, percentiles=PERCENTILES):
+    """
+    Percentiles por grupo (interpolación lineal, igual que np.percentile) sin recorrer filas en Python:
+    se ordena por (grupo, valor) y se indexa cada percentil dentro del tramo de su grupo.
+    """
+    valid = ~np.isnan(values)
+    v = values[valid]
+    g = inverse[valid]
+    order = np.lexsort((v, g))
+    v = v[order]
+    counts = np.bincount(g, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    out = np.full((n_groups, len(percentiles)), np.nan)
+    has = counts > 0
+    for j, p in enumerate(percentiles):
+        pos = (counts[has] - 1) * (p / 100.0)
+        lo = np.floor(pos).astype(int)
+        hi = np.ceil(pos).astype(int)
+        frac = pos - lo
+        out[has, j] = v[starts[has] + lo] * (1 - frac) + v[starts[has] + hi] * frac
+    return out
+
+
+def scenario_aggregates(tables, baselines=None):
+    """
+    Una fila por escenario: corridas, evaluaciones, fallidas, mejor/medio fitness, percentiles
+    y delta del mejor fitness contra el programa por defecto (baselines = {escenario: fitness}).
+    """
+    ev = tables["evals"]
+    if len(ev["scenario"]) == 0:
+        return []
+    labels, inverse = _groups(ev["scenario"])
+    n = len(labels)
+    fitness = ev["fitness"].copy()
+    # CSV anteriores a la columna status: las fallidas se reconocen por FAILED_FITNESS
+    failed = (ev["status"] == "failed") | (ev["fitness"] <= FAILED_FITNESS)
+    # Las filas fallidas (FAILED_FITNESS) distorsionan medias y percentiles
+    fitness[failed] = np.nan
+    # Solo se comparan fitness de fidelidad completa (las filas sin columna fidelity son anteriores: full)
+    fitness[~np.isin(ev["fidelity"], ("", "full"))] = np.nan
+
+    _, run_inverse = _groups(ev["scenario"], ev["run_id"])
+    runs_per_scenario = np.bincount(inverse[np.unique(run_inverse, return_index=True)[1]], minlength=n)
+    evaluations = np.bincount(inverse, minlength=n)
+    failures = np.bincount(inverse, weights=failed.astype(float), minlength=n).astype(int)
+    best = np.full(n, -np.inf)
+    np.maximum.at(best, inverse[~np.isnan(fitness)], fitness[~np.isnan(fitness)])
+    best[np.isinf(best)] = np.nan
+    mean = _group_mean(fitness, inverse, n)
+    pct = _group_percentiles(fitness, inverse, n)
+    eval_time = _group_mean(ev["eval_time"], inverse, n)
+
+    baselines = baselines or {}
+    default = np.array([baselines.get(label[0], np.nan) for label in labels], dtype=float)
+    rows = []
+    for i, (scenario,) in enumerate(labels):
+        row = {
+            "scenario": scenario,
+            "runs": int(runs_per_scenario[i]),
+            "evaluations": int(evaluations[i]),
+            "failed": int(failures[i]),
+            "best_fitness": best[i],
+            "mean_fitness": mean[i],
+        }
+        row.update({f"p{p}_fitness": pct[i, j] for j, p in enumerate(PERCENTILES)})
+        row["mean_eval_time"] = eval_time[i]
+        row["default_fitness"] = default[i]
+        row["best_vs_default"] = best[i] - default[i]
+        rows.append(row)
+    return rows
+
+
+def tls_aggregates(tables):
+    """Una fila por (escenario, TLS): medias y percentiles de cola/espera, flujo medio."""
+    t = tables["tls"]
+    if len(t["tls"]) == 0:
+        return []
+    # Misma regla que en scenario_aggregates: solo filas de fidelidad completa
+    full = np.isin(t["fidelity"], ("", "full"))
+    t = {c: a[full] for c, a in t.items()}
+    if len(t["tls"]) == 0:
+        return []
+    labels, inverse = _groups(t["scenario"], t["tls"])
+    n = len(labels)
+    samples = np.bincount(inverse, minlength=n)
+    queue_mean = _group_mean(t["avg_queue_tls"], inverse, n)
+    wait_mean = _group_mean(t["avg_wait_tls"], inverse, n)
+    flow_mean = _group_mean(t["flow_tls"], inverse, n)
+    queue_pct = _group_percentiles(t["avg_queue_tls"], inverse, n, (50, 95))
+    wait_pct = _group_percentiles(t["avg_wait_tls"], inverse, n, (50, 95))
+    rows = []
+    for i, (scenario, tls) in enumerate(labels):
+        rows.append({
+            "scenario": scenario,
+            "tls": tls,
+            "samples": int(samples[i]),
+            "mean_queue": queue_mean[i],
+            "p50_queue": queue_pct[i, 0],
+            "p95_queue": queue_pct[i, 1],
+            "mean_wait": wait_mean[i],
+            "p50_wait": wait_pct[i, 0],
+            "p95_wait": wait_pct[i, 1],
+            "mean_flow": flow_mean[i],
+            # misma fórmula del sistema (analyze_results)
+            "road_rage": queue_mean[i] * 10,
+        })
+    return rows
+
+
+def convergence_curves(tables):
+    """
+    Curva de convergencia por escenario: matriz corridas x generaciones del best_fitness
+    (cada corrida se extiende con su último valor si terminó antes) y, por generación,
+    media y percentiles 25/50/75 entre corridas.
+    """
+    s = tables["summary"]
+    # Solo filas con generación (un summary sin esa columna, p. ej. de otro tipo de corrida, queda en NaN)
+    valid = ~np.isnan(s["generation"])
+    s = {c: a[valid] for c, a in s.items()}
+    if len(s["scenario"]) == 0:
+        return []
+    run_labels, run_inverse = _groups(s["scenario"], s["run_id"])
+    gen = s["generation"].astype(int)
+    matrix = np.full((len(run_labels), gen.max()), np.nan)
+    matrix[run_inverse, gen - 1] = s["best_fitness"]
+    # forward-fill por fila: índice de la última columna con dato
+    idx = np.where(~np.isnan(matrix), np.arange(matrix.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    matrix = matrix[np.arange(matrix.shape[0])[:, None], idx]
+
+    scenarios = np.array([label[0] for label in run_labels])
+    rows = []
+    for scenario in np.unique(scenarios):
+        m = matrix[scenarios == scenario]
+        with np.errstate(all="ignore"):
+            mean = np.nanmean(m, axis=0)
+            p25, p50, p75 = np.nanpercentile(m, (25, 50, 75), axis=0)
+        for g in range(m.shape[1]):
+            if np.isnan(mean[g]):
+                continue
+            rows.append({
+                "scenario": scenario,
+                "generation": g + 1,
+                "runs": int(np.sum(~np.isnan(m[:, g]))),
+                "mean_best": mean[g],
+                "p25_best": p25[g],
+                "p50_best": p50[g],
+                "p75_best": p75[g],
+            })
+    return rows
+
+
+def run_default_baselines(aristas=None, horizon=None, backend="traci", outdir=BASELINE_DIR):
+    """
+    Fitness del programa propio de cada red: el genoma por defecto del layout "topology"
+    (build_layout(net).default_genome(), las duraciones verdes del net.xml) evaluado en su escenario.
+    Escribe baseline_default_{run_id}.csv en outdir, con el nombre de escenario del registro ("N_arista"),
+    el mismo que usan las tablas del GA. horizon debe ser el de las corridas con las que se compara.
+    """
+    scenarios = discover_scenarios()
+    if aristas:
+        scenarios = {k: v for k, v in scenarios.items() if v["arista"] in aristas}
+    run_id = datetime.now().strftime("%Y%m%dT%H%M%S")
+    os.makedirs(outdir, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(outdir)
+    rows = []
+    try:
+        for name, sc in scenarios.items():
+            genome = build_layout(sc["net"]).default_genome()
+            fitness, status = evaluate_genome(genome, sc["net"], sc["route"], f"baseline_{name}", run_id,
+                                              backend=backend, horizon=horizon, layout="topology",
+                                              with_status=True)
+            rows.append({"scenario": name, "horizon": horizon, "backend": backend, "fitness": fitness,
+                         "status": status, "genome": json.dumps(genome)})
+    finally:
+        os.chdir(cwd)
+    out_csv = os.path.join(outdir, f"baseline_default_{run_id}.csv")
+    with open(out_csv, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=BASELINE_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return {row["scenario"]: row["fitness"] for row in rows if row["status"] != "failed"}
+
+
+def load_baselines(directory="."):
+    """
+    Fitness del programa por defecto por escenario, desde los baseline_default_*.csv de
+    run_default_baselines (cada red con su propio programa). Un archivo más nuevo pisa a los anteriores.
+    """
+    paths = sorted(glob.glob(os.path.join(directory, "baseline_default_*.csv")) +
+                   glob.glob(os.path.join(directory, BASELINE_DIR, "baseline_default_*.csv")),
+                   key=os.path.getmtime)
+    baselines = {}
+    for path in paths:
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                if row.get("fitness") and row.get("status") != "failed":
+                    baselines[row["scenario"]] = float(row["fitness"])
+    return baselines
+
+
+def _write(path, rows):
+    if not rows:
+        return
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def analyze_all(directory=".", baselines=None, out_prefix="cross", use_cache=True):
+    """Corre el análisis completo de la carpeta y escribe {out_prefix}_scenarios/tls/convergence.csv."""
+    tables = load_tables(directory, use_cache)
+    if baselines is None:
+        baselines = load_baselines(directory)
+    scenarios = scenario_aggregates(tables, baselines)
+    tls = tls_aggregates(tables)
+    convergence = convergence_curves(tables)
+
+    _write(os.path.join(directory, f"{out_prefix}_scenarios.csv"), scenarios)
+    _write(os.path.join(directory, f"{out_prefix}_tls.csv"), tls)
+    _write(os.path.join(directory, f"{out_prefix}_convergence.csv"), convergence)
+
+    print(f"\nAnálisis de {len(tables['evals']['scenario'])} evaluaciones, "
+          f"{len(tables['tls']['tls'])} filas per_tls, {len(tables['summary']['scenario'])} generaciones")
+    for r in scenarios:
+        print(f"{r['scenario']}: corridas={r['runs']} evals={r['evaluations']} fallidas={r['failed']} "
+              f"best={r['best_fitness']:.2f} p50={r['p50_fitness']:.2f} p95={r['p95_fitness']:.2f} "
+              f"best_vs_default={r['best_vs_default']:.2f}")
+    return {"scenarios": scenarios, "tls": tls, "convergence": convergence}
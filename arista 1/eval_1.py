@@ -1,7 +1,8 @@
 # eval_1.py
 import argparse
 from datetime import datetime
-from ga_opt import run_ga_optimization
+from ga_opt import run_ga_optimization, run_steady_state_optimization
+from scenarios import find_scenario
 
 # Script de lanzamiento: solo orquesta la corrida del GA.
 # NUEVO: Ahora acepta argumentos --net, --route y --gui para controlar SUMO.
@@ -11,22 +12,142 @@ if __name__ == "__main__":
     parser.add_argument("--pop", type=int, default=30, help="Población GA")
     parser.add_argument("--gen", type=int, default=15, help="Generaciones GA")
     parser.add_argument("--scenario", type=str, default="default", help="Nombre del escenario")
-    parser.add_argument("--net", type=str, default=r"C:\Users\luisc\Downloads\aristas\sumo-federado\arista 1\1_arista_simulation.net.xml", help="Archivo .net.xml de la red (NUEVO)")
-    parser.add_argument("--route", type=str, default=r"C:\Users\luisc\Downloads\aristas\sumo-federado\arista 1\1_arista_simulation.rou.xml", help="Archivo .rou.xml de rutas (NUEVO)")
+    parser.add_argument("--arista", type=int, default=1,
+                        help="Arista del repositorio cuyos net/route se usan si no se dan --net/--route")
+    parser.add_argument("--net", type=str, default=None, help="Archivo .net.xml de la red (default: el de --arista)")
+    parser.add_argument("--route", type=str, default=None, help="Archivo .rou.xml de rutas (default: el de --arista)")
     parser.add_argument("--gui", action="store_true", help="Usar sumo-gui en lugar de sumo (NUEVO)")
+    parser.add_argument("--collection", choices=["subscription", "polling"], default="subscription",
+                        help="Recolección de métricas: suscripciones TraCI por carril o getters por paso")
+    parser.add_argument("--backend", choices=["traci", "libsumo"], default="traci",
+                        help="traci (SUMO por socket) o libsumo (en proceso; con --gui se usa traci)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Procesos SUMO en paralelo para evaluar la población (1 = serial)")
+    parser.add_argument("--cache-db", type=str, default="fitness_cache.sqlite",
+                        help="SQLite del cache de fitness entre corridas (\"\" = solo en memoria)")
+    parser.add_argument("--no-cache", action="store_true", help="Desactivar el cache de fitness")
+    parser.add_argument("--horizon", type=float, default=None,
+                        help="Horizonte de simulación en segundos (p. ej. 3600, fin de los flujos)")
+    parser.add_argument("--drain", type=float, default=0,
+                        help="Segundos extra tras el horizonte para vaciar la red")
+    parser.add_argument("--early-abort", action="store_true",
+                        help="Abortar evaluaciones que no pueden superar al peor elite (requiere --horizon)")
+    parser.add_argument("--elite-size", type=int, default=3, help="Tamaño del elite para --early-abort")
+    parser.add_argument("--warmup", type=float, default=None,
+                        help="Segundos de warm-up simulados una vez y reutilizados vía saveState/loadState")
+    parser.add_argument("--state-dir", type=str, default="state_cache", help="Carpeta de snapshots de warm-up")
+    parser.add_argument("--persistent", action="store_true",
+                        help="Reutilizar una instancia de SUMO por proceso (traci.load entre genomas)")
+    parser.add_argument("--mode", choices=["traci", "batch"], default="traci",
+                        help="traci (loop paso a paso) o batch (SUMO sin TraCI + detectores laneData/E2)")
+    parser.add_argument("--results-db", type=str, default="resultados.sqlite",
+                        help="SQLite de resultados con escritura en lote; al final se exportan los CSV")
+    parser.add_argument("--no-results-db", action="store_true",
+                        help="Escribir los CSV directamente en cada evaluación (modo anterior)")
+    parser.add_argument("--surrogate", action="store_true",
+                        help="Pre-filtrar la descendencia con un modelo sustituto del fitness")
+    parser.add_argument("--surrogate-fraction", type=float, default=0.5,
+                        help="Fracción de los genomas nuevos que se simulan con --surrogate")
+    parser.add_argument("--surrogate-min-samples", type=int, default=None,
+                        help="Fitness reales necesarios para activar el sustituto (default: --pop)")
+    parser.add_argument("--screen-fidelity", choices=["coarse", "meso", "short"], default=None,
+                        help="Evaluar la población a fidelidad barata y re-evaluar solo el top-k a fidelidad completa")
+    parser.add_argument("--screen-generations", type=int, default=None,
+                        help="Generaciones con screening (default: todas)")
+    parser.add_argument("--top-k", type=int, default=None,
+                        help="Genomas re-evaluados a fidelidad completa por generación (default: --elite-size)")
+    parser.add_argument("--layout", choices=["cyclic", "topology"], default="cyclic",
+                        help="Genoma: 8 genes compartidos (cyclic) o un gen por fase verde de cada TLS (topology)")
+    parser.add_argument("--steady-state", action="store_true",
+                        help="GA steady-state asíncrono (sin barrera de generación; resumen por evaluaciones)")
+    parser.add_argument("--evaluations", type=int, default=None,
+                        help="Presupuesto de evaluaciones con --steady-state (default: --pop * --gen)")
+    parser.add_argument("--replacement", choices=["worst", "oldest", "tournament"], default="worst",
+                        help="Regla de reemplazo con --steady-state")
+    parser.add_argument("--report-every", type=int, default=None,
+                        help="Evaluaciones entre filas del resumen con --steady-state (default: --pop)")
+    parser.add_argument("--replications", type=int, default=1,
+                        help="Máximo de semillas de SUMO por genoma; el fitness es la media (default: 1, sin réplicas)")
+    parser.add_argument("--min-replications", type=int, default=2,
+                        help="Semillas iniciales por genoma con --replications > 1")
+    parser.add_argument("--confidence", type=float, default=0.95,
+                        help="Nivel del intervalo de confianza para dejar de replicar")
+    parser.add_argument("--trace", action="store_true",
+                        help="Traza por evaluación (tiempos, llamadas TraCI, RSS) en trace_{scenario}_{run_id}.jsonl")
+    parser.add_argument("--checkpoint-every", type=int, default=1,
+                        help="Generaciones entre checkpoints de la corrida (0 = sin checkpoints)")
+    parser.add_argument("--checkpoint-dir", type=str, default="checkpoints", help="Carpeta de checkpoints del GA")
+    parser.add_argument("--resume", type=str, default=None, metavar="RUN_ID",
+                        help="Continuar la corrida RUN_ID desde su último checkpoint (mismas opciones)")
     args = parser.parse_args()
+    if args.steady_state and (args.early_abort or args.surrogate or args.screen_fidelity or args.replications > 1):
+        parser.error("--steady-state no admite --early-abort, --surrogate, --screen-fidelity ni --replications")
+    if args.steady_state and args.resume:
+        parser.error("--resume solo está disponible para el GA generacional")
+    if args.replications > 1 and args.early_abort:
+        parser.error("--replications no admite --early-abort")
+    if args.screen_fidelity == "meso" and args.warmup:
+        parser.error("--screen-fidelity meso no admite --warmup (el snapshot de warm-up es microscópico)")
 
-    run_id = datetime.now().strftime("%Y%m%dT%H%M%S")
+    # NUEVO: net/route desde el registro de escenarios (scenarios.py) en lugar de rutas fijas
+    if args.net is None or args.route is None:
+        scenario_files = find_scenario(args.arista)
+        args.net = args.net or scenario_files["net"]
+        args.route = args.route or scenario_files["route"]
+
+    # NUEVO: --resume reutiliza el run_id de la corrida interrumpida
+    run_id = args.resume or datetime.now().strftime("%Y%m%dT%H%M%S")
 
     # Elegir binario segun flag --gui
     sumo_binary = "sumo-gui" if args.gui else "sumo"  # NUEVO: permite visualizar la simulación
 
-    run_ga_optimization(
-        pop_size=args.pop,
-        generations=args.gen,
+    common = dict(
         net_file=args.net,
         route_file=args.route,
         scenario=args.scenario,
         run_id=run_id,
-        sumo_binary=sumo_binary  # NUEVO: propagar al GA
+        sumo_binary=sumo_binary,  # NUEVO: propagar al GA
+        collection=args.collection,
+        backend=args.backend,
+        workers=args.workers,
+        cache_db=None if args.no_cache else args.cache_db,
+        horizon=args.horizon,
+        drain=args.drain,
+        warmup=args.warmup,
+        state_dir=args.state_dir,
+        persistent=args.persistent,
+        mode=args.mode,
+        results_db=None if args.no_results_db else args.results_db,
+        layout=args.layout,
+        trace=args.trace
+    )
+
+    if args.steady_state:
+        run_steady_state_optimization(
+            pop_size=args.pop,
+            evaluations=args.evaluations or args.pop * args.gen,
+            replacement=args.replacement,
+            report_every=args.report_every,
+            **common
+        )
+        raise SystemExit(0)
+
+    run_ga_optimization(
+        pop_size=args.pop,
+        generations=args.gen,
+        early_abort=args.early_abort,
+        elite_size=args.elite_size,
+        surrogate=args.surrogate,
+        surrogate_fraction=args.surrogate_fraction,
+        surrogate_min_samples=args.surrogate_min_samples,
+        screen_fidelity=args.screen_fidelity,
+        screen_generations=args.screen_generations,
+        top_k=args.top_k,
+        replications=args.replications,
+        min_replications=args.min_replications,
+        confidence=args.confidence,
+        checkpoint_every=args.checkpoint_every or None,
+        checkpoint_dir=args.checkpoint_dir,
+        resume=args.resume is not None,
+        **common
     )
@@ -0,0 +1,141 @@
+# eval_trace.py
+import os
+import json
+import time
+from collections import Counter
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Instrumentación del camino caliente de una evaluación (evaluate_genome/SumoEvaluator con trace=True).
+# Hasta ahora solo estaba eval_time; la traza separa por evaluación:
+#   startup_s   arranque de SUMO (start_backend) o load de la instancia persistente
+#   apply_s     aplicación de los programas TLS del genoma
+#   loop_s      loop de simulación completo = step_s (simulationStep) + collect_s (lectura de métricas,
+#               getMinExpectedNumber y acumuladores)
+#   write_s     escritura de las filas de resultados (CSV o ResultsStore)
+#   traci_calls / traci_time_s: llamadas y segundos por comando ("lane.getWaitingTime", "simulationStep", ...)
+#   peak_rss_kb pico de memoria del proceso SUMO (VmHWM) con traci; con libsumo, ru_maxrss del proceso
+#               Python (SUMO corre adentro; es el máximo acumulado del proceso, no solo de esta evaluación)
+# Cada evaluación agrega una línea JSON a trace_{scenario}_{run_id}.jsonl.
+# Sin trace no se crea ningún objeto: la conexión es la de siempre y el loop no mide nada por paso.
+
+# Dominios de la API TraCI/libsumo cuyas llamadas se cuentan
+_DOMAINS = ("simulation", "trafficlight", "lane", "edge", "vehicle", "person", "junction", "route",
+            "inductionloop", "lanearea", "multientryexit", "poi", "polygon", "vehicletype", "gui")
+
+
+def trace_file_name(scenario, run_id):
+    return f"trace_{scenario}_{run_id}.jsonl"
+
+
+class _CountingDomain:
+    """Proxy de un dominio (conn.lane, conn.trafficlight, ...) que cuenta y cronometra cada comando."""
+
+    def __init__(self, target, prefix, trace):
+        self._target = target
+        self._prefix = prefix
+        self._trace = trace
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        # Phase/Logic y demás clases no son comandos
+        if callable(attr) and not name[:1].isupper():
+            attr = self._trace.counted(attr, f"{self._prefix}{name}")
+        # Se guarda en la instancia: __getattr__ no vuelve a correr para este nombre
+        setattr(self, name, attr)
+        return attr
+
+
+class CountingConnection(_CountingDomain):
+    """Conexión (módulo traci, traci.Connection o libsumo) con los comandos contados."""
+
+    def __init__(self, conn, trace):
+        super().__init__(conn, "", trace)
+        for domain in _DOMAINS:
+            if hasattr(conn, domain):
+                setattr(self, domain, _CountingDomain(getattr(conn, domain), f"{domain}.", trace))
+
+
+class EvalTrace:
+    """Acumula tiempos y llamadas de una evaluación y la escribe como una línea JSON."""
+
+    def __init__(self, scenario, run_id, label=None):
+        self.scenario = scenario
+        self.run_id = run_id
+        self.label = label
+        self.timings = {"startup_s": 0.0, "apply_s": 0.0, "loop_s": 0.0, "write_s": 0.0}
+        self.calls = Counter()
+        self.call_time = Counter()
+        self.steps = 0
+        self.peak_rss_kb = None
+
+    def counted(self, fn, key):
+        calls = self.calls
+        call_time = self.call_time
+
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                call_time[key] += time.perf_counter() - t0
+                calls[key] += 1
+        return wrapper
+
+    def wrap(self, conn):
+        return CountingConnection(conn, self)
+
+    def add(self, name, seconds):
+        self.timings[name] += seconds
+
+    def sample_rss(self, conn):
+        """Pico de RSS del proceso que corre SUMO (leer antes de cerrar la conexión)."""
+        process = getattr(conn, "_process", None)
+        if process is None and getattr(conn, "__name__", None) == "traci":
+            try:
+                process = conn.getConnection()._process
+            except Exception:
+                process = None
+        if process is not None:
+            try:
+                with open(f"/proc/{process.pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmHWM:"):
+                            self.peak_rss_kb = int(line.split()[1])
+                            return
+            except OSError:
+                pass
+        if resource is not None and getattr(conn, "__name__", "").startswith("libsumo"):
+            self.peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def record(self, genome=None, fidelity="full", seed=None, status=None):
+        step = self.call_time.get("simulationStep", 0.0)
+        return {
+            "scenario": self.scenario,
+            "run_id": self.run_id,
+            "label": self.label,
+            "pid": os.getpid(),
+            "genome": [int(x) for x in genome] if genome is not None else None,
+            "fidelity": fidelity,
+            "seed": seed,
+            "status": status,
+            "steps": self.steps,
+            **self.timings,
+            "step_s": step,
+            "collect_s": max(0.0, self.timings["loop_s"] - step),
+            "traci_calls_total": sum(self.calls.values()),
+            "traci_calls": dict(self.calls),
+            "traci_time_s": {k: round(v, 6) for k, v in self.call_time.items()},
+            "peak_rss_kb": self.peak_rss_kb,
+        }
+
+    def write(self, path, **record_kwargs):
+        # Import diferido: sim_eval importa este módulo
+        from sim_eval import _file_lock
+        line = json.dumps(self.record(**record_kwargs), separators=(",", ":"))
+        with _file_lock(path):
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+# federated.py
+import os
+import csv
+import json
+import time
+import zlib
+import socket
+import struct
+import argparse
+import threading
+import multiprocessing as mp
+from datetime import datetime
+
+from scenarios import discover_scenarios, net_index
+from ga_opt import run_ga_optimization
+from phase_codec import encode_update, decode_update
+
+# Runner federado multi-arista: un cliente (proceso) por arista corre rondas locales de GA sobre su
+# propia red e intercambia con un servidor de agregación local (socket TCP en loopback) los tiempos
+# de fase por TLS. El servidor hace FedAvg por ronda y devuelve el modelo global.
+#
+# Modelo compartido: el genoma de GENOME_LENGTH genes. Como evaluate_genome asigna a la fase i de
+# cada TLS el gen i % GENOME_LENGTH, los parámetros por TLS de un cliente se "pliegan" a espacio de
+# genes promediando las fases que comparten gen; el promedio ponderado (por muestras evaluadas) entre
+# clientes es el modelo global, que se vuelve a expandir por TLS para cada cliente.
+# El peso de un cliente en la ronda son las simulaciones que realmente corrió (filas de resultados de
+# esa ronda), no pop*generaciones: los aciertos del cache no aportan información nueva. Cada ronda
+# corre el GA con su propia semilla (round_seed) para que no reconstruya la población de la anterior.
+#
+# Se registran los bytes reales que pasan por el socket (en ambos extremos), la latencia de cada
+# ronda y el tiempo que cada cliente esperó a los rezagados, junto a la estimación 2*K*8 bytes por TLS
+# que usa analyze_results.py.
+#
+# NUEVO: con un codec (ver phase_codec.py) los mensajes con parámetros viajan en binario: uint8 por fase,
+# delta respecto de la ronda anterior y/o zlib. Los TLS van en el orden del HELLO, sin ids.
+
+GENOME_LENGTH = 8
+_HEADER = struct.Struct("!IB")  # largo del payload (big-endian) + tipo de frame
+_FRAME_JSON = 0
+_FRAME_PHASES = 1
+
+
+def send_message(sock, message, codec=None, reference=None, tls_order=None):
+    """
+    Envía un mensaje con prefijo de largo. Sin codec (o sin "params") va como JSON; con codec
+    ({"compress": bool, "delta": bool}) los parámetros van en el formato de phase_codec.
+    Retorna los bytes escritos en el socket.
+    """
+    if codec is not None and "params" in message:
+        payload = encode_update(message["params"], message["round"], message.get("n_samples", 0),
+                                reference=reference, tls_order=tls_order, **codec)
+        kind = _FRAME_PHASES
+    else:
+        payload = json.dumps(message, separators=(",", ":")).encode("utf-8")
+        kind = _FRAME_JSON
+    data = _HEADER.pack(len(payload), kind) + payload
+    sock.sendall(data)
+    return len(data)
+
+
+def _recv_exact(sock, n):
+    chunks = []
+    while n:
+        chunk = sock.recv(n)
+        if not chunk:
+            raise ConnectionError("Conexión cerrada por el otro extremo")
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_message(sock, reference=None, tls_order=None):
+    """Retorna (mensaje, bytes leídos del socket). reference/tls_order: ver phase_codec.decode_update."""
+    length, kind = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    payload = _recv_exact(sock, length)
+    if kind == _FRAME_PHASES:
+        round_index, weight, params = decode_update(payload, reference, tls_order)
+        return {"type": "phases", "round": round_index, "n_samples": weight, "params": params}, _HEADER.size + length
+    return json.loads(payload.decode("utf-8")), _HEADER.size + length
+
+
+def tls_phase_counts(net_file):
+    """{tls: número de fases del programa} desde el índice de la red (sin abrir SUMO)."""
+    return {tls: len(program["phases"]) for tls, program in net_index(net_file)["tls"].items()}
+
+
+def expand_genome(genome, phase_counts):
+    """Duración de cada fase de cada TLS con la misma regla que evaluate_genome (genome[i % len])."""
+    return {tls: [genome[i % len(genome)] for i in range(n)] for tls, n in phase_counts.items()}
+
+
+def fold_params(params, length=GENOME_LENGTH):
+    """Inverso de expand_genome: promedio por gen de las fases que lo usan (None si ninguna lo usa)."""
+    sums = [0.0] * length
+    counts = [0] * length
+    for durations in params.values():
+        for i, d in enumerate(durations):
+            if d is not None:
+                sums[i % length] += d
+                counts[i % length] += 1
+    return [sums[i] / counts[i] if counts[i] else None for i in range(length)]
+
+
+def fedavg(updates, previous=None, length=GENOME_LENGTH):
+    """
+    updates: [(n_samples, parámetros por TLS)] de los clientes de la ronda.
+    Retorna el genoma global: promedio de cada gen ponderado por n_samples. Los genes que ningún
+    cliente usa conservan el valor anterior.
+    """
+    totals = [0.0] * length
+    weights = [0.0] * length
+    for n_samples, params in updates:
+        for i, g in enumerate(fold_params(params, length)):
+            if g is not None and n_samples > 0:
+                totals[i] += n_samples * g
+                weights[i] += n_samples
+    previous = previous or [None] * length
+    return [totals[i] / weights[i] if weights[i] else previous[i] for i in range(length)]
+
+
+class AggregationServer:
+    """
+    Servidor de agregación en loopback. Una conexión (hilo) por cliente; cada ronda se cierra cuando
+    llegaron todas las actualizaciones o, con round_timeout, cuando vence el plazo (los rezagados
+    reciben el modelo ya agregado).
+    """
+
+    def __init__(self, n_clients, host="127.0.0.1", port=0, round_timeout=None):
+        self.n_clients = n_clients
+        self.round_timeout = round_timeout
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(n_clients)
+        self.address = self.sock.getsockname()
+        self.global_genome = [None] * GENOME_LENGTH
+        self.log = []  # una fila por (ronda, cliente)
+        self._cond = threading.Condition()
+        self._updates = {}  # ronda -> {cliente: (llegada, n_samples, params)}
+        self._closed = {}  # ronda -> (genoma global, instante de cierre)
+        self._threads = []
+
+    def start(self):
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        for _ in range(self.n_clients):
+            conn, _ = self.sock.accept()
+            t = threading.Thread(target=self._handle, args=(conn,), daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _close_round(self, r):
+        updates = [(n, params) for _, n, params in self._updates[r].values()]
+        self.global_genome = fedavg(updates, self.global_genome)
+        self._closed[r] = (list(self.global_genome), time.perf_counter())
+        self._cond.notify_all()
+
+    def _handle(self, conn):
+        with conn:
+            hello, received = recv_message(conn)
+            client = hello["client"]
+            phase_counts = hello["tls"]
+            codec = hello.get("codec")
+            tls_order = list(phase_counts)
+            # Última actualización recibida / último modelo enviado: referencias del modo delta
+            ref_up = ref_down = None
+            while True:
+                msg, n = recv_message(conn, ref_up, tls_order)
+                received += n
+                if msg["type"] == "bye":
+                    if self.log and received:
+                        self._add_bytes(client, received)
+                    break
+                r = msg["round"]
+                ref_up = msg["params"]
+                arrival = time.perf_counter()
+                with self._cond:
+                    if r not in self._closed:
+                        self._updates.setdefault(r, {})[client] = (arrival, msg["n_samples"], msg["params"])
+                        if len(self._updates[r]) == self.n_clients:
+                            self._close_round(r)
+                        elif not self._cond.wait_for(lambda: r in self._closed, self.round_timeout):
+                            # Plazo vencido: se agrega con lo que llegó
+                            self._close_round(r)
+                    genome, closed_at = self._closed[r]
+                params = expand_genome(genome, phase_counts)
+                sent = send_message(conn, {"type": "global", "round": r, "params": params},
+                                    codec, ref_down, tls_order)
+                ref_down = params
+                with self._cond:
+                    self.log.append({
+                        "round": r,
+                        "client": client,
+                        "server_bytes_recv": received,
+                        "server_bytes_sent": sent,
+                        "straggler_wait": max(0.0, closed_at - arrival),
+                        "clients_in_round": len(self._updates.get(r, {})),
+                    })
+                received = 0
+
+    def _add_bytes(self, client, n):
+        with self._cond:
+            rows = [row for row in self.log if row["client"] == client]
+            if rows:
+                rows[-1]["server_bytes_recv"] += n
+
+    def join(self, timeout=None):
+        for t in self._threads:
+            t.join(timeout)
+        self.sock.close()
+
+
+def round_seed(seed, client, round_index):
+    """Semilla del GA local de un cliente en una ronda (estable entre procesos, a diferencia de hash())."""
+    return zlib.crc32(f"{seed}:{client}:{round_index}".encode("utf-8"))
+
+
+def executed_evaluations(scenario, run_id):
+    """Simulaciones que corrió la ronda: filas de resultados_eval_1_{scenario}.csv con ese run_id."""
+    path = f"resultados_eval_1_{scenario}.csv"
+    if not os.path.exists(path):
+        return 0
+    with open(path, newline="") as f:
+        return sum(1 for row in csv.DictReader(f) if row["run_id"] == run_id)
+
+
+def _client_main(name, scenario, address, rounds, ga_kwargs, run_id, workdir, results, codec=None, seed=42):
+    """Proceso cliente de una arista: rondas de GA local + intercambio con el servidor."""
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    phase_counts = tls_phase_counts(scenario["net"])
+    tls_order = list(phase_counts)
+    ref_up = ref_down = None
+    # Estimación de analyze_results.py: K fases * 8 bytes (float64) por TLS, subida + bajada
+    estimated = 2 * sum(phase_counts.values()) * 8
+    rows = []
+    global_seed = None
+    with socket.create_connection(address) as sock:
+        sent = send_message(sock, {"type": "hello", "client": name, "tls": phase_counts, "codec": codec})
+        received = 0
+        for r in range(1, rounds + 1):
+            t0 = time.perf_counter()
+            local_run_id = f"{run_id}_r{r}"
+            best_genome, best_fitness = run_ga_optimization(
+                net_file=scenario["net"], route_file=scenario["route"], scenario=name, run_id=local_run_id,
+                initial_genomes=[global_seed] if global_seed else None, seed=round_seed(seed, name, r), **ga_kwargs
+            )
+            local_time = time.perf_counter() - t0
+            n_samples = executed_evaluations(name, local_run_id)
+            params = expand_genome(best_genome or [None] * GENOME_LENGTH, phase_counts)
+
+            t1 = time.perf_counter()
+            sent += send_message(sock, {"type": "update", "round": r, "client": name,
+                                        "n_samples": n_samples if best_genome else 0, "params": params},
+                                 codec, ref_up, tls_order)
+            ref_up = params
+            msg, n = recv_message(sock, ref_down, tls_order)
+            ref_down = msg["params"]
+            received += n
+            latency = time.perf_counter() - t1
+
+            # Semilla de la próxima ronda: modelo global; los genes sin dato quedan con el mejor local
+            own = best_genome or global_seed or [35] * GENOME_LENGTH
+            global_seed = [float(g if g is not None else o) for g, o in zip(fold_params(msg["params"]), own)]
+            rows.append({
+                "round": r,
+                "client": name,
+                "local_best_fitness": best_fitness,
+                "local_time": local_time,
+                "local_evaluations": n_samples,
+                "round_latency": latency,
+                "bytes_sent": sent,
+                "bytes_recv": received,
+                "estimated_bytes": estimated,
+                "global_genome": json.dumps([round(g, 3) for g in global_seed]),
+            })
+            sent = received = 0
+        rows[-1]["bytes_sent"] += send_message(sock, {"type": "bye"})
+    results.put(rows)
+
+
+def run_federated(aristas=None, rounds=3, local_generations=2, pop_size=6, backend="traci", horizon=None,
+                  workers=1, cache_db="fitness_cache.sqlite", outdir="federated_out", round_timeout=None, host="127.0.0.1",
+                  port=0, codec=None, seed=42):
+    """
+    codec: None (JSON) o {"compress": bool, "delta": bool} para el formato binario de phase_codec.
+    seed: semilla base; el GA de cada cliente y ronda usa round_seed(seed, cliente, ronda).
+    """
+    scenarios = discover_scenarios()
+    if aristas:
+        scenarios = {k: v for k, v in scenarios.items() if v["arista"] in aristas}
+    if not scenarios:
+        raise ValueError("No hay aristas para el runner federado")
+
+    run_id = datetime.now().strftime("%Y%m%dT%H%M%S")
+    os.makedirs(outdir, exist_ok=True)
+    outdir = os.path.abspath(outdir)
+    ga_kwargs = {
+        "pop_size": pop_size,
+        "generations": local_generations,
+        "backend": backend,
+        "horizon": horizon,
+        "workers": workers,
+        "cache_db": cache_db,
+    }
+
+    server = AggregationServer(len(scenarios), host, port, round_timeout)
+    server.start()
+    results = mp.Queue()
+    clients = [
+        mp.Process(target=_client_main, name=f"fed_{name}",
+                   args=(name, sc, server.address, rounds, ga_kwargs, run_id, os.path.join(outdir, name), results,
+                         codec, seed))
+        for name, sc in scenarios.items()
+    ]
+    t0 = time.perf_counter()
+    for p in clients:
+        p.start()
+    # Leer la cola antes del join: un proceso con datos pendientes en la cola no termina
+    rows = []
+    alive = len(clients)
+    while alive:
+        try:
+            rows.extend(results.get(timeout=5))
+            alive -= 1
+        except Exception:
+            if not any(p.is_alive() for p in clients):
+                break
+    for p in clients:
+        p.join()
+    server.join(timeout=5)
+    wall_time = time.perf_counter() - t0
+
+    server_rows = {(row["round"], row["client"]): row for row in server.log}
+    for row in rows:
+        row.update({k: v for k, v in server_rows.get((row["round"], row["client"]), {}).items()
+                    if k not in ("round", "client")})
+        # Latencia de la ronda descontando la espera por rezagados: red + agregación
+        row["exchange_latency"] = row["round_latency"] - row.get("straggler_wait", 0.0)
+    rows.sort(key=lambda row: (row["round"], row["client"]))
+
+    out_csv = os.path.join(outdir, f"federated_{run_id}.csv")
+    fieldnames = ["round", "client", "local_best_fitness", "local_time", "local_evaluations", "round_latency", "straggler_wait",
+                  "exchange_latency", "bytes_sent", "bytes_recv", "server_bytes_recv", "server_bytes_sent",
+                  "estimated_bytes", "clients_in_round", "global_genome"]
+    with open(out_csv, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+    for r in range(1, rounds + 1):
+        rr = [row for row in rows if row["round"] == r]
+        if not rr:
+            continue
+        total = sum(row["bytes_sent"] + row["bytes_recv"] for row in rr)
+        est = sum(row["estimated_bytes"] for row in rr)
+        print(f"Ronda {r}: clientes={len(rr)} latencia_max={max(row['round_latency'] for row in rr):.2f}s "
+              f"espera_rezagados_max={max(row.get('straggler_wait', 0.0) for row in rr):.2f}s "
+              f"bytes_reales={total} bytes_estimados={est}")
+    print(f"Runner federado terminado en {wall_time:.1f}s -> {out_csv}")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--aristas", type=int, nargs="*", default=None, help="Aristas participantes (default: todas)")
+    parser.add_argument("--rounds", type=int, default=3, help="Rondas federadas")
+    parser.add_argument("--local-gen", type=int, default=2, help="Generaciones de GA local por ronda")
+    parser.add_argument("--pop", type=int, default=6, help="Población del GA local")
+    parser.add_argument("--backend", choices=["traci", "libsumo"], default="traci")
+    parser.add_argument("--horizon", type=float, default=None, help="Horizonte de simulación de cada evaluación")
+    parser.add_argument("--workers", type=int, default=1, help="Workers SUMO por cliente")
+    parser.add_argument("--outdir", type=str, default="federated_out", help="Carpeta de salida (una subcarpeta por arista)")
+    parser.add_argument("--round-timeout", type=float, default=None,
+                        help="Segundos máximos de espera por rezagados antes de agregar la ronda")
+    parser.add_argument("--port", type=int, default=0, help="Puerto del servidor de agregación (0 = libre)")
+    parser.add_argument("--codec", choices=["json", "binary"], default="json",
+                        help="Formato de los parámetros: JSON o binario compacto (phase_codec.py)")
+    parser.add_argument("--delta", action="store_true", help="Con --codec binary, enviar diferencias con la ronda anterior")
+    parser.add_argument("--compress", action="store_true", help="Con --codec binary, comprimir con zlib")
+    parser.add_argument("--seed", type=int, default=42, help="Semilla base de los GA locales")
+    args = parser.parse_args()
+
+    run_federated(aristas=args.aristas, rounds=args.rounds, local_generations=args.local_gen, pop_size=args.pop,
+                  backend=args.backend, horizon=args.horizon, workers=args.workers, outdir=args.outdir,
+                  round_timeout=args.round_timeout, port=args.port, seed=args.seed,
+                  codec={"compress": args.compress, "delta": args.delta} if args.codec == "binary" else None)
@@ -0,0 +1,143 @@
+# fitness_cache.py
+import json
+import time
+import sqlite3
+import hashlib
+from collections import OrderedDict
+
+# Memoización de evaluate_genome: la selección por ruleta y el recorte a [10,60] repiten genomas
+# constantemente y cada repetición cuesta una corrida completa de SUMO.
+# La clave es el genoma + un hash del contenido de net/route y de las opciones que cambian el fitness,
+# así que editar la red o las rutas invalida el cache automáticamente.
+
+
+def file_digest(path):
+    """sha256 del contenido de uno o varios archivos (lista separada por comas, como route-files)."""
+    h = hashlib.sha256()
+    for p in str(path).split(","):
+        with open(p.strip(), "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def scenario_key(net_file, route_file, options=None):
+    """Hash del escenario: contenido de net/route + opciones de SUMO/evaluación que afectan el fitness."""
+    h = hashlib.sha256()
+    h.update(file_digest(net_file).encode())
+    h.update(file_digest(route_file).encode())
+    h.update(json.dumps(options or {}, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class FitnessCache:
+    """
+    Cache de fitness en dos niveles:
+      - memoria (LRU, max_memory entradas) dentro de una corrida
+      - SQLite en disco (max_disk entradas, se expulsan las menos usadas) entre corridas
+    Lleva contadores hits/misses que el GA reporta por generación.
+    """
+
+    def __init__(self, scenario_hash, db_path="fitness_cache.sqlite", max_memory=10000, max_disk=100000):
+        self.scenario_hash = scenario_hash
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, timeout=30)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS fitness ("
+                " scenario_hash TEXT NOT NULL,"
+                " genome TEXT NOT NULL,"
+                " fitness REAL NOT NULL,"
+                " last_used REAL NOT NULL,"
+                " PRIMARY KEY (scenario_hash, genome))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_fitness_last_used ON fitness(last_used)")
+            self._db.commit()
+            # Filas en disco: se cuentan una vez al abrir y se llevan a mano en cada put
+            (self._disk_rows,) = self._db.execute("SELECT COUNT(*) FROM fitness").fetchone()
+
+    @staticmethod
+    def _genome_key(genome):
+        return json.dumps([int(x) for x in genome], separators=(",", ":"))
+
+    def get(self, genome):
+        """Retorna el fitness cacheado o None. Cuenta hit/miss."""
+        key = self._genome_key(genome)
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._memory[key]
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT fitness FROM fitness WHERE scenario_hash = ? AND genome = ?",
+                (self.scenario_hash, key)
+            ).fetchone()
+            if row is not None:
+                self._db.execute(
+                    "UPDATE fitness SET last_used = ? WHERE scenario_hash = ? AND genome = ?",
+                    (time.time(), self.scenario_hash, key)
+                )
+                self._db.commit()
+                self._remember(key, row[0])
+                self.hits += 1
+                return row[0]
+        self.misses += 1
+        return None
+
+    def put(self, genome, fitness):
+        key = self._genome_key(genome)
+        self._remember(key, fitness)
+        if self._db is not None:
+            now = time.time()
+            inserted = self._db.execute(
+                "INSERT OR IGNORE INTO fitness (scenario_hash, genome, fitness, last_used) VALUES (?, ?, ?, ?)",
+                (self.scenario_hash, key, float(fitness), now)
+            ).rowcount
+            if inserted:
+                self._disk_rows += 1
+                if self._disk_rows > self.max_disk:
+                    self._evict_disk()
+            else:
+                self._db.execute(
+                    "UPDATE fitness SET fitness = ?, last_used = ? WHERE scenario_hash = ? AND genome = ?",
+                    (float(fitness), now, self.scenario_hash, key)
+                )
+            self._db.commit()
+
+    def _remember(self, key, fitness):
+        self._memory[key] = fitness
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        # Solo cuando el conteo propio pasa el límite: se recuenta (otros procesos comparten el archivo)
+        (count,) = self._db.execute("SELECT COUNT(*) FROM fitness").fetchone()
+        if count > self.max_disk:
+            self._db.execute(
+                "DELETE FROM fitness WHERE rowid IN (SELECT rowid FROM fitness ORDER BY last_used LIMIT ?)",
+                (count - self.max_disk,)
+            )
+            count = self.max_disk
+        self._disk_rows = count
+
+    def memory_entries(self):
+        """Entradas en memoria [(genoma json, fitness)] en orden LRU (para checkpoints)."""
+        return list(self._memory.items())
+
+    def load_memory(self, entries):
+        for key, fitness in entries:
+            self._remember(key, fitness)
+
+    def counters(self):
+        return {"cache_hits": self.hits, "cache_misses": self.misses}
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
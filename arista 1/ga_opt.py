@@ -3,17 +3,118 @@ import random
 import numpy as np
 import csv
 import os
+import json
+import time
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing.util import Finalize
+from itertools import repeat
 from deap import base, creator, tools
 
 # Importamos evaluate_genome desde sim_eval
-from sim_eval import evaluate_genome
+from sim_eval import evaluate_genome, resolve_backend, SumoEvaluator, FIDELITY_LEVELS, FAILED_FITNESS, _append_rows
+from fitness_cache import FitnessCache, scenario_key
+from warm_start import ensure_warm_state
+from results_store import ResultsStore
+from surrogate import SurrogateModel, select_for_simulation, accuracy
+from genome_layout import genome_bounds
+from replication import replication_seeds, confidence_interval, decide
+from checkpoint import CHECKPOINT_DIR, checkpoint_path, save_checkpoint, load_checkpoint
 
-# NUEVO: run_ga_optimization ahora acepta sumo_binary y lo pasa a evaluate_genome
-def run_ga_optimization(pop_size, generations, net_file, route_file, scenario, run_id, sumo_binary="sumo"):
-    random.seed(42)
+# Argumentos de evaluate_genome que no cambian el fitness (no entran al hash del cache)
+_CACHE_NEUTRAL_KWARGS = ("net_file", "route_file", "scenario", "run_id", "sumo_binary", "collection", "backend",
+                         "state_file", "trace")
+
+# Columnas de replications_{scenario}_{run_id}.csv (una fila por genoma replicado)
+REPLICATION_FIELDS = ["scenario", "run_id", "generation", "fidelity", "genome", "replications", "mean", "std",
+                      "ci_low", "ci_high", "decision", "seeds"]
+
+
+# SumoEvaluator del proceso worker (modo persistent): una instancia de SUMO por worker
+_worker_evaluator = None
+# ResultsStore del proceso worker: cada worker acumula sus filas y las escribe en lote al mismo SQLite
+_worker_store = None
+
+
+class _RowBuffer:
+    """
+    Store del worker en el GA generacional: junta las filas de cada evaluación para devolverlas con el
+    resultado. El proceso principal las agrega a su ResultsStore, que escribe en lote y vacía el buffer
+    al cerrar cada generación (antes del checkpoint), sin una transacción por evaluación en los workers.
+    """
+
+    def __init__(self):
+        self.rows = []
+
+    def add_evaluation(self, row, tls_rows=(), genome=None):
+        self.rows.append((row, list(tls_rows), genome))
+
+    def drain(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+
+# Buffer del worker (uno por proceso: el SumoEvaluator persistente guarda la referencia al store)
+_worker_rows = None
+
+
+def _close_worker_evaluator():
+    global _worker_evaluator
+    if _worker_evaluator is not None:
+        _worker_evaluator.report()
+        _worker_evaluator.close()
+        _worker_evaluator = None
+
+
+def _close_worker_store():
+    global _worker_store
+    if _worker_store is not None:
+        _worker_store.close()
+        _worker_store = None
+
+
+def _evaluate_job(genome, eval_kwargs, persistent=False, results_db=None, collect=False):
+    """
+    Evaluación dentro de un worker del pool (función de módulo para que sea picklable en Windows).
+    Cada proceso usa su propio label TraCI (puerto libre) y su propio log de SUMO.
+    collect: en vez de escribir a results_db, retornar (resultado, filas) para el store del proceso principal.
+    """
+    global _worker_rows
+    if not collect:
+        return _evaluate_in_worker(genome, eval_kwargs, persistent, results_db)
+    if _worker_rows is None:
+        _worker_rows = _RowBuffer()
+    result = _evaluate_in_worker(genome, dict(eval_kwargs, store=_worker_rows), persistent)
+    return result, _worker_rows.drain()
+
+
+def _evaluate_in_worker(genome, eval_kwargs, persistent=False, results_db=None):
+    global _worker_evaluator, _worker_store
+    label = f"w{os.getpid()}"
+    if results_db and _worker_store is None:
+        _worker_store = ResultsStore(results_db)
+        # Escribir lo que quede en el buffer cuando el pool apaga el worker
+        Finalize(None, _close_worker_store, exitpriority=5)
+    if "store" not in eval_kwargs:
+        eval_kwargs = dict(eval_kwargs, store=_worker_store)
+    if not persistent:
+        return evaluate_genome(genome, label=label, **eval_kwargs)
+
+    call_kwargs = {k: eval_kwargs[k] for k in ("abort_below", "with_status", "fidelity", "seed") if k in eval_kwargs}
+    if _worker_evaluator is None:
+        init_kwargs = {k: v for k, v in eval_kwargs.items() if k not in call_kwargs}
+        _worker_evaluator = SumoEvaluator(label=label, **init_kwargs)
+        # Cerrar SUMO y reportar el ahorro cuando el pool apaga el worker
+        Finalize(None, _close_worker_evaluator, exitpriority=10)
+    return _worker_evaluator.evaluate(genome, **call_kwargs)
 
-    # Configuración DEAP
+
+def _make_toolbox(bounds):
+    """
+    Configuración DEAP compartida por el GA generacional y el steady-state.
+    bounds: [(mín, máx)] por gen (genome_layout.genome_bounds). Con el layout "cyclic" son 8 genes en
+    [10,60] y la inicialización/mutación consumen el random igual que la configuración original.
+    """
     # Evitar re-definir creators si ya existen (útil si corres varias veces en misma sesión)
     try:
         creator.create("FitnessMax", base.Fitness, weights=(1.0,))
@@ -25,68 +126,770 @@ def run_ga_optimization(pop_size, generations, net_file, route_file, scenario, r
         pass
 
     toolbox = base.Toolbox()
-    toolbox.register("attr_int", random.randint, 10, 60)  # Tiempos iniciales de fase
-    toolbox.register("individual", tools.initRepeat, creator.Individual, toolbox.attr_int, n=8)  # 8 genes por individuo
+    # Tiempos iniciales de fase: un entero al azar dentro de los límites de cada gen
+    toolbox.register("individual", tools.initIterate, creator.Individual,
+                     lambda: [random.randint(lo, hi) for lo, hi in bounds])
     toolbox.register("population", tools.initRepeat, list, toolbox.individual)
     toolbox.register("mate", tools.cxOnePoint)  # Cruce arbitrario
-    toolbox.register("mutate", tools.mutGaussian, mu=35, sigma=10, indpb=0.2)  # Mutación arbitraria
+    # Mutación gaussiana centrada en el medio del rango de cada gen (35 +- 10 para [10,60])
+    toolbox.register("mutate", tools.mutGaussian, mu=[(lo + hi) / 2 for lo, hi in bounds],
+                     sigma=[(hi - lo) / 5 for lo, hi in bounds], indpb=0.2)
     toolbox.register("select", tools.selRoulette)  # Selección arbitraria
+    return toolbox
+
+
+def _clip(individual, bounds):
+    """Recorta cada gen a sus límites (en el lugar)."""
+    for i, ((lo, hi), v) in enumerate(zip(bounds, individual)):
+        individual[i] = max(lo, min(hi, int(v)))
+
+
+# NUEVO: run_ga_optimization ahora acepta sumo_binary y lo pasa a evaluate_genome
+def run_ga_optimization(pop_size, generations, net_file, route_file, scenario, run_id, sumo_binary="sumo",
+                        collection="subscription", backend="traci", workers=1, cache_db="fitness_cache.sqlite",
+                        horizon=None, drain=0, early_abort=False, elite_size=3, warmup=None, state_dir="state_cache",
+                        persistent=False, mode="traci", results_db="resultados.sqlite", surrogate=False,
+                        surrogate_fraction=0.5, surrogate_min_samples=None, screen_fidelity=None,
+                        screen_generations=None, top_k=None, initial_genomes=None, layout="cyclic", replications=1,
+                        min_replications=2, confidence=0.95, checkpoint_every=1, checkpoint_dir=CHECKPOINT_DIR,
+                        resume=False, trace=False, seed=42):
+    """
+    cache_db: archivo SQLite del cache de fitness ("" = solo memoria, None = sin cache).
+    horizon, drain: horizonte fijo de simulación (ver evaluate_genome).
+    early_abort: (requiere horizon) aborta las evaluaciones que ya no pueden superar al peor de los
+                 elite_size mejores individuos válidos de la generación actual.
+    warmup: segundos de warm-up que se simulan una sola vez y se guardan en state_dir;
+            cada evaluación arranca desde ese snapshot.
+    persistent: usar un SumoEvaluator (una instancia de SUMO reutilizada con load) por proceso
+                en lugar de lanzar SUMO en cada evaluate_genome.
+    mode: "traci" o "batch" (sin TraCI, métricas desde detectores laneData/E2 y el tripinfo; ver batch_eval.py).
+    results_db: SQLite de resultados (ver results_store.py). Las filas se escriben en lote y al final
+                se exportan a los CSV de siempre (resultados_eval_1_*, per_tls_*, summary_*).
+                None = append directo a los CSV en cada evaluación.
+    surrogate: pre-filtrar con un modelo sustituto (ver surrogate.py) entrenado con todos los pares
+               (genoma, fitness) reales vistos. Solo surrogate_fraction de los genomas a evaluar
+               (los más prometedores y los más inciertos) van a SUMO; el resto queda con el fitness
+               predicho y marcado con ind.predicted = True. El modelo se activa cuando hay
+               surrogate_min_samples fitness reales (default: pop_size).
+    screen_fidelity: nivel barato de FIDELITY_LEVELS (sim_eval.py) para pre-filtrar: en las primeras
+                     screen_generations generaciones (None = todas) toda la población se evalúa a esa
+                     fidelidad y solo los top_k genomas (default: elite_size) se re-evalúan a fidelidad
+                     completa. La selección compara a todos en la fidelidad de screening y el elite se
+                     compara solo con fitness completos (best_full_fitness en el resumen). Al terminar
+                     el screening la población pasa a evaluarse a fidelidad completa.
+    initial_genomes: genomas con los que se reemplazan los primeros individuos de la población inicial.
+    layout: distribución de los genes (genome_layout.py): "cyclic" (8 genes en [10,60] para todos los TLS)
+            o "topology" (un gen por fase verde ajustable de cada TLS, con sus propios límites).
+    replications: máximo de semillas de SUMO por genoma (1 = una corrida con la semilla por defecto).
+                  Con más, cada genoma se corre con min_replications semillas (en paralelo si hay workers)
+                  y se agregan de a una mientras el intervalo de confianza (confidence) de su fitness medio
+                  contenga al incumbente (mejor media conocida). El fitness es la media; réplicas, desvío e
+                  intervalo quedan en replications_{scenario}_{run_id}.csv y cada fila de resultados
+                  lleva su "seed" (ver replication.py).
+    checkpoint_every: cada cuántas generaciones se guarda el checkpoint de la corrida en
+                      checkpoint_dir/ga_{scenario}_{run_id}.pkl (ver checkpoint.py); None = sin checkpoints.
+    resume: continuar la corrida run_id desde su último checkpoint. Las opciones deben ser las mismas
+            (generations puede ser mayor); el resultado es el de la corrida sin interrupción.
+    trace: traza por evaluación en trace_{scenario}_{run_id}.jsonl (ver eval_trace.py).
+    seed: semilla de random para la población inicial y los operadores genéticos.
+    Retorna (mejor genoma, mejor fitness) entre los individuos simulados a fidelidad completa.
+    """
+    if early_abort and horizon is None:
+        raise ValueError("early_abort requiere horizon")
+    if replications > 1 and early_abort:
+        raise ValueError("early_abort no admite replications: la cota de abort es por corrida, no por media")
+    if replications > 1 and not 1 <= min_replications <= replications:
+        raise ValueError("min_replications debe estar entre 1 y replications")
+    if mode == "batch" and (early_abort or persistent or trace):
+        raise ValueError("El modo batch no admite early_abort, persistent ni trace (SUMO corre sin TraCI)")
+    if screen_fidelity is not None:
+        if screen_fidelity == "full" or screen_fidelity not in FIDELITY_LEVELS:
+            raise ValueError(f"screen_fidelity debe ser uno de {[f for f in FIDELITY_LEVELS if f != 'full']}")
+        if mode == "batch":
+            raise ValueError("El modo batch solo evalúa con fidelidad completa")
+        if FIDELITY_LEVELS[screen_fidelity]["horizon_scale"] != 1.0 and horizon is None:
+            raise ValueError(f"screen_fidelity=\"{screen_fidelity}\" requiere horizon")
+        # El snapshot de warm-up es microscópico: mesosim no puede cargarlo
+        if FIDELITY_LEVELS[screen_fidelity]["meso"] and warmup:
+            raise ValueError(f"screen_fidelity=\"{screen_fidelity}\" (mesosim) no admite warmup")
+    random.seed(seed)
+
+    # NUEVO: backend "libsumo" evalúa en el mismo proceso (cae a traci con sumo-gui)
+    backend = resolve_backend(backend, sumo_binary)
+
+    # NUEVO: límites por gen según el layout del genoma
+    bounds = genome_bounds(net_file, layout)
+    toolbox = _make_toolbox(bounds)
+
+    # NUEVO: snapshot de warm-up compartido por todas las evaluaciones (None = desde t=0)
+    state_file = ensure_warm_state(net_file, route_file, warmup, sumo_binary, backend, state_dir) if warmup else None
+
+    eval_kwargs = {
+        "net_file": net_file,
+        "route_file": route_file,
+        "scenario": scenario,
+        "run_id": run_id,
+        "sumo_binary": sumo_binary,
+        "collection": collection,
+        "backend": backend,
+        "horizon": horizon,
+        "drain": drain,
+        "state_file": state_file,
+        "mode": mode,
+    }
+    # Solo si no es el layout original, para no cambiar el hash del cache de las corridas existentes
+    if layout != "cyclic":
+        eval_kwargs["layout"] = layout
+    if trace:
+        eval_kwargs["trace"] = True
+
+    # NUEVO: store de resultados del proceso principal (los workers abren el suyo sobre el mismo archivo)
+    store = ResultsStore(results_db) if results_db else None
+
+    # NUEVO: evaluador persistente para la ruta serial (los workers crean el suyo)
+    evaluator = SumoEvaluator(store=store, **eval_kwargs) if persistent and workers <= 1 else None
 
     # Registrar evaluate como wrapper que pasa sumo_binary (NUEVO)
-    def _evaluate(ind):
-        genome = [int(x) for x in ind]
-        # IMPORTANT: evaluate_genome devuelve fitness (float); DEAP espera una tupla
-        return (evaluate_genome(genome, net_file, route_file, scenario, run_id, sumo_binary),)
+    # Retorna (fitness, status); _evaluate_invalid asigna la tupla de fitness que espera DEAP
+    def _evaluate(genome, **extra):
+        if evaluator is not None:
+            return evaluator.evaluate(genome, with_status=True, **extra)
+        return evaluate_genome(genome, with_status=True, store=store, **eval_kwargs, **extra)
 
     toolbox.register("evaluate", _evaluate)
 
-    population = toolbox.population(n=pop_size)
+    # NUEVO: con workers > 1 los individuos inválidos se evalúan en paralelo (una simulación por proceso).
+    # executor.map conserva el orden, así que las fitness se asignan igual que en la ruta serial.
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
 
-    # Archivo summary por generación
-    summary_file = f"summary_{scenario}_{run_id}.csv"
-    with open(summary_file, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=["scenario", "run_id", "generation", "best_fitness", "mean_fitness", "std_fitness"])
-        writer.writeheader()
-
-        for gen in range(1, generations + 1):
-            # Evaluar población
-            for ind in population:
-                if not ind.fitness.valid:
-                    ind.fitness.values = toolbox.evaluate(ind)
-
-            # Métricas de generación
-            fits = [ind.fitness.values[0] for ind in population]
-            best = max(fits)
-            mean = np.mean(fits)
-            std = np.std(fits)
-            writer.writerow({
+    # NUEVO: cache de fitness (memoria + SQLite) keyed por genoma y hash de net/route/opciones.
+    # Un cache por fidelidad: "full" conserva el hash de siempre, las demás lo extienden.
+    options = {k: v for k, v in eval_kwargs.items() if k not in _CACHE_NEUTRAL_KWARGS}
+    if warmup:
+        options["warmup"] = warmup
+    if replications > 1:
+        # El fitness cacheado es una media de réplicas: no se mezcla con el de una sola corrida
+        options["replications"] = [min_replications, replications, confidence]
+    caches = {}
+
+    # NUEVO: huella de la configuración que determina la corrida; resume exige la misma
+    run_config = scenario_key(net_file, route_file, dict(
+        options, pop_size=pop_size, early_abort=early_abort, elite_size=elite_size, surrogate=surrogate,
+        surrogate_fraction=surrogate_fraction, surrogate_min_samples=surrogate_min_samples,
+        screen_fidelity=screen_fidelity, screen_generations=screen_generations, top_k=top_k,
+        # La semilla por defecto no entra en la huella: los checkpoints anteriores siguen siendo válidos
+        **({"seed": seed} if seed != 42 else {})))
+
+    def _cache_for(fidelity):
+        if cache_db is None:
+            return None
+        if fidelity not in caches:
+            level_options = options if fidelity == "full" else dict(options, fidelity=fidelity)
+            caches[fidelity] = FitnessCache(scenario_key(net_file, route_file, level_options),
+                                            db_path=cache_db or None)
+        return caches[fidelity]
+
+    def _cache_counters():
+        totals = {"cache_hits": 0, "cache_misses": 0}
+        for c in caches.values():
+            for k, v in c.counters().items():
+                totals[k] += v
+        return totals
+
+    cache = _cache_for(screen_fidelity or "full")
+
+    # NUEVO: datos de entrenamiento del sustituto (solo fitness reales, separados por fidelidad)
+    # y estadísticas por generación
+    training = {}
+    min_samples = surrogate_min_samples if surrogate_min_samples is not None else pop_size
+    surrogate_stats = {"saved": 0, "predicted": [], "actual": []}
+
+    def _screen(batch, fidelity):
+        """Predice el lote con el sustituto; fija el fitness predicho a los que no se simulan."""
+        seen = training.setdefault(fidelity, {})
+        if not surrogate or len(seen) < min_samples or len(batch) < 2:
+            return batch, [None] * len(batch)
+        model = SurrogateModel(bounds, seed=len(seen)).fit(list(seen), list(seen.values()))
+        mean, std = model.predict([genome for genome, _ in batch])
+        chosen = set(select_for_simulation(mean, std, surrogate_fraction))
+        kept = []
+        predictions = []
+        for i, (genome, inds) in enumerate(batch):
+            if i in chosen:
+                kept.append((genome, inds))
+                predictions.append(float(mean[i]))
+                continue
+            for ind in inds:
+                ind.fitness.values = (float(mean[i]),)
+                ind.predicted = True
+                ind.fidelity = fidelity
+            surrogate_stats["saved"] += 1
+        return kept, predictions
+
+    def _run(genomes, fidelity, abort_below=None, seeds=None):
+        """Simula los genomas (serial o con el pool) y retorna [(fitness, status)] en el mismo orden."""
+        extra = {"abort_below": abort_below} if abort_below is not None else {}
+        if fidelity != "full":
+            extra["fidelity"] = fidelity
+        seeds = seeds or [None] * len(genomes)
+        if executor is None:
+            return [toolbox.evaluate(genome, **extra, **({"seed": s} if s is not None else {}))
+                    for genome, s in zip(genomes, seeds)]
+        job_kwargs = dict(eval_kwargs, with_status=True, **extra)
+        per_job = [dict(job_kwargs, seed=s) if s is not None else job_kwargs for s in seeds]
+        if store is None:
+            return executor.map(_evaluate_job, genomes, per_job, repeat(persistent))
+        # Las filas de los workers pasan al store principal: se escriben en lote y quedan en disco
+        # al cerrar la generación, antes de un checkpoint
+        results = []
+        for result, rows in executor.map(_evaluate_job, genomes, per_job, repeat(persistent), repeat(None),
+                                         repeat(True)):
+            for row in rows:
+                store.add_evaluation(*row)
+            results.append(result)
+        return results
+
+    # NUEVO: replicación adaptativa por semilla; incumbente (mejor media) por fidelidad y estadísticas
+    # de la generación para el resumen
+    seeds = replication_seeds(replications)
+    rep_state = {"generation": 0, "incumbent": {}, "runs": 0, "genomes": 0, "stds": []}
+
+    def _replicate(genomes, fidelity):
+        values = [[] for _ in genomes]
+        statuses = [[] for _ in genomes]
+        decisions = [None] * len(genomes)
+        active = list(range(len(genomes)))
+        wave = min_replications
+        # Incumbente previo (lotes anteriores); el del lote se arma por genoma sin su propia media
+        prior = rep_state["incumbent"].get(fidelity)
+        while active:
+            jobs = [(i, seeds[len(statuses[i]) + k]) for i in active
+                    for k in range(min(wave, replications - len(statuses[i])))]
+            results = _run([genomes[i] for i, _ in jobs], fidelity, seeds=[s for _, s in jobs])
+            for (i, _), (fit, status) in zip(jobs, results):
+                statuses[i].append(status)
+                if status in ("ok", "truncated"):
+                    values[i].append(fit)
+            rep_state["runs"] += len(jobs)
+            # Incumbente de cada genoma: mejor media conocida entre los demás (este lote con réplicas
+            # suficientes y lotes anteriores). Con la propia media incluida el mejor genoma nunca
+            # quedaría "better" que sí mismo y correría siempre todas las réplicas.
+            means = sorted(((sum(v) / len(v), j) for j, v in enumerate(values) if len(v) >= min_replications),
+                           reverse=True)
+            still = []
+            for i in active:
+                others = [m for m, j in means[:2] if j != i][:1]
+                incumbent = max(others + ([prior] if prior is not None else []), default=None)
+                attempts = len(statuses[i])
+                if not values[i] and attempts >= min_replications:
+                    decisions[i] = "failed"
+                    continue
+                decision = decide(values[i], incumbent, confidence, min_replications, replications)
+                if decision is None and attempts >= replications:
+                    decision = "max"
+                if decision is None:
+                    still.append(i)
+                decisions[i] = decision
+            active = still
+            wave = 1
+        best = max([sum(v) / len(v) for v in values if len(v) >= min_replications] +
+                   ([prior] if prior is not None else []), default=None)
+        if best is not None:
+            rep_state["incumbent"][fidelity] = best
+
+        results = []
+        rows = []
+        for genome, v, st, decision in zip(genomes, values, statuses, decisions):
+            if not v:
+                results.append((FAILED_FITNESS, "failed"))
+                continue
+            mean, std, half = confidence_interval(v, confidence)
+            results.append((mean, "truncated" if "truncated" in st else "ok"))
+            rep_state["genomes"] += 1
+            rep_state["stds"].append(std)
+            rows.append({
                 "scenario": scenario,
                 "run_id": run_id,
-                "generation": gen,
-                "best_fitness": best,
-                "mean_fitness": mean,
-                "std_fitness": std
+                "generation": rep_state["generation"],
+                "fidelity": fidelity,
+                "genome": json.dumps(genome),
+                "replications": len(v),
+                "mean": mean,
+                "std": std,
+                "ci_low": mean - half,
+                "ci_high": mean + half,
+                "decision": decision,
+                "seeds": ";".join(str(s) for s in seeds[:len(st)]),
             })
+        if rows:
+            _append_rows(f"replications_{scenario}_{run_id}.csv", REPLICATION_FIELDS, rows)
+        return results
+
+    def _simulate(genomes, fidelity, abort_below=None):
+        """[(fitness, status)] de los genomas en el mismo orden; con replications > 1, media de réplicas."""
+        if replications > 1 and genomes:
+            return _replicate(list(genomes), fidelity)
+        return _run(genomes, fidelity, abort_below)
+
+    def _evaluate_invalid(individuals, abort_below=None, fidelity="full"):
+        invalid = [ind for ind in individuals if not ind.fitness.valid]
+        cache = _cache_for(fidelity)
+        seen = training.setdefault(fidelity, {})
+        # Lote a simular: [(genoma, [individuos con ese genoma])]. Con cache, los genomas ya vistos
+        # se resuelven sin SUMO y los repetidos dentro del lote se simulan una sola vez.
+        batch = []
+        index = {}
+        for ind in invalid:
+            genome = [int(x) for x in ind]
+            if cache is not None:
+                key = tuple(genome)
+                if key in index:
+                    batch[index[key]][1].append(ind)
+                    cache.hits += 1
+                    continue
+                cached = cache.get(genome)
+                if cached is not None:
+                    ind.fitness.values = (cached,)
+                    ind.predicted = False
+                    ind.fidelity = fidelity
+                    seen[key] = cached
+                    continue
+                index[key] = len(batch)
+            batch.append((genome, [ind]))
+        batch, predictions = _screen(batch, fidelity)
+
+        results = _simulate([genome for genome, _ in batch], fidelity, abort_below)
+        for (genome, inds), (fit, status), predicted in zip(batch, results, predictions):
+            for ind in inds:
+                ind.fitness.values = (fit,)
+                ind.predicted = False
+                ind.fidelity = fidelity
+            if status in ("ok", "truncated"):
+                seen[tuple(genome)] = fit
+                if predicted is not None:
+                    surrogate_stats["predicted"].append(predicted)
+                    surrogate_stats["actual"].append(fit)
+            # Solo se cachean corridas completas: las fallidas pueden ser un crash transitorio
+            # y las abortadas tienen una cota que depende del umbral de esa generación
+            if cache is not None and status in ("ok", "truncated"):
+                cache.put(genome, fit)
+
+    # NUEVO: multi-fidelity. full_scores guarda el fitness a fidelidad completa de los genomas
+    # re-evaluados; el elite siempre se compara con estos valores, nunca mezclando fidelidades.
+    full_scores = {}
+    top_k = top_k if top_k is not None else elite_size
+
+    def _rescore_top(individuals):
+        """Re-evalúa a fidelidad completa los top_k genomas distintos (según el fitness de screening)."""
+        top = []
+        for ind in sorted(individuals, key=lambda ind: ind.fitness.values[0], reverse=True):
+            key = tuple(int(x) for x in ind)
+            if key not in top:
+                top.append(key)
+            if len(top) == top_k:
+                break
+        full_cache = _cache_for("full")
+        pending = []
+        for key in top:
+            if key in full_scores:
+                continue
+            cached = full_cache.get(list(key)) if full_cache is not None else None
+            if cached is not None:
+                full_scores[key] = cached
+            else:
+                pending.append(key)
+        results = _simulate([list(key) for key in pending], "full")
+        for key, (fit, status) in zip(pending, results):
+            full_scores[key] = fit
+            if full_cache is not None and status in ("ok", "truncated"):
+                full_cache.put(list(key), fit)
+        return len(pending)
+
+    population = toolbox.population(n=pop_size)
+    # NUEVO: genomas semilla (p. ej. el modelo global del runner federado) reemplazan a los primeros
+    # individuos; la población se genera igual para no alterar la secuencia de random
+    for ind, genome in zip(population, initial_genomes or ()):
+        ind[:] = [round(g) for g in genome]
+        _clip(ind, bounds)
+    # Mejor individuo simulado a fidelidad completa en toda la corrida (valor de retorno)
+    best_genome, best_fitness = None, None
+
+    # Archivo summary por generación
+    summary_file = f"summary_{scenario}_{run_id}.csv"
+
+    # NUEVO: continuar desde el checkpoint; lo que se generó arriba solo consumió random, cuyo estado
+    # se reemplaza por el guardado
+    checkpoint_file = checkpoint_path(scenario, run_id, checkpoint_dir)
+    start_gen = 1
+    summary_rows = []
+    if resume:
+        state = load_checkpoint(checkpoint_file)
+        if state["config"] != run_config:
+            raise ValueError(f"El checkpoint {checkpoint_file} es de una corrida con otras opciones")
+        start_gen = state["generation"] + 1
+        for ind, (genome, fit, attrs) in zip(population, state["population"]):
+            ind[:] = genome
+            if fit is None:
+                del ind.fitness.values
+            else:
+                ind.fitness.values = (fit,)
+            ind.__dict__.update(attrs)
+        best_genome, best_fitness = state["best"]
+        full_scores.update(state["full_scores"])
+        training.update(state["training"])
+        rep_state["incumbent"] = state["incumbent"]
+        for fidelity, entries in state["caches"].items():
+            c = _cache_for(fidelity)
+            if c is not None:
+                c.load_memory(entries)
+        random.setstate(state["random"])
+        np.random.set_state(state["numpy_random"])
+        # El store pudo escribir lotes después del checkpoint (cada flush_every evaluaciones o en
+        # generaciones sin checkpoint): esas filas se rehacen, así que se borran para no duplicarlas
+        if store is not None:
+            store.truncate_run(scenario, run_id, state.get("store_mark"), start_gen)
+        # Filas del resumen hasta el checkpoint (las de la generación interrumpida se rehacen)
+        if os.path.exists(summary_file):
+            with open(summary_file, newline="") as f:
+                summary_rows = [r for r in csv.DictReader(f) if int(r["generation"]) < start_gen]
+        print(f"Reanudando {scenario}/{run_id} desde la generación {start_gen}")
+
+    def _checkpoint(gen):
+        save_checkpoint(checkpoint_file, {
+            "config": run_config,
+            "generation": gen,
+            "population": [([int(x) for x in ind], ind.fitness.values[0] if ind.fitness.valid else None,
+                            {k: v for k, v in vars(ind).items() if k != "fitness"}) for ind in population],
+            "best": (best_genome, best_fitness),
+            "full_scores": full_scores,
+            "training": training,
+            "incumbent": rep_state["incumbent"],
+            # Con SQLite el cache ya está en disco; solo se guardan los caches en memoria
+            "caches": {fidelity: c.memory_entries() for fidelity, c in caches.items() if not cache_db},
+            "random": random.getstate(),
+            "numpy_random": np.random.get_state(),
+            # Última evaluación del store cubierta por el checkpoint: al reanudar se borra lo posterior
+            "store_mark": store.last_evaluation_id(scenario, run_id) if store is not None else None,
+        })
+
+    try:
+        with open(summary_file, "w", newline="") as f:
+            summary_fields = ["scenario", "run_id", "generation", "best_fitness", "mean_fitness", "std_fitness"]
+            if cache is not None:
+                summary_fields += ["cache_hits", "cache_misses"]
+            if surrogate:
+                summary_fields += ["surrogate_predicted", "surrogate_saved", "surrogate_mae", "surrogate_corr"]
+            if screen_fidelity is not None:
+                summary_fields += ["fidelity", "best_full_fitness", "full_evals"]
+            if replications > 1:
+                summary_fields += ["replication_runs", "mean_replications", "mean_replication_std"]
+            writer = csv.DictWriter(f, fieldnames=summary_fields)
+            writer.writeheader()
+            writer.writerows(summary_rows)
 
-            # Selección
-            offspring = toolbox.select(population, len(population))
-            offspring = list(map(toolbox.clone, offspring))
+            for gen in range(start_gen, generations + 1):
+                rep_state.update(generation=gen, runs=0, genomes=0, stds=[])
+                # Evaluar población (serial o con el pool de workers)
+                prev_counters = _cache_counters() if cache is not None else None
+                # NUEVO: fidelidad de la generación; al terminar el screening los fitness de screening
+                # se reemplazan por los completos ya conocidos o se invalidan para re-evaluar
+                screening = screen_fidelity is not None and (screen_generations is None or gen <= screen_generations)
+                gen_fidelity = screen_fidelity if screening else "full"
+                if screen_fidelity is not None and not screening:
+                    for ind in population:
+                        if ind.fitness.valid and getattr(ind, "fidelity", "full") != "full":
+                            key = tuple(int(x) for x in ind)
+                            if key in full_scores:
+                                ind.fitness.values = (full_scores[key],)
+                                ind.fidelity = "full"
+                                ind.predicted = False
+                            else:
+                                del ind.fitness.values
+                # NUEVO: umbral de early-abort = peor de los elite_size mejores ya evaluados
+                abort_below = None
+                if early_abort:
+                    valid = sorted((ind.fitness.values[0] for ind in population if ind.fitness.valid), reverse=True)
+                    if len(valid) >= elite_size:
+                        abort_below = valid[elite_size - 1]
+                _evaluate_invalid(population, abort_below, gen_fidelity)
+                full_evals = _rescore_top(population) if screening else 0
 
-            # Cruce
-            for child1, child2 in zip(offspring[::2], offspring[1::2]):
-                if random.random() < 0.5:
-                    toolbox.mate(child1, child2)
-                    del child1.fitness.values
-                    del child2.fitness.values
+                # Métricas de generación
+                fits = [ind.fitness.values[0] for ind in population]
+                for ind in population:
+                    real = not getattr(ind, "predicted", False) and getattr(ind, "fidelity", "full") == "full"
+                    if real and (best_fitness is None or ind.fitness.values[0] > best_fitness):
+                        best_genome, best_fitness = [int(x) for x in ind], ind.fitness.values[0]
+                if screen_fidelity is not None:
+                    for key in {tuple(int(x) for x in ind) for ind in population}:
+                        if key in full_scores and (best_fitness is None or full_scores[key] > best_fitness):
+                            best_genome, best_fitness = list(key), full_scores[key]
+                best = max(fits)
+                mean = np.mean(fits)
+                std = np.std(fits)
+                row = {
+                    "scenario": scenario,
+                    "run_id": run_id,
+                    "generation": gen,
+                    "best_fitness": best,
+                    "mean_fitness": mean,
+                    "std_fitness": std
+                }
+                if cache is not None:
+                    # hits/misses de esta generación
+                    for k, v in _cache_counters().items():
+                        row[k] = v - prev_counters[k]
+                if surrogate:
+                    # Simulaciones evitadas en esta generación y error del sustituto sobre las que sí se
+                    # simularon (predicción hecha antes de simular)
+                    mae, corr = accuracy(surrogate_stats["predicted"], surrogate_stats["actual"])
+                    row["surrogate_predicted"] = sum(1 for ind in population if getattr(ind, "predicted", False))
+                    row["surrogate_saved"] = surrogate_stats["saved"]
+                    row["surrogate_mae"] = mae
+                    row["surrogate_corr"] = corr
+                    surrogate_stats.update(saved=0, predicted=[], actual=[])
+                if screen_fidelity is not None:
+                    # Mejor fitness a fidelidad completa entre los genomas de la población que lo tienen
+                    if screening:
+                        full_fits = [full_scores[k] for k in {tuple(int(x) for x in ind) for ind in population}
+                                     if k in full_scores]
+                    else:
+                        full_fits = fits
+                    row["fidelity"] = gen_fidelity
+                    row["best_full_fitness"] = max(full_fits) if full_fits else None
+                    row["full_evals"] = full_evals
+                if replications > 1:
+                    # Corridas de SUMO de la generación, réplicas promedio por genoma y ruido medio
+                    row["replication_runs"] = rep_state["runs"]
+                    row["mean_replications"] = rep_state["runs"] / rep_state["genomes"] if rep_state["genomes"] else 0
+                    row["mean_replication_std"] = float(np.mean(rep_state["stds"])) if rep_state["stds"] else None
+                writer.writerow(row)
+                if store is not None:
+                    # Cierra la generación: escribe en lote las evaluaciones pendientes
+                    store.add_generation(row)
 
-            # Mutación: aplicar y recortar a [10,60]
-            for mutant in offspring:
-                if random.random() < 0.2:
-                    toolbox.mutate(mutant)
-                    for i, v in enumerate(mutant):
-                        mutant[i] = max(10, min(60, int(v)))
-                    del mutant.fitness.values
+                # Selección
+                offspring = toolbox.select(population, len(population))
+                offspring = list(map(toolbox.clone, offspring))
 
-            population[:] = offspring
+                # Cruce
+                for child1, child2 in zip(offspring[::2], offspring[1::2]):
+                    if random.random() < 0.5:
+                        toolbox.mate(child1, child2)
+                        del child1.fitness.values
+                        del child2.fitness.values
+
+                # Mutación: aplicar y recortar a los límites de cada gen ([10,60] en el layout original)
+                for mutant in offspring:
+                    if random.random() < 0.2:
+                        toolbox.mutate(mutant)
+                        _clip(mutant, bounds)
+                        del mutant.fitness.values
+
+                population[:] = offspring
+
+                # NUEVO: checkpoint al cerrar la generación (con el resumen ya en disco)
+                if checkpoint_every and (gen % checkpoint_every == 0 or gen == generations):
+                    f.flush()
+                    _checkpoint(gen)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if evaluator is not None:
+            evaluator.report()
+            evaluator.close()
+        for c in caches.values():
+            c.close()
+        if store is not None:
+            # Las filas de los workers ya pasaron por este store en cada generación
+            store.export_csv(scenario, run_id, replace_run=resume)
+            store.close()
 
     print(f"GA terminado para escenario {scenario}. Resultados guardados.")
+    return best_genome, best_fitness
+
+
+# NUEVO: reglas de reemplazo del GA steady-state
+_REPLACEMENT_RULES = ("worst", "oldest", "tournament")
+
+
+def run_steady_state_optimization(pop_size, evaluations, net_file, route_file, scenario, run_id, sumo_binary="sumo",
+                                  collection="subscription", backend="traci", workers=1,
+                                  cache_db="fitness_cache.sqlite", horizon=None, drain=0, warmup=None,
+                                  state_dir="state_cache", persistent=False, mode="traci",
+                                  results_db="resultados.sqlite", replacement="worst", report_every=None,
+                                  layout="cyclic", trace=False):
+    """
+    GA steady-state asíncrono: no hay barrera de generación. En cuanto termina cualquier evaluación
+    su individuo se inserta en la población y se genera un hijo nuevo para el worker libre, así un
+    genoma lento (simulación hasta t=42082 s) no deja al resto de los workers esperando.
+    Mismos operadores que run_ga_optimization (ruleta, cxOnePoint, mutGaussian, recorte a los límites del
+    layout del genoma).
+    evaluations: presupuesto total de evaluaciones (incluye los aciertos del cache).
+    replacement: "worst" (el hijo reemplaza al peor si lo supera), "oldest" (FIFO, siempre reemplaza)
+                 o "tournament" (reemplaza al peor de 3 individuos al azar si lo supera).
+    report_every: cada cuántas evaluaciones se escribe una fila en steady_summary_{scenario}_{run_id}.csv
+                  (default: pop_size, una "generación equivalente"). Prefijo propio: las filas van por
+                  evaluaciones, no por generación, y no deben mezclarse con los summary_* del GA generacional.
+    Con workers > 1 el orden de llegada depende de los tiempos de simulación, así que dos corridas
+    con la misma semilla pueden diferir; con workers = 1 la corrida es reproducible.
+    """
+    if replacement not in _REPLACEMENT_RULES:
+        raise ValueError(f"Regla de reemplazo desconocida: {replacement}")
+    if pop_size < 2:
+        raise ValueError("El steady-state necesita pop_size >= 2 para seleccionar padres")
+    random.seed(42)
+    backend = resolve_backend(backend, sumo_binary)
+    bounds = genome_bounds(net_file, layout)
+    toolbox = _make_toolbox(bounds)
+    report_every = report_every or pop_size
+
+    state_file = ensure_warm_state(net_file, route_file, warmup, sumo_binary, backend, state_dir) if warmup else None
+    eval_kwargs = {
+        "net_file": net_file,
+        "route_file": route_file,
+        "scenario": scenario,
+        "run_id": run_id,
+        "sumo_binary": sumo_binary,
+        "collection": collection,
+        "backend": backend,
+        "horizon": horizon,
+        "drain": drain,
+        "state_file": state_file,
+        "mode": mode,
+    }
+    if layout != "cyclic":
+        eval_kwargs["layout"] = layout
+    if trace:
+        eval_kwargs["trace"] = True
+    job_kwargs = dict(eval_kwargs, with_status=True)
+
+    store = ResultsStore(results_db) if results_db else None
+    evaluator = SumoEvaluator(store=store, **eval_kwargs) if persistent and workers <= 1 else None
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    cache = None
+    if cache_db is not None:
+        options = {k: v for k, v in eval_kwargs.items() if k not in _CACHE_NEUTRAL_KWARGS}
+        if warmup:
+            options["warmup"] = warmup
+        cache = FitnessCache(scenario_key(net_file, route_file, options), db_path=cache_db or None)
+
+    population = []  # individuos evaluados en orden de inserción (el primero es el más viejo)
+    pending = toolbox.population(n=pop_size)  # población inicial todavía sin evaluar
+    in_flight = {}  # future -> (individuo, genoma)
+    progress = {"done": 0, "submitted": 0}
+    prev_counters = cache.counters() if cache is not None else None
+    start = time.perf_counter()
+
+    summary_fields = ["scenario", "run_id", "evaluations", "best_fitness", "mean_fitness", "std_fitness", "elapsed_sec"]
+    if cache is not None:
+        summary_fields += ["cache_hits", "cache_misses"]
+    summary_file = f"steady_summary_{scenario}_{run_id}.csv"
+
+    def _offspring():
+        if pending:
+            return pending.pop(0)
+        parents = list(map(toolbox.clone, toolbox.select(population, 2)))
+        if random.random() < 0.5:
+            toolbox.mate(parents[0], parents[1])
+        child = parents[0]
+        if random.random() < 0.2:
+            toolbox.mutate(child)
+            _clip(child, bounds)
+        del child.fitness.values
+        return child
+
+    def _insert(ind):
+        if len(population) < pop_size:
+            population.append(ind)
+            return
+        fit = ind.fitness.values[0]
+        if replacement == "oldest":
+            population.pop(0)
+            population.append(ind)
+            return
+        if replacement == "worst":
+            candidates = range(len(population))
+        else:
+            candidates = random.sample(range(len(population)), min(3, len(population)))
+        loser = min(candidates, key=lambda i: population[i].fitness.values[0])
+        if fit > population[loser].fitness.values[0]:
+            population.pop(loser)
+            population.append(ind)
+
+    def _complete(ind, genome, fit, status, writer):
+        nonlocal prev_counters
+        ind.fitness.values = (fit,)
+        if cache is not None and status in ("ok", "truncated"):
+            cache.put(genome, fit)
+        _insert(ind)
+        progress["done"] += 1
+        done = progress["done"]
+        if done % report_every and done != evaluations:
+            return
+        fits = [p.fitness.values[0] for p in population]
+        row = {
+            "scenario": scenario,
+            "run_id": run_id,
+            "evaluations": done,
+            "best_fitness": max(fits),
+            "mean_fitness": np.mean(fits),
+            "std_fitness": np.std(fits),
+            "elapsed_sec": time.perf_counter() - start,
+        }
+        if cache is not None:
+            counters = cache.counters()
+            for k, v in counters.items():
+                row[k] = v - prev_counters[k]
+            prev_counters = counters
+        writer.writerow(row)
+        if store is not None:
+            store.flush()
+
+    def _launch(ind, writer):
+        """Resuelve con el cache o la ruta serial; con el pool deja el individuo en vuelo."""
+        genome = [int(x) for x in ind]
+        if cache is not None:
+            cached = cache.get(genome)
+            if cached is not None:
+                _complete(ind, genome, cached, "cached", writer)
+                return
+        if executor is not None:
+            future = executor.submit(_evaluate_job, genome, job_kwargs, persistent, results_db)
+            in_flight[future] = (ind, genome)
+        elif evaluator is not None:
+            _complete(ind, genome, *evaluator.evaluate(genome, with_status=True), writer)
+        else:
+            _complete(ind, genome, *evaluate_genome(genome, with_status=True, store=store, **eval_kwargs), writer)
+
+    try:
+        with open(summary_file, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=summary_fields)
+            writer.writeheader()
+            while progress["done"] < evaluations:
+                # Mantener ocupados todos los workers (en serie: una evaluación a la vez)
+                while (progress["submitted"] < evaluations and len(in_flight) < max(1, workers)
+                       and (pending or len(population) >= 2)):
+                    progress["submitted"] += 1
+                    _launch(_offspring(), writer)
+                if not in_flight:
+                    continue
+                finished, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    ind, genome = in_flight.pop(future)
+                    _complete(ind, genome, *future.result(), writer)
+                f.flush()
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if evaluator is not None:
+            evaluator.report()
+            evaluator.close()
+        if cache is not None:
+            cache.close()
+        if store is not None:
+            # El resumen por evaluaciones ya está en steady_summary_*.csv: solo se exportan evaluaciones y per_tls
+            store.export_csv(scenario, run_id)
+            store.close()
+
+    print(f"GA steady-state terminado para escenario {scenario}. Resultados guardados.")
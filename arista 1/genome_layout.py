@@ -0,0 +1,111 @@
+# genome_layout.py
+import os
+from functools import lru_cache
+
+from scenarios import net_index
+
+# Distribución de los genes del genoma sobre los programas TLS de la red.
+#   "cyclic":   el esquema original: 8 genes compartidos por todos los TLS, la fase i usa genome[i % 8]
+#               (incluidas amarillas y todo-rojo).
+#   "topology": un gen por cada fase verde ajustable de cada TLS, leída del net.xml con sumolib.
+#               Las amarillas/todo-rojo conservan su duración original y cada gen tiene sus propios
+#               límites, así que el GA no gasta simulaciones en amarillas de 10-60 s.
+
+LAYOUTS = ("cyclic", "topology")
+CYCLIC_LENGTH = 8
+# Límites de los genes: los del GA original para los verdes principales y más cortos para los verdes
+# breves del programa original (giros protegidos de 6 s)
+GREEN_BOUNDS = (10, 60)
+MINOR_GREEN_BOUNDS = (3, 20)
+MINOR_GREEN_MAX = 10
+
+
+def is_adjustable(state):
+    """Fase verde ajustable: alguna señal verde y ninguna amarilla (las de transición quedan fijas)."""
+    return any(c in "Gg" for c in state) and not any(c in "yYu" for c in state)
+
+
+def _phase_bounds(duration, min_dur, max_dur, green_bounds=GREEN_BOUNDS, minor_green_bounds=MINOR_GREEN_BOUNDS,
+                  minor_green_max=MINOR_GREEN_MAX):
+    # Programas actuados: la red ya trae los límites de la fase
+    if 0 < min_dur < max_dur:
+        return int(min_dur), int(max_dur)
+    return tuple(minor_green_bounds) if duration < minor_green_max else tuple(green_bounds)
+
+
+class GenomeLayout:
+    """
+    programs: {tls: [(duración, state, minDur, maxDur)]} en el orden de fases del programa.
+    options: green_bounds, minor_green_bounds, minor_green_max de _phase_bounds (default: los del módulo).
+    genes: [(tls, índice de fase)] de las fases ajustables; bounds: [(mín, máx)] por gen.
+    """
+
+    def __init__(self, programs, **options):
+        self.programs = programs
+        self.genes = []
+        self.bounds = []
+        for tls, phases in programs.items():
+            for i, (duration, state, min_dur, max_dur) in enumerate(phases):
+                if is_adjustable(state):
+                    self.genes.append((tls, i))
+                    self.bounds.append(_phase_bounds(duration, min_dur, max_dur, **options))
+
+    def __len__(self):
+        return len(self.genes)
+
+    def gene_names(self):
+        return [f"{tls}:{i}" for tls, i in self.genes]
+
+    def clip(self, genome):
+        return [max(lo, min(hi, int(g))) for g, (lo, hi) in zip(genome, self.bounds)]
+
+    def default_genome(self):
+        """Duraciones verdes del programa original (recortadas a los límites de cada gen)."""
+        return self.clip([self.programs[tls][i][0] for tls, i in self.genes])
+
+    def durations(self, genome):
+        """{tls: [duración de cada fase]}: genes en las fases ajustables, el resto como en la red."""
+        if len(genome) != len(self.genes):
+            raise ValueError(f"El genoma tiene {len(genome)} genes y el layout {len(self.genes)}")
+        result = {tls: [max(1, int(p[0])) for p in phases] for tls, phases in self.programs.items()}
+        for (tls, i), g in zip(self.genes, genome):
+            result[tls][i] = max(1, int(g))
+        return result
+
+
+@lru_cache(maxsize=16)
+def _cached_layout(path, mtime, size, options):
+    index = net_index(path)
+    return GenomeLayout({tls: [tuple(phase) for phase in program["phases"]]
+                         for tls, program in index["tls"].items()}, **dict(options))
+
+
+def build_layout(net_file, green_bounds=GREEN_BOUNDS, minor_green_bounds=MINOR_GREEN_BOUNDS,
+                 minor_green_max=MINOR_GREEN_MAX):
+    """
+    Layout "topology" de la red (desde scenarios.net_index). Se arma una vez por proceso para cada
+    combinación de archivo (ruta, mtime y tamaño, como net_index) y opciones de límites.
+    """
+    path = os.path.abspath(net_file)
+    stat = os.stat(path)
+    options = (("green_bounds", tuple(green_bounds)), ("minor_green_bounds", tuple(minor_green_bounds)),
+               ("minor_green_max", minor_green_max))
+    return _cached_layout(path, stat.st_mtime, stat.st_size, options)
+
+
+def genome_bounds(net_file, layout="cyclic", **options):
+    """Límites por gen del genoma para el layout dado (options: las de build_layout)."""
+    if layout == "cyclic":
+        return [tuple(options.get("green_bounds", GREEN_BOUNDS))] * CYCLIC_LENGTH
+    if layout == "topology":
+        return list(build_layout(net_file, **options).bounds)
+    raise ValueError(f"Layout de genoma desconocido: {layout}")
+
+
+def phase_durations(genome, net_file, layout="cyclic", **options):
+    """{tls: [duración por fase]} para el layout "topology"; None para "cyclic" (regla genome[i % len])."""
+    if layout == "cyclic":
+        return None
+    if layout == "topology":
+        return build_layout(net_file, **options).durations(genome)
+    raise ValueError(f"Layout de genoma desconocido: {layout}")
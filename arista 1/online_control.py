@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# online_control.py
+import argparse
+import math
+import time
+
+import numpy as np
+import traci.constants as tc
+
+from genome_layout import is_adjustable, phase_durations
+from scenarios import find_scenario, net_index
+from sim_eval import (_apply_genome, _fitness_terms, _logfile_name, _sumo_command, _subscribe_controlled_lanes,
+                      _write_results, _append_rows, evaluate_genome, resolve_backend, start_backend)
+
+# Modo de control online: en lugar de fijar el programa TLS una vez y simular, la corrida avanza paso a
+# paso y al final de cada verde ajustable una política decide si extenderlo, mirando la cola de los
+# carriles que ese verde atiende frente a la de los que esperan en rojo.
+# Observaciones por lote: una suscripción por carril controlado (cola, espera, vehículos) y una por TLS
+# (fase actual, próximo cambio); por paso se leen con dos getAllSubscriptionResults, sin getters por TLS.
+# Latencia de decisión por TLS: desde que se arma la observación hasta que se envía la extensión
+# (setPhaseDuration), percentiles p50/p95/p99 en online_{scenario}_{run_id}.csv.
+# Presupuesto por paso (budget_ms): si las decisiones del paso ya lo consumieron, los TLS que faltan
+# siguen con el programa estático (sin extensión) y se cuenta un fallback.
+# Las filas globales y por TLS son las de evaluate_genome (mismo fitness), así que una corrida online se
+# compara directamente con la evaluación estática del mismo genoma.
+
+ONLINE_FIELDS = ["scenario", "run_id", "tls", "decisions", "extensions", "fallbacks", "budget_ms",
+                 "latency_p50_ms", "latency_p95_ms", "latency_p99_ms", "latency_max_ms"]
+
+_TLS_VARS = (tc.TL_CURRENT_PHASE, tc.TL_NEXT_SWITCH)
+
+
+class QueueExtensionPolicy:
+    """
+    Política ajustada a mano (threshold/extension/max_extension se pueden optimizar como el genoma):
+    extiende el verde actual extension segundos si su cola es de al menos threshold vehículos y no es
+    menor que la de los carriles en rojo, hasta max_extension segundos por fase.
+    """
+
+    def __init__(self, threshold=3, extension=5, max_extension=30):
+        self.threshold = threshold
+        self.extension = extension
+        self.max_extension = max_extension
+
+    def decide(self, served_queue, waiting_queue, extended):
+        """Segundos a extender la fase actual (0 = dejar que cambie)."""
+        if extended + self.extension > self.max_extension:
+            return 0
+        if served_queue >= self.threshold and served_queue >= waiting_queue:
+            return self.extension
+        return 0
+
+
+def _phase_lanes(states, lanes):
+    """Por fase: (carriles con verde, carriles en rojo), sin duplicados, en orden de linkIndex."""
+    result = []
+    for state in states:
+        served = dict.fromkeys(lane for lane, c in zip(lanes, state) if c in "Gg")
+        waiting = dict.fromkeys(lane for lane, c in zip(lanes, state) if c not in "Gg" and lane not in served)
+        result.append((tuple(served), tuple(waiting)))
+    return result
+
+
+def run_online_control(net_file, route_file, scenario, run_id, genome=None, layout="cyclic", policy=None,
+                       budget_ms=5.0, horizon=None, drain=0, sumo_binary="sumo", backend="traci", seed=None,
+                       store=None):
+    """
+    Corre el escenario con control online. genome: programa base (None = el del net.xml), aplicado
+    igual que en evaluate_genome; policy: objeto con decide(served_queue, waiting_queue, extended)
+    (default: QueueExtensionPolicy()).
+    Retorna {"fitness", "status", "decisions", "extensions", "fallbacks", "latency_ms": {tls: (p50, p95, p99)}}.
+    """
+    policy = policy or QueueExtensionPolicy()
+    backend = resolve_backend(backend, sumo_binary)
+    index = net_index(net_file)
+    durations = phase_durations(genome, net_file, layout) if genome is not None else None
+    logfile = _logfile_name(scenario, run_id)
+    start_eval = time.time()
+    conn = start_backend(_sumo_command(net_file, route_file, sumo_binary, logfile, seed=seed), backend)
+    try:
+        tls_list = list(index["tls"])
+        if genome is not None:
+            applied = _apply_genome(conn, tls_list, genome, durations, index)
+        else:
+            applied = {tls: [int(p[0]) for p in index["tls"][tls]["phases"]] for tls in tls_list}
+
+        tls_lanes = _subscribe_controlled_lanes(conn, tls_list, "lane", index)
+        states = {tls: [p[1] for p in index["tls"][tls]["phases"]] for tls in tls_list}
+        phase_lanes = {tls: _phase_lanes(states[tls], tls_lanes[tls]) for tls in tls_list}
+        for tls in tls_list:
+            conn.trafficlight.subscribe(tls, _TLS_VARS)
+
+        tls_metrics = {tls: {"queue": 0, "wait": 0, "veh_set": set()} for tls in tls_list}
+        latencies = {tls: [] for tls in tls_list}
+        counts = {tls: {"decisions": 0, "extensions": 0, "fallbacks": 0} for tls in tls_list}
+        extended = {tls: [None, 0] for tls in tls_list}  # [fase, segundos ya extendidos en esa fase]
+        budget = budget_ms / 1000.0
+
+        dt = conn.simulation.getDeltaT()
+        max_steps = int(math.ceil((horizon + drain) / dt)) if horizon is not None else None
+        total_steps = 0
+        total_queue = 0
+        total_wait = 0
+        status = "ok"
+
+        while conn.simulation.getMinExpectedNumber() > 0:
+            if max_steps is not None and total_steps >= max_steps:
+                status = "truncated"
+                break
+            conn.simulationStep()
+            total_steps += 1
+            now = total_steps * dt
+
+            lane_results = conn.lane.getAllSubscriptionResults()
+            tl_results = conn.trafficlight.getAllSubscriptionResults()
+
+            # Métricas: mismas sumas que _collect_step_subscription (carriles con duplicados)
+            for tls, lanes in tls_lanes.items():
+                m = tls_metrics[tls]
+                for lane in lanes:
+                    values = lane_results.get(lane)
+                    if not values:
+                        continue
+                    m["queue"] += values[tc.LAST_STEP_VEHICLE_HALTING_NUMBER]
+                    m["wait"] += values[tc.VAR_WAITING_TIME]
+                    m["veh_set"].update(values[tc.LAST_STEP_VEHICLE_ID_LIST])
+                    total_queue += values[tc.LAST_STEP_VEHICLE_HALTING_NUMBER]
+                    total_wait += values[tc.VAR_WAITING_TIME]
+
+            # Decisiones: solo en los verdes ajustables que terminan antes del próximo paso
+            step_start = time.perf_counter()
+            for tls in tls_list:
+                values = tl_results.get(tls)
+                if not values:
+                    continue
+                phase = values[tc.TL_CURRENT_PHASE]
+                remaining = values[tc.TL_NEXT_SWITCH] - now
+                if extended[tls][0] != phase:
+                    extended[tls] = [phase, 0]
+                if remaining > dt or phase >= len(states[tls]) or not is_adjustable(states[tls][phase]):
+                    continue
+                if time.perf_counter() - step_start > budget:
+                    # Presupuesto del paso agotado: este TLS sigue con el programa estático
+                    counts[tls]["fallbacks"] += 1
+                    continue
+                t0 = time.perf_counter()
+                served, waiting = phase_lanes[tls][phase]
+                served_queue = sum(lane_results[lane][tc.LAST_STEP_VEHICLE_HALTING_NUMBER]
+                                   for lane in served if lane in lane_results)
+                waiting_queue = sum(lane_results[lane][tc.LAST_STEP_VEHICLE_HALTING_NUMBER]
+                                    for lane in waiting if lane in lane_results)
+                extension = policy.decide(served_queue, waiting_queue, extended[tls][1])
+                if extension > 0:
+                    conn.trafficlight.setPhaseDuration(tls, remaining + extension)
+                    extended[tls][1] += extension
+                    counts[tls]["extensions"] += 1
+                latencies[tls].append((time.perf_counter() - t0) * 1000.0)
+                counts[tls]["decisions"] += 1
+
+        sim_time = conn.simulation.getTime()
+        total_veh = conn.simulation.getArrivedNumber()
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    # Mismo cálculo y filas que evaluate_genome (tiempos en segundos simulados)
+    norm_steps = (max_steps if max_steps is not None else total_steps) * dt
+    avg_queue, avg_wait, jam_penalty, avg_travel, fitness = _fitness_terms(
+        total_queue * dt, total_wait * dt, norm_steps, len(tls_list)
+    )
+    sim_time_sec = sim_time / 1000.0
+    result_row = {
+        "scenario": scenario,
+        "run_id": run_id,
+        "fitness": fitness,
+        "avg_travel": avg_travel,
+        "avg_wait": avg_wait,
+        "avg_queue": avg_queue,
+        "jam_penalty": jam_penalty,
+        "flow": total_veh / sim_time_sec if sim_time_sec > 0 else 0,
+        "eval_time": time.time() - start_eval,
+        "sim_time_sec": sim_time_sec,
+        "total_veh": total_veh,
+        "status": status,
+        "fidelity": "full",
+        "seed": seed
+    }
+    steps = norm_steps if norm_steps > 0 else 1
+    tls_rows = [{
+        "scenario": scenario,
+        "run_id": run_id,
+        "tls": tls,
+        "avg_queue_tls": m["queue"] * dt / steps,
+        "avg_wait_tls": m["wait"] * dt / steps,
+        "vehicle_count_tls": len(m["veh_set"]),
+        "flow_tls": len(m["veh_set"]) / sim_time_sec if sim_time_sec > 0 else 0,
+        "fidelity": "full",
+        "phase_durations": ";".join(str(d) for d in applied.get(tls, ())),
+        "seed": seed
+    } for tls, m in tls_metrics.items()]
+    _write_results(scenario, run_id, result_row, tls_rows, store, genome)
+
+    online_rows = []
+    latency_summary = {}
+    for tls in tls_list:
+        lat = np.asarray(latencies[tls])
+        p50, p95, p99 = (float(v) for v in np.percentile(lat, [50, 95, 99])) if lat.size else (None, None, None)
+        latency_summary[tls] = (p50, p95, p99)
+        online_rows.append(dict(counts[tls], scenario=scenario, run_id=run_id, tls=tls, budget_ms=budget_ms,
+                                latency_p50_ms=p50, latency_p95_ms=p95, latency_p99_ms=p99,
+                                latency_max_ms=float(lat.max()) if lat.size else None))
+    _append_rows(f"online_{scenario}_{run_id}.csv", ONLINE_FIELDS, online_rows)
+
+    return {
+        "fitness": fitness,
+        "status": status,
+        "decisions": sum(c["decisions"] for c in counts.values()),
+        "extensions": sum(c["extensions"] for c in counts.values()),
+        "fallbacks": sum(c["fallbacks"] for c in counts.values()),
+        "latency_ms": latency_summary,
+    }
+
+
+if __name__ == "__main__":
+    from datetime import datetime
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--arista", type=int, default=1, help="Número de arista del escenario")
+    parser.add_argument("--scenario", type=str, default=None, help="Nombre del escenario (default: {N}_arista)")
+    parser.add_argument("--genome", type=int, nargs="*", default=None,
+                        help="Programa base (genes del layout); sin genoma se usa el programa del net.xml")
+    parser.add_argument("--layout", choices=["cyclic", "topology"], default="cyclic")
+    parser.add_argument("--budget-ms", type=float, default=5.0, help="Presupuesto de decisión por paso (ms)")
+    parser.add_argument("--threshold", type=int, default=3, help="Cola mínima del verde para extenderlo")
+    parser.add_argument("--extension", type=int, default=5, help="Segundos por extensión")
+    parser.add_argument("--max-extension", type=int, default=30, help="Extensión máxima por fase (s)")
+    parser.add_argument("--horizon", type=float, default=None, help="Horizonte fijo de simulación (s)")
+    parser.add_argument("--drain", type=float, default=0)
+    parser.add_argument("--backend", choices=["traci", "libsumo"], default="traci")
+    parser.add_argument("--seed", type=int, default=None, help="--seed de SUMO")
+    parser.add_argument("--compare", action="store_true",
+                        help="Evaluar también el programa estático (evaluate_genome) con el mismo genoma")
+    args = parser.parse_args()
+
+    sc = find_scenario(args.arista)
+    scenario = args.scenario or f"{args.arista}_arista"
+    run_id = datetime.now().strftime("%Y%m%dT%H%M%S")
+    result = run_online_control(
+        sc["net"], sc["route"], scenario, run_id, genome=args.genome, layout=args.layout,
+        policy=QueueExtensionPolicy(args.threshold, args.extension, args.max_extension), budget_ms=args.budget_ms,
+        horizon=args.horizon, drain=args.drain, backend=args.backend, seed=args.seed
+    )
+    print(f"Online: fitness={result['fitness']:.2f} ({result['status']}) decisiones={result['decisions']} "
+          f"extensiones={result['extensions']} fallbacks={result['fallbacks']}")
+    for tls, (p50, p95, p99) in result["latency_ms"].items():
+        if p50 is not None:
+            print(f"  {tls}: p50={p50:.3f}ms p95={p95:.3f}ms p99={p99:.3f}ms")
+    if args.compare:
+        if args.genome is None:
+            parser.error("--compare requiere --genome (evaluate_genome siempre aplica un genoma)")
+        # Sin "_" en el run_id: analyze_results lo toma del nombre del CSV por TLS
+        static = evaluate_genome(args.genome, sc["net"], sc["route"], scenario, f"{run_id}-static",
+                                 backend=args.backend, horizon=args.horizon, drain=args.drain, layout=args.layout,
+                                 seed=args.seed)
+        print(f"Estático: fitness={static:.2f} (diferencia online - estático = {result['fitness'] - static:+.2f})")
@@ -0,0 +1,101 @@
+# phase_codec.py
+import struct
+import zlib
+
+# Formato binario de las actualizaciones de tiempos de fase (clientes <-> agregador del runner federado).
+# Las duraciones que aplica evaluate_genome son enteras y el GA las recorta a [10,60]: un byte por fase
+# alcanza, frente a los 8 bytes (float64) que supone la estimación de analyze_results.py.
+#
+# Mensaje = encabezado fijo + cuerpo (opcionalmente comprimido con zlib):
+#   encabezado "!2sBBHIH": magic b"PC", versión, flags, ronda, peso (n_samples para FedAvg), número de TLS
+#   cuerpo, por TLS:  [largo del id (uint8) + id utf-8]  (se omite si ambos extremos comparten tls_order)
+#                     número de fases (uint8)
+#                     [modo (uint8): 0 = uint8, 1 = delta]  (solo con FLAG_DELTA)
+#                     una fase por byte: uint8 (0 = sin dato) o int8 con la diferencia respecto de la
+#                     ronda anterior (reference), que ambos extremos conservan
+# Un TLS cae a uint8 si no está en reference, cambió su número de fases, tiene fases sin dato o
+# alguna diferencia no entra en int8.
+
+MAGIC = b"PC"
+VERSION = 1
+FLAG_DELTA = 0x01
+FLAG_ZLIB = 0x02
+FLAG_NO_IDS = 0x04
+
+_HEADER = struct.Struct("!2sBBHIH")
+_MODE_UINT8 = 0
+_MODE_DELTA = 1
+
+
+def _quantize(durations):
+    """Duraciones a enteros en [1,255]; None (gen sin dato) se codifica como 0."""
+    return [0 if d is None else max(1, min(255, int(round(d)))) for d in durations]
+
+
+def encode_update(params, round_index=0, weight=0, reference=None, compress=False, delta=False, tls_order=None):
+    """
+    params: {tls: [duración por fase]} (None = sin dato). reference: parámetros de la ronda anterior
+    (solo con delta). tls_order: orden de TLS acordado por ambos extremos; si se da, no se envían los ids.
+    Retorna los bytes del mensaje.
+    """
+    flags = (FLAG_DELTA if delta else 0) | (FLAG_ZLIB if compress else 0) | (FLAG_NO_IDS if tls_order else 0)
+    order = list(tls_order) if tls_order else list(params)
+    body = bytearray()
+    for tls in order:
+        values = _quantize(params[tls])
+        if not tls_order:
+            name = tls.encode("utf-8")
+            body.append(len(name))
+            body += name
+        body.append(len(values))
+        if delta:
+            ref = _quantize(reference[tls]) if reference and tls in reference else None
+            diffs = [v - r for v, r in zip(values, ref)] if ref and len(ref) == len(values) else None
+            if diffs is not None and 0 not in values and 0 not in ref and all(-128 <= d <= 127 for d in diffs):
+                body.append(_MODE_DELTA)
+                body += struct.pack(f"{len(diffs)}b", *diffs)
+                continue
+            body.append(_MODE_UINT8)
+        body += bytes(values)
+    if compress:
+        body = zlib.compress(bytes(body), 9)
+    return _HEADER.pack(MAGIC, VERSION, flags, round_index & 0xFFFF, weight, len(order)) + bytes(body)
+
+
+def decode_update(data, reference=None, tls_order=None):
+    """Inverso de encode_update. Retorna (ronda, peso, {tls: [duración o None]})."""
+    magic, version, flags, round_index, weight, n_tls = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Mensaje de fases con magic inválido")
+    if version != VERSION:
+        raise ValueError(f"Versión de codec no soportada: {version}")
+    body = data[_HEADER.size:]
+    if flags & FLAG_ZLIB:
+        body = zlib.decompress(body)
+    if flags & FLAG_NO_IDS and not tls_order:
+        raise ValueError("El mensaje no trae ids de TLS y no se dio tls_order")
+
+    order = list(tls_order) if flags & FLAG_NO_IDS else None
+    params = {}
+    pos = 0
+    for i in range(n_tls):
+        if order is not None:
+            tls = order[i]
+        else:
+            length = body[pos]
+            tls = bytes(body[pos + 1:pos + 1 + length]).decode("utf-8")
+            pos += 1 + length
+        n = body[pos]
+        pos += 1
+        mode = _MODE_UINT8
+        if flags & FLAG_DELTA:
+            mode = body[pos]
+            pos += 1
+        if mode == _MODE_DELTA:
+            diffs = struct.unpack_from(f"{n}b", body, pos)
+            values = [r + d for r, d in zip(_quantize(reference[tls]), diffs)]
+        else:
+            values = [v if v else None for v in body[pos:pos + n]]
+        pos += n
+        params[tls] = values
+    return round_index, weight, params
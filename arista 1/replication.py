@@ -0,0 +1,63 @@
+# replication.py
+import math
+from statistics import NormalDist
+
+# Replicación por semilla del fitness (run_ga_optimization(replications=N)).
+# Una sola corrida de SUMO con la semilla por defecto es ruidosa (speedFactor de cada vehículo, etc.):
+# cada genoma se evalúa con varias --seed y se resume en media e intervalo de confianza t-Student.
+# Se agregan réplicas solo mientras el intervalo contiene al incumbente (el mejor fitness medio
+# conocido); en cuanto queda claramente por encima o por debajo, el genoma ya está decidido.
+
+# Semilla por defecto de SUMO: la réplica 0 coincide con la evaluación sin replicación
+DEFAULT_SUMO_SEED = 23423
+
+# Cuantiles t de dos colas para pocos grados de libertad (df = 1..10); con más se usa la expansión
+# de Cornish-Fisher desde el cuantil normal
+_T_TABLE = {
+    0.90: (6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812),
+    0.95: (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228),
+    0.99: (63.657, 9.925, 5.841, 4.604, 4.032, 3.707, 3.499, 3.355, 3.250, 3.169),
+}
+
+
+def replication_seeds(n):
+    return [DEFAULT_SUMO_SEED + i for i in range(n)]
+
+
+def t_quantile(confidence, df):
+    """Valor crítico t de dos colas para el nivel de confianza dado."""
+    table = _T_TABLE.get(round(confidence, 2))
+    if table is not None and df <= len(table):
+        return table[df - 1]
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    return (z + (z ** 3 + z) / (4 * df) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+            + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3))
+
+
+def confidence_interval(values, confidence=0.95):
+    """(media, desviación estándar muestral, semiancho del intervalo); con menos de 2 valores el semiancho es inf."""
+    n = len(values)
+    mean = sum(values) / n
+    if n < 2:
+        return mean, 0.0, math.inf
+    std = math.sqrt(sum((v - mean) ** 2 for v in values) / (n - 1))
+    return mean, std, t_quantile(confidence, n - 1) * std / math.sqrt(n)
+
+
+def decide(values, incumbent, confidence=0.95, min_replications=2, max_replications=5):
+    """
+    Estado de un genoma con las réplicas hechas: "better"/"worse" si el intervalo separa al genoma del
+    incumbente, "max" si se agotaron las réplicas y None si hace falta otra réplica.
+    Sin incumbente basta con min_replications ("min").
+    """
+    n = len(values)
+    if n < min_replications:
+        return None
+    mean, _, half = confidence_interval(values, confidence)
+    if incumbent is None:
+        return "min"
+    if mean - half > incumbent:
+        return "better"
+    if mean + half < incumbent:
+        return "worse"
+    return "max" if n >= max_replications else None
@@ -0,0 +1,291 @@
+# results_store.py
+import os
+import csv
+import json
+import sqlite3
+
+from sim_eval import RESULTS_FIELDS, PER_TLS_FIELDS, _append_rows, _file_lock
+
+# Almacén de resultados en SQLite: reemplaza los append a CSV por evaluación.
+# Las filas se acumulan en memoria y se escriben en lote (una transacción cada flush_every
+# evaluaciones, al cerrar una generación y al cerrar el store).
+# Tablas:
+#   genomes      genomas únicos (se referencian por id desde evaluations)
+#   evaluations  una fila por evaluación (mismas columnas que resultados_eval_1_{scenario}.csv)
+#   per_tls      métricas por semáforo de cada evaluación (mismas columnas que per_tls_{scenario}_{run_id}.csv)
+#   generations  resumen por generación del GA (summary_{scenario}_{run_id}.csv); las columnas
+#                opcionales (cache_hits, ...) van en extra como JSON
+# Todas indexadas por (scenario, run_id). export_csv regenera los CSV con los nombres de siempre.
+
+_EVAL_COLUMNS = RESULTS_FIELDS[2:]
+_TLS_COLUMNS = PER_TLS_FIELDS[3:]
+_GEN_COLUMNS = ["generation", "best_fitness", "mean_fitness", "std_fitness"]
+# Conteos: afinidad INTEGER para que el CSV exportado siga mostrando "771" y no "771.0"
+_INTEGER_COLUMNS = ("total_veh", "vehicle_count_tls", "seed")
+
+
+def _column_type(column):
+    if column in ("status", "fidelity", "phase_durations"):
+        return "TEXT"
+    return "INTEGER" if column in _INTEGER_COLUMNS else "REAL"
+
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS genomes (
+    id INTEGER PRIMARY KEY,
+    genome TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS evaluations (
+    id INTEGER PRIMARY KEY,
+    scenario TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    genome_id INTEGER REFERENCES genomes(id),
+    {", ".join(f"{c} {_column_type(c)}" for c in _EVAL_COLUMNS)}
+);
+CREATE TABLE IF NOT EXISTS per_tls (
+    evaluation_id INTEGER NOT NULL REFERENCES evaluations(id),
+    scenario TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    tls TEXT NOT NULL,
+    {", ".join(f"{c} {_column_type(c)}" for c in _TLS_COLUMNS)}
+);
+CREATE TABLE IF NOT EXISTS generations (
+    scenario TEXT NOT NULL,
+    run_id TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    best_fitness REAL,
+    mean_fitness REAL,
+    std_fitness REAL,
+    extra TEXT,
+    PRIMARY KEY (scenario, run_id, generation)
+);
+CREATE INDEX IF NOT EXISTS idx_evaluations_run ON evaluations(scenario, run_id);
+CREATE INDEX IF NOT EXISTS idx_per_tls_run ON per_tls(scenario, run_id);
+CREATE INDEX IF NOT EXISTS idx_per_tls_evaluation ON per_tls(evaluation_id);
+"""
+
+
+def _genome_key(genome):
+    return json.dumps([int(x) for x in genome], separators=(",", ":"))
+
+
+class ResultsStore:
+    """
+    Escritor de resultados con buffer sobre un único SQLite indexado.
+    Varios procesos (workers del GA) pueden abrir el mismo archivo: cada uno escribe sus lotes
+    en una transacción propia (modo WAL, con espera si otro proceso tiene el lock).
+    """
+
+    def __init__(self, db_path="resultados.sqlite", flush_every=100):
+        self.db_path = db_path
+        self.flush_every = flush_every
+        self._pending = []  # [(row, tls_rows, genome)]
+        self._pending_generations = []
+        self._db = sqlite3.connect(db_path, timeout=60)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self._migrate()
+        self._db.commit()
+
+    def _migrate(self):
+        """Agrega a un store existente las columnas nuevas de RESULTS_FIELDS/PER_TLS_FIELDS (p. ej. fidelity)."""
+        for table, columns in (("evaluations", _EVAL_COLUMNS), ("per_tls", _TLS_COLUMNS)):
+            existing = {row[1] for row in self._db.execute(f"PRAGMA table_info({table})")}
+            for c in columns:
+                if c not in existing:
+                    self._db.execute(f"ALTER TABLE {table} ADD COLUMN {c} {_column_type(c)}")
+
+    # --- escritura -------------------------------------------------------------------------
+
+    def add_evaluation(self, row, tls_rows=(), genome=None):
+        """Encola una evaluación (fila de RESULTS_FIELDS + filas de PER_TLS_FIELDS)."""
+        self._pending.append((row, list(tls_rows), genome))
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def add_generation(self, row):
+        """Encola una fila del resumen por generación y escribe todo lo pendiente."""
+        self._pending_generations.append(row)
+        self.flush()
+
+    def flush(self):
+        if not self._pending and not self._pending_generations:
+            return
+        with self._db:
+            genome_ids = {}
+            keys = {_genome_key(g) for _, _, g in self._pending if g is not None}
+            if keys:
+                self._db.executemany("INSERT OR IGNORE INTO genomes (genome) VALUES (?)", [(k,) for k in keys])
+                for key in keys:
+                    (genome_ids[key],) = self._db.execute("SELECT id FROM genomes WHERE genome = ?", (key,)).fetchone()
+
+            tls_values = []
+            for row, tls_rows, genome in self._pending:
+                cur = self._db.execute(
+                    f"INSERT INTO evaluations (scenario, run_id, genome_id, {', '.join(_EVAL_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * (len(_EVAL_COLUMNS) + 3))})",
+                    [row["scenario"], row["run_id"], genome_ids.get(_genome_key(genome)) if genome is not None else None]
+                    + [row.get(c) for c in _EVAL_COLUMNS]
+                )
+                tls_values.extend(
+                    [cur.lastrowid, r["scenario"], r["run_id"], r["tls"]] + [r.get(c) for c in _TLS_COLUMNS]
+                    for r in tls_rows
+                )
+            if tls_values:
+                self._db.executemany(
+                    f"INSERT INTO per_tls (evaluation_id, scenario, run_id, tls, {', '.join(_TLS_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * (len(_TLS_COLUMNS) + 4))})",
+                    tls_values
+                )
+
+            self._db.executemany(
+                "INSERT OR REPLACE INTO generations (scenario, run_id, generation, best_fitness, mean_fitness, "
+                "std_fitness, extra) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (r["scenario"], r["run_id"], int(r["generation"]), float(r["best_fitness"]),
+                     float(r["mean_fitness"]), float(r["std_fitness"]),
+                     json.dumps({k: v for k, v in r.items() if k not in _GEN_COLUMNS + ["scenario", "run_id"]},
+                                default=float))
+                    for r in self._pending_generations
+                ]
+            )
+        self._pending = []
+        self._pending_generations = []
+
+    def truncate_run(self, scenario, run_id, after_evaluation_id=None, from_generation=None):
+        """
+        Borra lo que run_id escribió después de un punto de la corrida (reanudación desde un checkpoint):
+        evaluaciones con id > after_evaluation_id (y sus filas per_tls) y generaciones >= from_generation.
+        None deja esa tabla como está. Lo pendiente en memoria se descarta.
+        """
+        self._pending = []
+        self._pending_generations = []
+        with self._db:
+            if after_evaluation_id is not None:
+                self._db.execute(
+                    "DELETE FROM per_tls WHERE evaluation_id IN (SELECT id FROM evaluations "
+                    "WHERE scenario = ? AND run_id = ? AND id > ?)", (scenario, run_id, after_evaluation_id)
+                )
+                self._db.execute("DELETE FROM evaluations WHERE scenario = ? AND run_id = ? AND id > ?",
+                                 (scenario, run_id, after_evaluation_id))
+            if from_generation is not None:
+                self._db.execute("DELETE FROM generations WHERE scenario = ? AND run_id = ? AND generation >= ?",
+                                 (scenario, run_id, from_generation))
+
+    def close(self):
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+    # --- consultas (todas por el índice scenario/run_id) ------------------------------------
+
+    def _query(self, sql, params):
+        cur = self._db.execute(sql, params)
+        names = [d[0] for d in cur.description]
+        return [dict(zip(names, values)) for values in cur]
+
+    def latest_run_id(self, scenario):
+        row = self._db.execute(
+            "SELECT run_id FROM evaluations WHERE scenario = ? ORDER BY id DESC LIMIT 1", (scenario,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def last_evaluation_id(self, scenario, run_id):
+        """id de la última evaluación escrita de run_id (0 si no hay); escribe antes lo pendiente."""
+        self.flush()
+        row = self._db.execute(
+            "SELECT MAX(id) FROM evaluations WHERE scenario = ? AND run_id = ?", (scenario, run_id)
+        ).fetchone()
+        return row[0] or 0
+
+    def last_evaluation(self, scenario):
+        rows = self._query(
+            f"SELECT {', '.join(RESULTS_FIELDS)} FROM evaluations WHERE scenario = ? ORDER BY id DESC LIMIT 1",
+            (scenario,)
+        )
+        return rows[0] if rows else None
+
+    def evaluations(self, scenario, run_id=None):
+        """Filas de evaluación (columnas de RESULTS_FIELDS) en orden de escritura."""
+        columns = ", ".join(RESULTS_FIELDS)
+        if run_id is None:
+            return self._query(f"SELECT {columns} FROM evaluations WHERE scenario = ? ORDER BY id", (scenario,))
+        return self._query(f"SELECT {columns} FROM evaluations WHERE scenario = ? AND run_id = ? ORDER BY id",
+                           (scenario, run_id))
+
+    def per_tls(self, scenario, run_id):
+        return self._query(
+            f"SELECT {', '.join(PER_TLS_FIELDS)} FROM per_tls WHERE scenario = ? AND run_id = ? "
+            f"ORDER BY evaluation_id, rowid",
+            (scenario, run_id)
+        )
+
+    def generations(self, scenario, run_id):
+        rows = []
+        for r in self._query(
+            f"SELECT scenario, run_id, {', '.join(_GEN_COLUMNS)}, extra FROM generations "
+            f"WHERE scenario = ? AND run_id = ? ORDER BY generation",
+            (scenario, run_id)
+        ):
+            extra = json.loads(r.pop("extra") or "{}")
+            r.update(extra)
+            rows.append(r)
+        return rows
+
+    # --- exportación a los CSV de siempre --------------------------------------------------
+
+    def export_csv(self, scenario, run_id, outdir=".", replace_run=False):
+        """
+        Escribe los CSV que usaba el flujo anterior:
+          - agrega las evaluaciones de run_id a resultados_eval_1_{scenario}.csv
+          - per_tls_{scenario}_{run_id}.csv y summary_{scenario}_{run_id}.csv (se reescriben)
+        replace_run: quitar antes las filas de run_id que ya estaban en resultados_eval_1 (una corrida
+                     reanudada exporta de nuevo todas sus evaluaciones).
+        Retorna la lista de archivos escritos.
+        """
+        self.flush()
+        written = []
+        evaluations = self.evaluations(scenario, run_id)
+        if evaluations:
+            path = os.path.join(outdir, f"resultados_eval_1_{scenario}.csv")
+            if replace_run:
+                _drop_run_rows(path, run_id)
+            _append_rows(path, RESULTS_FIELDS, evaluations)
+            written.append(path)
+
+        tls_rows = self.per_tls(scenario, run_id)
+        if tls_rows:
+            path = os.path.join(outdir, f"per_tls_{scenario}_{run_id}.csv")
+            _write_csv(path, PER_TLS_FIELDS, tls_rows)
+            written.append(path)
+
+        generations = self.generations(scenario, run_id)
+        if generations:
+            fieldnames = []
+            for r in generations:
+                fieldnames += [k for k in r if k not in fieldnames]
+            path = os.path.join(outdir, f"summary_{scenario}_{run_id}.csv")
+            _write_csv(path, fieldnames, generations)
+            written.append(path)
+        return written
+
+
+def _drop_run_rows(path, run_id):
+    if not os.path.exists(path):
+        return
+    with _file_lock(path):
+        with open(path, newline="") as f:
+            reader = csv.DictReader(f)
+            fieldnames = reader.fieldnames
+            rows = list(reader)
+        kept = [r for r in rows if r.get("run_id") != run_id]
+        if fieldnames and len(kept) != len(rows):
+            _write_csv(path, fieldnames, kept)
+
+
+def _write_csv(path, fieldnames, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
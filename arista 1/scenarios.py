@@ -0,0 +1,144 @@
+# scenarios.py
+import os
+import re
+import glob
+import json
+import xml.etree.ElementTree as ET
+
+import sumolib
+
+from fitness_cache import file_digest
+
+# Descubre los escenarios "arista N" del repositorio a partir de su .sumocfg,
+# para que benchmarks y runners no dependan de rutas absolutas ni del nombre de cada archivo
+# (cada carpeta usa un esquema distinto: simulacion_arista2.*, 4_arista_simulation.*, ...).
+#
+# NUEVO: índice de topología por red (net_index). La red se parsea una sola vez con sumolib y se guarda
+# un JSON compacto en .scenario_index/ junto al net.xml, con nombre = sha256 del contenido; editar la
+# red genera un índice nuevo. Contiene lo que antes se redescubría en cada evaluación por TraCI:
+#   tls:   {tls: {"program_id", "type", "offset", "phases": [[duración, state, minDur, maxDur]],
+#                 "lanes": carriles controlados en orden de linkIndex, con duplicados}}
+#   lanes: {carril controlado: {"length", "edge"}}
+# minDur/maxDur siguen la convención de TraCI (sin valor en la red = la duración de la fase).
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+INDEX_VERSION = 1
+INDEX_DIR = ".scenario_index"
+
+# Índices ya cargados en este proceso: {ruta: (mtime, tamaño, índice)}
+_loaded_indexes = {}
+
+
+def _cfg_value(cfg_root, tag):
+    node = cfg_root.find(f".//input/{tag}")
+    return node.get("value") if node is not None else None
+
+
+def discover_scenarios(root=REPO_ROOT):
+    """
+    Retorna {nombre: {"arista", "dir", "sumocfg", "net", "route", "additional"}} ordenado por número de arista.
+    El nombre sigue la convención de los CSV existentes: "{N}_arista".
+    """
+    scenarios = {}
+    dirs = []
+    for d in glob.glob(os.path.join(root, "arista *")):
+        m = re.match(r"arista (\d+)$", os.path.basename(d))
+        if m and os.path.isdir(d):
+            dirs.append((int(m.group(1)), d))
+
+    for n, d in sorted(dirs):
+        cfgs = sorted(glob.glob(os.path.join(d, "*.sumocfg")))
+        if not cfgs:
+            continue
+        cfg = cfgs[0]
+        cfg_root = ET.parse(cfg).getroot()
+        net = _cfg_value(cfg_root, "net-file")
+        route = _cfg_value(cfg_root, "route-files")
+        if not net or not route:
+            continue
+        additional = _cfg_value(cfg_root, "additional-files")
+        scenarios[f"{n}_arista"] = {
+            "arista": n,
+            "dir": d,
+            "sumocfg": cfg,
+            "net": os.path.join(d, net),
+            # route-files puede tener varios archivos separados por coma; SUMO acepta la misma lista
+            "route": ",".join(os.path.join(d, r.strip()) for r in route.split(",")),
+            # programas TLS / detectores extra del sumocfg (los programas base están en el net.xml)
+            "additional": [os.path.join(d, a.strip()) for a in additional.split(",")] if additional else [],
+        }
+    return scenarios
+
+
+def find_scenario(arista, root=REPO_ROOT):
+    """Escenario de la arista N (ver discover_scenarios); KeyError si no existe."""
+    scenarios = discover_scenarios(root)
+    name = f"{int(arista)}_arista"
+    if name not in scenarios:
+        raise KeyError(f"No se encontró la arista {arista} (hay: {', '.join(scenarios) or 'ninguna'})")
+    return scenarios[name]
+
+
+def _phase_limit(value, duration):
+    return float(value) if value is not None and float(value) >= 0 else float(duration)
+
+
+def _build_index(net_file):
+    net = sumolib.net.readNet(net_file, withPrograms=True)
+    tls_index = {}
+    lanes = {}
+    for tls in net.getTrafficLights():
+        programs = tls.getPrograms()
+        if not programs:
+            continue
+        program_id = sorted(programs)[0]
+        program = programs[program_id]
+        # Mismo orden que traci.trafficlight.getControlledLanes: por linkIndex, con duplicados
+        controlled = [c[0].getID() for c in sorted(tls.getConnections(), key=lambda c: c[2])]
+        for lane in controlled:
+            lane_obj = net.getLane(lane)
+            lanes[lane] = {"length": lane_obj.getLength(), "edge": lane_obj.getEdge().getID()}
+        tls_index[tls.getID()] = {
+            "program_id": program_id,
+            "type": program.getType(),
+            "offset": str(program.getOffset()),
+            "phases": [[float(p.duration), p.state, _phase_limit(p.minDur, p.duration),
+                        _phase_limit(p.maxDur, p.duration)] for p in program.getPhases()],
+            "lanes": controlled,
+        }
+    return {"version": INDEX_VERSION, "net": os.path.basename(net_file), "tls": tls_index, "lanes": lanes}
+
+
+def net_index(net_file, cache_dir=None):
+    """
+    Índice de topología de la red (ver arriba). Se busca en memoria (mismo mtime/tamaño), luego en
+    cache_dir (default: .scenario_index/ junto a la red) por hash del contenido y, si no está, se
+    parsea con sumolib y se guarda. El resultado es compartido: no modificarlo.
+    """
+    path = os.path.abspath(net_file)
+    stat = os.stat(path)
+    loaded = _loaded_indexes.get(path)
+    if loaded is not None and loaded[:2] == (stat.st_mtime, stat.st_size):
+        return loaded[2]
+
+    cache_dir = cache_dir or os.path.join(os.path.dirname(path), INDEX_DIR)
+    index_file = os.path.join(cache_dir, f"{file_digest(path)[:32]}_v{INDEX_VERSION}.json")
+    index = None
+    if os.path.exists(index_file):
+        try:
+            with open(index_file, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+    if index is None:
+        index = _build_index(path)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f"{index_file}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(index, f, separators=(",", ":"))
+            os.replace(tmp, index_file)
+        except OSError as e:
+            print(f"[WARN] No se pudo guardar el índice de {net_file}: {e}")
+    _loaded_indexes[path] = (stat.st_mtime, stat.st_size, index)
+    return index
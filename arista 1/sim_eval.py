@@ -1,17 +1,536 @@
 # sim_eval.py
 import os
+import math
 import csv
 import time
 import traci
+import traci.constants as tc
 import sumolib
 from datetime import datetime
 import traceback
+from collections import namedtuple
+from contextlib import contextmanager
+
+from genome_layout import phase_durations
+from scenarios import net_index
+from eval_trace import EvalTrace, trace_file_name
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 # Módulo separado con evaluate_genome para evitar importaciones circulares.
 # Esta versión captura logs de SUMO y maneja cierres inesperados, devolviendo un fitness muy bajo
 # en caso de fallo para que el GA pueda continuar.
 
-def evaluate_genome(genome, net_file, route_file, scenario, run_id, sumo_binary="sumo"):
+# Fitness que se devuelve cuando SUMO/TraCI falla
+FAILED_FITNESS = -1e9
+
+RESULTS_FIELDS = [
+    "scenario", "run_id", "fitness", "avg_travel", "avg_wait",
+    "avg_queue", "jam_penalty", "flow", "eval_time", "sim_time_sec", "total_veh", "status", "fidelity", "seed"
+]
+PER_TLS_FIELDS = [
+    "scenario", "run_id", "tls", "avg_queue_tls", "avg_wait_tls",
+    "vehicle_count_tls", "flow_tls", "fidelity", "phase_durations", "seed"
+]
+
+# NUEVO: niveles de fidelidad para evaluación multi-fidelity. "full" es la simulación microscópica original.
+#   sumo_args:     opciones extra de SUMO
+#   horizon_scale: fracción del horizonte (desde el inicio o el snapshot) que se simula; requiere horizon
+#   meso:          en --mesosim los getters por carril devuelven 0, así que se leen las aristas (edges)
+# Las métricas se integran en segundos (valor del paso * step-length), de modo que la normalización
+# no depende del step-length.
+FIDELITY_LEVELS = {
+    "full": {"sumo_args": [], "horizon_scale": 1.0, "meso": False},
+    "coarse": {"sumo_args": ["--step-length", "2"], "horizon_scale": 1.0, "meso": False},
+    # sin --meso-junction-control el modelo meso ignora los semáforos y todos los genomas empatan
+    "meso": {"sumo_args": ["--mesosim", "--meso-junction-control"], "horizon_scale": 1.0, "meso": True},
+    "short": {"sumo_args": [], "horizon_scale": 0.5, "meso": False},
+}
+
+# NUEVO: tipos de programa TLS del net.xml -> constante TraCI, para armar la lógica desde el índice
+# de la red (scenarios.net_index) sin getCompleteRedYellowGreenDefinition. Otros tipos usan TraCI.
+_TLS_TYPES = {
+    "static": tc.TRAFFICLIGHT_TYPE_STATIC,
+    "actuated": tc.TRAFFICLIGHT_TYPE_ACTUATED,
+    "delay_based": tc.TRAFFICLIGHT_TYPE_DELAYBASED,
+}
+# Mismos campos que usa el loop de aplicación de las lógicas/fases de TraCI
+_IndexLogic = namedtuple("_IndexLogic", "programID type currentPhaseIndex phases")
+_IndexPhase = namedtuple("_IndexPhase", "duration state minDur maxDur")
+
+# Variables de carril que se leen en cada paso (modo "subscription")
+_LANE_VARS = (
+    tc.LAST_STEP_VEHICLE_HALTING_NUMBER,
+    tc.VAR_WAITING_TIME,
+    tc.LAST_STEP_VEHICLE_ID_LIST,
+)
+
+
+@contextmanager
+def _file_lock(path, timeout=60.0):
+    """
+    Lock exclusivo entre procesos sobre "{path}.lock" (fcntl en POSIX, msvcrt en Windows).
+    Permite que varios workers del GA agreguen filas al mismo CSV sin intercalarlas.
+    El ".lock" queda en disco a propósito (está en .gitignore): borrarlo al soltar dejaría a un proceso
+    que ya lo abrió bloqueando un archivo que otro vuelve a crear, y los dos escribirían a la vez.
+    """
+    lock_path = path + ".lock"
+    with open(lock_path, "a+") as lf:
+        if fcntl is not None:
+            fcntl.flock(lf.fileno(), fcntl.LOCK_EX)
+        else:
+            deadline = time.time() + timeout
+            while True:
+                try:
+                    lf.seek(0)
+                    msvcrt.locking(lf.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    if time.time() > deadline:
+                        raise
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lf.fileno(), fcntl.LOCK_UN)
+            else:
+                lf.seek(0)
+                msvcrt.locking(lf.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _append_rows(path, fieldnames, rows):
+    """
+    Agrega filas a un CSV bajo lock; escribe el header si el archivo está vacío o no existe.
+    Si el archivo tiene un header anterior (p. ej. sin la columna "status"), se reescribe
+    con las columnas nuevas antes de agregar, dejando vacías las que faltan.
+    """
+    with _file_lock(path):
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, newline="") as f:
+                reader = csv.DictReader(f)
+                old_rows = list(reader) if reader.fieldnames != fieldnames else None
+            if old_rows is not None:
+                with open(path, "w", newline="") as f:
+                    writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+                    writer.writeheader()
+                    writer.writerows(old_rows)
+        with open(path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            if f.tell() == 0:
+                writer.writeheader()
+            writer.writerows(rows)
+
+
+def _write_results(scenario, run_id, row, tls_rows=(), store=None, genome=None):
+    """
+    Destino de las filas de una evaluación: el ResultsStore (buffer + SQLite, ver results_store.py)
+    si se pasó uno, o el append directo a los CSV de siempre.
+    """
+    if store is not None:
+        store.add_evaluation(row, tls_rows, genome)
+        return
+    _append_rows(f"resultados_eval_1_{scenario}.csv", RESULTS_FIELDS, [row])
+    if tls_rows:
+        _append_rows(f"per_tls_{scenario}_{run_id}.csv", PER_TLS_FIELDS, tls_rows)
+
+
+def resolve_backend(backend, sumo_binary="sumo"):
+    """
+    Decide qué backend usar realmente para una evaluación.
+    libsumo corre SUMO dentro del proceso Python (sin socket), pero no soporta sumo-gui
+    ni está siempre instalado; en esos casos se cae a traci con un aviso.
+    """
+    if backend not in ("traci", "libsumo"):
+        raise ValueError(f"Backend desconocido: {backend}")
+    if backend == "libsumo":
+        if "sumo-gui" in os.path.basename(sumo_binary):
+            print("[WARN] libsumo no soporta sumo-gui; usando traci.")
+            return "traci"
+        try:
+            import libsumo  # noqa: F401
+        except ImportError:
+            print("[WARN] libsumo no está disponible; usando traci.")
+            return "traci"
+    return backend
+
+
+def start_backend(sumoCmd, backend, label=None):
+    """
+    Inicia SUMO y retorna el objeto de conexión (módulo traci, traci.Connection o libsumo)
+    con la misma API. Con label, traci abre una conexión con nombre propio en un puerto libre,
+    lo que permite varias simulaciones simultáneas (workers del GA).
+    """
+    if backend == "libsumo":
+        import libsumo
+        libsumo.start(sumoCmd)
+        return libsumo
+    if label is None:
+        traci.start(sumoCmd)
+        return traci
+    traci.start(sumoCmd, port=sumolib.miscutils.getFreeSocketPort(), label=label)
+    return traci.getConnection(label)
+
+
+def _tls_definitions(conn, tls, index=None, state_loaded=False):
+    """
+    Lógicas del TLS con la forma de getCompleteRedYellowGreenDefinition. Con el índice de la red se
+    arman sin consultar a SUMO (solo la fase actual si se cargó un snapshot).
+    """
+    program = index["tls"].get(tls) if index is not None else None
+    if program is None or program["type"] not in _TLS_TYPES:
+        return conn.trafficlight.getCompleteRedYellowGreenDefinition(tls)
+    current = conn.trafficlight.getPhase(tls) if state_loaded else 0
+    phases = [_IndexPhase(*phase) for phase in program["phases"]]
+    return [_IndexLogic(program["program_id"], _TLS_TYPES[program["type"]], current, phases)]
+
+
+def _subscribe_controlled_lanes(conn, tls_list, domain="lane", index=None):
+    """
+    Resuelve una sola vez los carriles controlados de cada TLS y suscribe cada carril
+    (sin duplicados) a las variables de _LANE_VARS.
+    Retorna {tls: tupla de carriles} conservando el orden y los duplicados de
+    getControlledLanes para que las sumas coincidan con el modo "polling".
+    Con domain="edge" (mesosim) se suscriben las aristas de esos carriles, una vez por TLS.
+    index: índice de la red (scenarios.net_index); los carriles y sus aristas salen de ahí sin TraCI.
+    """
+    if index is not None:
+        tls_lanes = {tls: tuple(index["tls"][tls]["lanes"]) for tls in tls_list}
+        edge_of = lambda lane: index["lanes"][lane]["edge"]  # noqa: E731
+    else:
+        tls_lanes = {tls: tuple(conn.trafficlight.getControlledLanes(tls)) for tls in tls_list}
+        edge_of = conn.lane.getEdgeID
+    if domain == "edge":
+        tls_lanes = {tls: tuple(dict.fromkeys(edge_of(lane) for lane in lanes))
+                     for tls, lanes in tls_lanes.items()}
+    for lane in {lane for lanes in tls_lanes.values() for lane in lanes}:
+        getattr(conn, domain).subscribe(lane, _LANE_VARS)
+    return tls_lanes
+
+
+def _collect_step_subscription(conn, tls_lanes, tls_metrics, domain="lane"):
+    """Lee el paso actual con un solo getAllSubscriptionResults. Retorna [(tls, (queue, wait))]."""
+    results = getattr(conn, domain).getAllSubscriptionResults()
+    step_values = []
+    for tls, lanes in tls_lanes.items():
+        queue = 0
+        wait = 0
+        veh_set = tls_metrics[tls]["veh_set"]
+        for lane in lanes:
+            values = results.get(lane)
+            if not values:
+                continue
+            queue += values[tc.LAST_STEP_VEHICLE_HALTING_NUMBER]
+            wait += values[tc.VAR_WAITING_TIME]
+            veh_set.update(values[tc.LAST_STEP_VEHICLE_ID_LIST])
+        step_values.append((tls, (queue, wait)))
+    return step_values
+
+
+def _collect_step_polling(conn, tls_list, tls_metrics):
+    """Modo original: getControlledLanes y tres getters por carril en cada paso."""
+    step_values = []
+    for tls in tls_list:
+        controlled_lanes = conn.trafficlight.getControlledLanes(tls)
+        queue = 0
+        wait = 0
+        for lane in controlled_lanes:
+            try:
+                queue += conn.lane.getLastStepHaltingNumber(lane)
+                wait += conn.lane.getWaitingTime(lane)
+                # recolectar veh IDs si disponible
+                try:
+                    veh_ids = conn.lane.getLastStepVehicleIDs(lane)
+                    for vid in veh_ids:
+                        tls_metrics[tls]["veh_set"].add(vid)
+                except Exception:
+                    pass
+            except Exception:
+                pass
+        step_values.append((tls, (queue, wait)))
+    return step_values
+
+
+def _logfile_name(scenario, run_id, label=None):
+    return f"sumo_{scenario}_{run_id}.log" if label is None else f"sumo_{scenario}_{run_id}_{label}.log"
+
+
+def _sumo_command(net_file, route_file, sumo_binary, logfile, fidelity="full", seed=None):
+    return [
+        sumo_binary,
+        "-n", net_file,
+        "-r", route_file,
+        "--start",
+        "--no-step-log",
+        "--log-file", logfile
+    ] + FIDELITY_LEVELS[fidelity]["sumo_args"] + (["--seed", str(seed)] if seed is not None else [])
+
+
+def _check_fidelity(fidelity, horizon, state_file=None):
+    if fidelity not in FIDELITY_LEVELS:
+        raise ValueError(f"Fidelidad desconocida: {fidelity}")
+    if FIDELITY_LEVELS[fidelity]["meso"] and state_file is not None:
+        raise ValueError(f"La fidelidad \"{fidelity}\" (mesosim) no puede cargar el snapshot microscópico de warm-up")
+    if FIDELITY_LEVELS[fidelity]["horizon_scale"] != 1.0 and horizon is None:
+        raise ValueError(f"La fidelidad \"{fidelity}\" acorta el horizonte: requiere horizon")
+
+
+def _fitness_terms(total_queue, total_wait, norm_steps, n_tls):
+    """Fórmula del sistema. Retorna (avg_queue, avg_wait, jam_penalty, avg_travel, fitness)."""
+    avg_queue = total_queue / norm_steps if norm_steps > 0 else 0
+    avg_wait = total_wait / norm_steps if norm_steps > 0 else 0
+    jam_penalty = avg_queue * 10
+    avg_travel = avg_wait / max(1, n_tls)
+    fitness = 3000 - (avg_travel + avg_wait + jam_penalty)
+    return avg_queue, avg_wait, jam_penalty, avg_travel, fitness
+
+
+def _apply_genome(conn, tls_list, genome, durations=None, index=None, state_loaded=False):
+    """
+    Aplica el genoma a los TLS reemplazando la lógica completa de cada uno.
+    Retorna {tls: [duración aplicada por fase]}.
+    """
+    applied = {}  # duraciones efectivamente aplicadas, para la fila por TLS
+    for tls in tls_list:
+        # Obtener lista de definiciones (puede devolver lista de lógicas)
+        defs = _tls_definitions(conn, tls, index, state_loaded)
+        if not defs:
+            # Si no hay definiciones, saltar (no debería pasar)
+            continue
+
+        try:
+            # Tomar la primera definición (lógica principal)
+            tl_logic = defs[0]
+
+            # Crear lista de fases modificadas
+            new_phases = []
+            for phase_index, phase in enumerate(tl_logic.phases):
+                if durations is not None:
+                    dur = durations[tls][phase_index]
+                else:
+                    dur = int(genome[phase_index % len(genome)])
+                if dur < 1:
+                    dur = 1
+                # Argumentos posicionales: libsumo no acepta keywords en Phase/Logic
+                new_phases.append(conn.trafficlight.Phase(dur, phase.state, phase.minDur, phase.maxDur))
+
+            # Crear nuevo objeto TrafficLightLogic
+            new_logic = conn.trafficlight.Logic(
+                tl_logic.programID, tl_logic.type, tl_logic.currentPhaseIndex, new_phases
+            )
+
+            # Aplicar la nueva definición
+            conn.trafficlight.setCompleteRedYellowGreenDefinition(tls, new_logic)
+            applied[tls] = [int(p.duration) for p in new_phases]
+
+        except Exception as e:
+            print(f"[WARN] No se pudo aplicar definiciones TLS para {tls}: {e}")
+
+    return applied
+
+
+def _run_evaluation(conn, genome, scenario, run_id, start_eval, collection="subscription",
+                    horizon=None, drain=0, abort_below=None, state_file=None, store=None, fidelity="full",
+                    durations=None, index=None, seed=None, tracer=None):
+    """
+    Cuerpo de la evaluación sobre una conexión SUMO ya abierta (recién iniciada o recargada):
+    aplica el genoma, corre el loop de simulación, guarda las filas (CSV o store) y retorna (fitness, status).
+    durations: {tls: [duración por fase]} del layout "topology" (genome_layout.py); None aplica la regla
+               original genome[i % len(genome)].
+    index: índice de la red (scenarios.net_index). Con él, los TLS, sus programas y carriles controlados
+           no se redescubren por TraCI; None mantiene el descubrimiento original.
+    seed: semilla con la que se lanzó SUMO (solo se registra en las filas).
+    tracer: EvalTrace (eval_trace.py) que cuenta los comandos TraCI y cronometra aplicación, loop y
+            escritura; None = sin instrumentación.
+    Las excepciones se propagan para que el llamador haga el diagnóstico con el log.
+    """
+    # NUEVO: con traza, los comandos pasan por un proxy que los cuenta (sin traza, la conexión de siempre)
+    raw_conn = conn
+    if tracer is not None:
+        conn = tracer.wrap(conn)
+
+    # NUEVO: warm-start desde el snapshot (la red ya viene cargada de tráfico)
+    start_time = 0
+    if state_file is not None:
+        conn.simulation.loadState(state_file)
+        start_time = conn.simulation.getTime()
+
+    # NUEVO: fidelidad ("short" simula solo una fracción del horizonte; ver FIDELITY_LEVELS)
+    level = FIDELITY_LEVELS[fidelity]
+    if horizon is not None:
+        horizon = start_time + (horizon - start_time) * level["horizon_scale"]
+    domain = "edge" if level["meso"] else "lane"
+    if level["meso"] and collection == "polling":
+        raise ValueError("La fidelidad \"meso\" solo admite collection=\"subscription\"")
+
+    tls_list = list(index["tls"]) if index is not None else conn.trafficlight.getIDList()
+
+    # Aplicar tiempos de fase del genoma a cada TLS (manipular la lista completa)
+    t_apply = time.perf_counter()
+    applied = _apply_genome(conn, tls_list, genome, durations, index, state_file is not None)
+    if tracer is not None:
+        tracer.add("apply_s", time.perf_counter() - t_apply)
+
+    # Recolección por TLS (se guarda también set de vehículos para flujo por TLS)
+    tls_metrics = {tls: {"queue": 0, "wait": 0, "steps": 0, "veh_set": set()} for tls in tls_list}
+    total_steps = 0
+    total_queue = 0
+    total_wait = 0
+
+    # NUEVO: en modo "subscription" los carriles controlados se resuelven una sola vez
+    # y se leen todas las variables con un único getAllSubscriptionResults por paso.
+    if collection == "subscription":
+        tls_lanes = _subscribe_controlled_lanes(conn, tls_list, domain, index)
+    elif collection == "polling":
+        tls_lanes = None
+    else:
+        raise ValueError(f"Modo de recolección desconocido: {collection}")
+
+    # NUEVO: horizonte fijo, en pasos de step-length dt segundos (1 s por defecto en SUMO)
+    dt = conn.simulation.getDeltaT()
+    max_steps = int(math.ceil((horizon + drain - start_time) / dt)) if horizon is not None else None
+    n_tls = len(tls_list)
+    status = "ok"
+
+    # Loop de simulación
+    t_loop = time.perf_counter()
+    while conn.simulation.getMinExpectedNumber() > 0:
+        if max_steps is not None and total_steps >= max_steps:
+            status = "truncated"
+            break
+        conn.simulationStep()
+        total_steps += 1
+
+        if tls_lanes is not None:
+            step_values = _collect_step_subscription(conn, tls_lanes, tls_metrics, domain)
+        else:
+            step_values = _collect_step_polling(conn, tls_list, tls_metrics)
+
+        for tls, (queue, wait) in step_values:
+            total_queue += queue
+            total_wait += wait
+            tls_metrics[tls]["queue"] += queue
+            tls_metrics[tls]["wait"] += wait
+            tls_metrics[tls]["steps"] += 1
+
+        # Cota superior del fitness: los acumuladores solo crecen y el divisor es fijo
+        if abort_below is not None and \
+                _fitness_terms(total_queue * dt, total_wait * dt, max_steps * dt, n_tls)[4] < abort_below:
+            status = "aborted"
+            break
+    if tracer is not None:
+        tracer.add("loop_s", time.perf_counter() - t_loop)
+        tracer.steps = total_steps
+
+    # Obtener stats de simulación ANTES de cerrar
+    sim_time_ms = conn.simulation.getTime()  # ms
+    total_veh = conn.simulation.getArrivedNumber()
+    sim_time = sim_time_ms / 1000.0 if sim_time_ms is not None else (total_steps if total_steps > 0 else 1)
+
+    # Cálculos globales (con horizonte, normalizados por el número fijo de pasos).
+    # Acumuladores y divisor en segundos simulados: con dt = 1 son exactamente los pasos.
+    norm_steps = (max_steps if max_steps is not None else total_steps) * dt
+    avg_queue, avg_wait, jam_penalty, avg_travel, fitness = _fitness_terms(
+        total_queue * dt, total_wait * dt, norm_steps, n_tls
+    )
+
+    eval_time = time.time() - start_eval
+    flow = total_veh / sim_time if sim_time > 0 else 0
+
+    # Guardar métricas globales
+    result_row = {
+        "scenario": scenario,
+        "run_id": run_id,
+        "fitness": fitness,
+        "avg_travel": avg_travel,
+        "avg_wait": avg_wait,
+        "avg_queue": avg_queue,
+        "jam_penalty": jam_penalty,
+        "flow": flow,
+        "eval_time": eval_time,
+        "sim_time_sec": sim_time,
+        "total_veh": total_veh,
+        "status": status,
+        "fidelity": fidelity,
+        "seed": seed
+    }
+
+    # Guardar métricas por TLS (las corridas abortadas solo tienen acumuladores parciales)
+    tls_rows = []
+    for tls, m in (tls_metrics.items() if status != "aborted" else ()):
+        steps = norm_steps if norm_steps > 0 else 1
+        vehicle_count = len(m["veh_set"])
+        flow_tls = vehicle_count / sim_time if sim_time > 0 else 0
+        tls_rows.append({
+            "scenario": scenario,
+            "run_id": run_id,
+            "tls": tls,
+            "avg_queue_tls": m["queue"] * dt / steps,
+            "avg_wait_tls": m["wait"] * dt / steps,
+            "vehicle_count_tls": vehicle_count,
+            "flow_tls": flow_tls,
+            "fidelity": fidelity,
+            "phase_durations": ";".join(str(d) for d in applied.get(tls, ())),
+            "seed": seed
+        })
+    t_write = time.perf_counter()
+    _write_results(scenario, run_id, result_row, tls_rows, store, genome)
+    if tracer is not None:
+        tracer.add("write_s", time.perf_counter() - t_write)
+        tracer.sample_rss(raw_conn)
+        tracer.write(trace_file_name(scenario, run_id), genome=genome, fidelity=fidelity, seed=seed, status=status)
+
+    return fitness, status
+
+
+def _report_failure(logfile, scenario, run_id, start_eval, store=None, genome=None, fidelity="full", seed=None):
+    """Muestra la traza y la cola del log de SUMO y deja una fila "failed" en resultados."""
+    print("[ERROR] Excepción al ejecutar SUMO/TraCI:")
+    traceback.print_exc()
+
+    # Intentar leer el logfile para mostrar la última parte que ayude al diagnóstico
+    try:
+        if os.path.exists(logfile):
+            print(f"\n--- Últimas líneas de {logfile} ---")
+            with open(logfile, "r", encoding="utf-8", errors="ignore") as lf:
+                lines = lf.readlines()
+                tail = lines[-40:] if len(lines) > 40 else lines
+                for line in tail:
+                    print(line.rstrip())
+            print("--- fin del log ---\n")
+    except Exception as e_log:
+        print(f"[WARN] No se pudo leer log {logfile}: {e_log}")
+
+    # Guardar una fila indicando fallo en resultados para que haya rastro
+    try:
+        _write_results(scenario, run_id, {
+            "scenario": scenario,
+            "run_id": run_id,
+            "fitness": FAILED_FITNESS,
+            "avg_travel": None,
+            "avg_wait": None,
+            "avg_queue": None,
+            "jam_penalty": None,
+            "flow": None,
+            "eval_time": time.time() - start_eval,
+            "sim_time_sec": None,
+            "total_veh": None,
+            "status": "failed",
+            "fidelity": fidelity,
+            "seed": seed
+        }, store=store, genome=genome)
+    except Exception:
+        pass
+
+
+def evaluate_genome(genome, net_file, route_file, scenario, run_id, sumo_binary="sumo", collection="subscription",
+                    backend="traci", label=None, horizon=None, drain=0, abort_below=None, with_status=False,
+                    state_file=None, mode="traci", store=None, fidelity="full", layout="cyclic", seed=None,
+                    trace=False):
     """
     Ejecuta SUMO con el genoma (configuración de fases) aplicado a todos los TLS.
     Retorna un fitness scalar (mayor es mejor).
@@ -19,215 +538,221 @@ def evaluate_genome(genome, net_file, route_file, scenario, run_id, sumo_binary=
       - resultados_eval_1_{scenario}.csv (global)
       - per_tls_{scenario}_{run_id}.csv (por semáforo)
     En caso de que SUMO cierre la conexión, captura el log y devuelve un fitness muy bajo.
+    collection: "subscription" (suscripciones por carril, un solo round-trip por paso)
+                o "polling" (getters por carril en cada paso, modo original).
+    backend: "traci" (SUMO en proceso aparte vía socket) o "libsumo" (en el mismo proceso).
+             Con sumo-gui siempre se usa traci.
+    label: nombre de la conexión TraCI (un worker = un label/puerto/log propio).
+    horizon, drain: si horizon está definido la simulación se corta en horizon + drain segundos
+                    y los promedios se normalizan siempre por esos horizon + drain pasos, de modo
+                    que genomas que terminan antes o después son comparables.
+    abort_below: (requiere horizon) corta la corrida en cuanto los acumuladores de cola/espera
+                 garantizan que el fitness final quedará por debajo de este umbral. El fitness
+                 devuelto es esa cota superior y la fila queda con status "aborted".
+    with_status: si es True retorna (fitness, status) con status en
+                 "ok" | "truncated" | "aborted" | "failed".
+    state_file: snapshot de warm-up (ver warm_start.py). Se carga con loadState antes de aplicar
+                el programa TLS, y las métricas cuentan solo desde ese instante; horizon sigue
+                siendo un tiempo absoluto de simulación.
+    mode: "traci" (loop paso a paso desde Python) o "batch" (sin TraCI: programa TLS como additional,
+          detectores laneData/E2 en los carriles controlados y lectura incremental de las salidas;
+          métricas cercanas a las de TraCI pero no idénticas, ver batch_eval.py).
+    store: ResultsStore (results_store.py) que recibe las filas en lugar de los CSV;
+           None mantiene el append directo a los CSV.
+    fidelity: nivel de FIDELITY_LEVELS ("full" = microscópico original; "coarse", "meso" y "short" son
+              versiones baratas para pre-filtrar). Queda registrado en la columna "fidelity" de cada fila.
+    layout: distribución de los genes (genome_layout.py). "cyclic" = 8 genes compartidos, fase i -> genome[i % 8];
+            "topology" = un gen por fase verde ajustable de cada TLS, amarillas/todo-rojo fijas.
+            Las duraciones aplicadas quedan en la columna "phase_durations" del CSV por TLS.
+    seed: --seed de SUMO (None = semilla por defecto). Queda en la columna "seed" (ver replication.py).
+    trace: agregar la traza de la evaluación (arranque, aplicación TLS, simulationStep vs recolección,
+           llamadas TraCI por comando, escritura y pico de RSS) a trace_{scenario}_{run_id}.jsonl
+           (ver eval_trace.py). Solo modo "traci".
     """
+    if abort_below is not None and horizon is None:
+        raise ValueError("abort_below requiere horizon: sin horizonte fijo no hay cota del fitness final")
+    if mode not in ("traci", "batch"):
+        raise ValueError(f"Modo de evaluación desconocido: {mode}")
+    if mode == "batch" and abort_below is not None:
+        raise ValueError("abort_below no está disponible en modo batch (no hay loop paso a paso)")
+    _check_fidelity(fidelity, horizon, state_file)
+    if mode == "batch" and fidelity != "full":
+        raise ValueError("El modo batch solo evalúa con fidelity=\"full\"")
+    if mode == "batch" and trace:
+        raise ValueError("trace no está disponible en modo batch (no hay conexión TraCI)")
+    durations = phase_durations(genome, net_file, layout)
+    # NUEVO: topología de la red desde el índice cacheado (sin parsear XML ni descubrir por TraCI)
+    index = net_index(net_file)
+
     # Preparar comando SUMO con log-file para obtener diagnostico en caso de fallo
-    logfile = f"sumo_{scenario}_{run_id}.log"
-    sumoCmd = [
-        sumo_binary,
-        "-n", net_file,
-        "-r", route_file,
-        "--start",
-        "--no-step-log",
-        "--log-file", logfile
-    ]
+    logfile = _logfile_name(scenario, run_id, label)
+    sumoCmd = _sumo_command(net_file, route_file, sumo_binary, logfile, fidelity, seed)
 
     start_eval = time.time()
+
+    if mode == "batch":
+        # Import diferido: batch_eval reutiliza los helpers de este módulo
+        from batch_eval import run_batch_evaluation
+        try:
+            fitness, status = run_batch_evaluation(
+                genome, net_file, route_file, scenario, run_id, sumo_binary, logfile, start_eval,
+                horizon=horizon, drain=drain, state_file=state_file, store=store, durations=durations, seed=seed
+            )
+        except Exception:
+            _report_failure(logfile, scenario, run_id, start_eval, store, genome, seed=seed)
+            fitness, status = FAILED_FITNESS, "failed"
+        return (fitness, status) if with_status else fitness
+
     started = False
+    backend = resolve_backend(backend, sumo_binary)
+    tracer = EvalTrace(scenario, run_id, label) if trace else None
 
     try:
-        # Intentar iniciar SUMO
-        traci.start(sumoCmd)
+        # Intentar iniciar SUMO (proceso externo con traci o en proceso con libsumo)
+        t_start = time.perf_counter()
+        conn = start_backend(sumoCmd, backend, label)
         started = True
+        if tracer is not None:
+            tracer.add("startup_s", time.perf_counter() - t_start)
 
-        tls_list = traci.trafficlight.getIDList()
+        fitness, status = _run_evaluation(
+            conn, genome, scenario, run_id, start_eval, collection=collection,
+            horizon=horizon, drain=drain, abort_below=abort_below, state_file=state_file, store=store,
+            fidelity=fidelity, durations=durations, index=index, seed=seed, tracer=tracer
+        )
+        return (fitness, status) if with_status else fitness
 
-        # Aplicar tiempos de fase del genoma a cada TLS (manipular la lista completa)
-        for tls in tls_list:
-            # Obtener lista de definiciones (puede devolver lista de lógicas)
-            defs = traci.trafficlight.getCompleteRedYellowGreenDefinition(tls)
-            if not defs:
-                # Si no hay definiciones, saltar (no debería pasar)
-                continue
+    except Exception as e:
+        _report_failure(logfile, scenario, run_id, start_eval, store, genome, fidelity, seed)
+        if tracer is not None:
+            tracer.write(trace_file_name(scenario, run_id), genome=genome, fidelity=fidelity, seed=seed,
+                         status="failed")
+        return (FAILED_FITNESS, "failed") if with_status else FAILED_FITNESS
 
-            try:
-                # Tomar la primera definición (lógica principal)
-                tl_logic = defs[0]
+    finally:
+        try:
+            if started:
+                conn.close()
+        except Exception:
+            pass
 
-                # Crear lista de fases modificadas
-                new_phases = []
-                for phase_index, phase in enumerate(tl_logic.phases):
-                    dur = int(genome[phase_index % len(genome)])
-                    if dur < 1:
-                        dur = 1
-                    new_phases.append(traci.trafficlight.Phase(
-                        duration=dur,
-                        state=phase.state,
-                        minDur=phase.minDur,
-                        maxDur=phase.maxDur
-                    ))
-
-                # Crear nuevo objeto TrafficLightLogic
-                new_logic = traci.trafficlight.Logic(
-                    programID=tl_logic.programID,
-                    type=tl_logic.type,
-                    currentPhaseIndex=tl_logic.currentPhaseIndex,
-                    phases=new_phases
-                )
-
-                # Aplicar la nueva definición
-                traci.trafficlight.setCompleteRedYellowGreenDefinition(tls, new_logic)
-
-            except Exception as e:
-                print(f"[WARN] No se pudo aplicar definiciones TLS para {tls}: {e}")
-
-        # Recolección por TLS (se guarda también set de vehículos para flujo por TLS)
-        tls_metrics = {tls: {"queue": 0, "wait": 0, "steps": 0, "veh_set": set()} for tls in tls_list}
-        total_steps = 0
-        total_queue = 0
-        total_wait = 0
-
-        # Loop de simulación
-        while traci.simulation.getMinExpectedNumber() > 0:
-            traci.simulationStep()
-            total_steps += 1
-
-            for tls in tls_list:
-                controlled_lanes = traci.trafficlight.getControlledLanes(tls)
-                queue = 0
-                wait = 0
-                for lane in controlled_lanes:
-                    try:
-                        queue += traci.lane.getLastStepHaltingNumber(lane)
-                        wait += traci.lane.getWaitingTime(lane)
-                        # recolectar veh IDs si disponible
-                        try:
-                            veh_ids = traci.lane.getLastStepVehicleIDs(lane)
-                            for vid in veh_ids:
-                                tls_metrics[tls]["veh_set"].add(vid)
-                        except Exception:
-                            pass
-                    except Exception:
-                        pass
-
-                total_queue += queue
-                total_wait += wait
-                tls_metrics[tls]["queue"] += queue
-                tls_metrics[tls]["wait"] += wait
-                tls_metrics[tls]["steps"] += 1
-
-        # Obtener stats de simulación ANTES de cerrar
-        sim_time_ms = traci.simulation.getTime()  # ms
-        total_veh = traci.simulation.getArrivedNumber()
-        sim_time = sim_time_ms / 1000.0 if sim_time_ms is not None else (total_steps if total_steps > 0 else 1)
-
-        # Cálculos globales
-        avg_queue = total_queue / total_steps if total_steps > 0 else 0
-        avg_wait = total_wait / total_steps if total_steps > 0 else 0
-        jam_penalty = avg_queue * 10
-        avg_travel = avg_wait / max(1, len(tls_list))
-        fitness = 3000 - (avg_travel + avg_wait + jam_penalty)
-
-        eval_time = time.time() - start_eval
-        flow = total_veh / sim_time if sim_time > 0 else 0
-
-        # Guardar métricas globales
-        results_file = f"resultados_eval_1_{scenario}.csv"
-        file_exists = os.path.exists(results_file)
-        with open(results_file, "a", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=[
-                "scenario", "run_id", "fitness", "avg_travel", "avg_wait",
-                "avg_queue", "jam_penalty", "flow", "eval_time", "sim_time_sec", "total_veh"
-            ])
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow({
-                "scenario": scenario,
-                "run_id": run_id,
-                "fitness": fitness,
-                "avg_travel": avg_travel,
-                "avg_wait": avg_wait,
-                "avg_queue": avg_queue,
-                "jam_penalty": jam_penalty,
-                "flow": flow,
-                "eval_time": eval_time,
-                "sim_time_sec": sim_time,
-                "total_veh": total_veh
-            })
-
-        # Guardar métricas por TLS
-        tls_file = f"per_tls_{scenario}_{run_id}.csv"
-        with open(tls_file, "a", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=[
-                "scenario", "run_id", "tls", "avg_queue_tls", "avg_wait_tls",
-                "vehicle_count_tls", "flow_tls"
-            ])
-            if f.tell() == 0:
-                writer.writeheader()
-            for tls, m in tls_metrics.items():
-                steps = m["steps"] if m["steps"] > 0 else 1
-                vehicle_count = len(m["veh_set"])
-                flow_tls = vehicle_count / sim_time if sim_time > 0 else 0
-                writer.writerow({
-                    "scenario": scenario,
-                    "run_id": run_id,
-                    "tls": tls,
-                    "avg_queue_tls": m["queue"] / steps,
-                    "avg_wait_tls": m["wait"] / steps,
-                    "vehicle_count_tls": vehicle_count,
-                    "flow_tls": flow_tls
-                })
-
-        return fitness
 
-    except Exception as e:
-        print("[ERROR] Excepción al ejecutar SUMO/TraCI:")
-        traceback.print_exc()
+class SumoEvaluator:
+    """
+    Evaluador con estado: mantiene una sola instancia de SUMO abierta durante toda la corrida del GA
+    y entre genomas la reinicia con load (misma red/rutas, nuevo programa TLS), evitando pagar en cada
+    evaluación el arranque del proceso, el handshake del socket y el parseo de la red.
+    Si la conexión se cae, la siguiente evaluación vuelve a lanzar SUMO.
+    Se usa igual que evaluate_genome: evaluator.evaluate(genome) retorna el fitness.
+    Con evaluate(genome, fidelity=...) el load usa las opciones de SUMO de ese nivel de fidelidad.
+    """
 
-        # Intentar leer el logfile para mostrar la última parte que ayude al diagnóstico
+    def __init__(self, net_file, route_file, scenario, run_id, sumo_binary="sumo", collection="subscription",
+                 backend="traci", label=None, horizon=None, drain=0, state_file=None, mode="traci", store=None,
+                 layout="cyclic", trace=False):
+        if mode != "traci":
+            raise ValueError("SumoEvaluator solo soporta mode=\"traci\"")
+        self.net_file = net_file
+        self.layout = layout
+        self.index = net_index(net_file)
+        self.scenario = scenario
+        self.run_id = run_id
+        self.backend = resolve_backend(backend, sumo_binary)
+        self.label = label
+        self.logfile = _logfile_name(scenario, run_id, label)
+        self.sumoCmd = _sumo_command(net_file, route_file, sumo_binary, self.logfile)
+        self._command_args = (net_file, route_file, sumo_binary, self.logfile)
+        self.run_kwargs = {
+            "collection": collection,
+            "horizon": horizon,
+            "drain": drain,
+            "state_file": state_file,
+            "store": store,
+        }
+        self.conn = None
+        # Estadísticas de arranque para estimar el tiempo ahorrado
+        self.spawn_times = []
+        self.load_times = []
+        self.respawns = 0
+        # NUEVO: traza por evaluación (ver eval_trace.py); startup_s es el load o el respawn
+        self.trace = trace
+
+    def _command(self, fidelity, seed=None):
+        if fidelity == "full" and seed is None:
+            return self.sumoCmd
+        return _sumo_command(*self._command_args, fidelity, seed)
+
+    def _spawn(self, fidelity="full", seed=None):
+        t0 = time.perf_counter()
+        self.conn = start_backend(self._command(fidelity, seed), self.backend, self.label)
+        self.spawn_times.append(time.perf_counter() - t0)
+
+    def _reset(self, fidelity="full", seed=None):
+        """Deja una simulación limpia: load sobre la instancia viva o respawn si no hay/está caída."""
+        if self.conn is None:
+            self._spawn(fidelity, seed)
+            return
+        t0 = time.perf_counter()
         try:
-            if os.path.exists(logfile):
-                print(f"\n--- Últimas líneas de {logfile} ---")
-                with open(logfile, "r", encoding="utf-8", errors="ignore") as lf:
-                    lines = lf.readlines()
-                    tail = lines[-40:] if len(lines) > 40 else lines
-                    for line in tail:
-                        print(line.rstrip())
-                print("--- fin del log ---\n")
-        except Exception as e_log:
-            print(f"[WARN] No se pudo leer log {logfile}: {e_log}")
-
-        # Guardar una fila indicando fallo en resultados para que haya rastro
+            # load recibe los mismos argumentos que el comando, sin el binario
+            self.conn.load(self._command(fidelity, seed)[1:])
+        except Exception as e:
+            print(f"[WARN] Conexión SUMO perdida ({e}); relanzando.")
+            self._drop()
+            self.respawns += 1
+            self._spawn(fidelity, seed)
+            return
+        self.load_times.append(time.perf_counter() - t0)
+
+    def _drop(self):
         try:
-            results_file = f"resultados_eval_1_{scenario}.csv"
-            file_exists = os.path.exists(results_file)
-            with open(results_file, "a", newline="") as f:
-                writer = csv.DictWriter(f, fieldnames=[
-                    "scenario", "run_id", "fitness", "avg_travel", "avg_wait",
-                    "avg_queue", "jam_penalty", "flow", "eval_time", "sim_time_sec", "total_veh"
-                ])
-                if not file_exists:
-                    writer.writeheader()
-                writer.writerow({
-                    "scenario": scenario,
-                    "run_id": run_id,
-                    "fitness": -1e9,
-                    "avg_travel": None,
-                    "avg_wait": None,
-                    "avg_queue": None,
-                    "jam_penalty": None,
-                    "flow": None,
-                    "eval_time": time.time() - start_eval,
-                    "sim_time_sec": None,
-                    "total_veh": None
-                })
+            if self.conn is not None:
+                self.conn.close()
         except Exception:
             pass
+        self.conn = None
 
-        return -1e9
-
-    finally:
+    def evaluate(self, genome, abort_below=None, with_status=False, fidelity="full", seed=None):
+        if abort_below is not None and self.run_kwargs["horizon"] is None:
+            raise ValueError("abort_below requiere horizon: sin horizonte fijo no hay cota del fitness final")
+        _check_fidelity(fidelity, self.run_kwargs["horizon"], self.run_kwargs["state_file"])
+        durations = phase_durations(genome, self.net_file, self.layout)
+        tracer = EvalTrace(self.scenario, self.run_id, self.label) if self.trace else None
+        start_eval = time.time()
         try:
-            if started:
-                traci.close()
+            t_start = time.perf_counter()
+            self._reset(fidelity, seed)
+            if tracer is not None:
+                tracer.add("startup_s", time.perf_counter() - t_start)
+            fitness, status = _run_evaluation(
+                self.conn, genome, self.scenario, self.run_id, start_eval,
+                abort_below=abort_below, fidelity=fidelity, durations=durations, index=self.index, seed=seed,
+                tracer=tracer, **self.run_kwargs
+            )
+            return (fitness, status) if with_status else fitness
         except Exception:
-            pass
+            _report_failure(self.logfile, self.scenario, self.run_id, start_eval, self.run_kwargs["store"], genome,
+                            fidelity, seed)
+            if tracer is not None:
+                tracer.write(trace_file_name(self.scenario, self.run_id), genome=genome, fidelity=fidelity,
+                             seed=seed, status="failed")
+            # Tras un error no se sabe en qué estado quedó SUMO: se relanza en la próxima evaluación
+            self._drop()
+            return (FAILED_FITNESS, "failed") if with_status else FAILED_FITNESS
+
+    def saved_startup_time(self):
+        """Segundos ahorrados: (arranque promedio - load) por cada evaluación que reutilizó la instancia."""
+        if not self.spawn_times:
+            return 0.0
+        spawn = sum(self.spawn_times) / len(self.spawn_times)
+        return sum(max(0.0, spawn - t) for t in self.load_times)
+
+    def report(self):
+        spawn = sum(self.spawn_times) / len(self.spawn_times) if self.spawn_times else 0.0
+        load = sum(self.load_times) / len(self.load_times) if self.load_times else 0.0
+        print(f"[SumoEvaluator] arranques={len(self.spawn_times)} (respawns={self.respawns}) "
+              f"loads={len(self.load_times)} arranque_prom={spawn:.3f}s load_prom={load:.3f}s "
+              f"ahorro_estimado={self.saved_startup_time():.2f}s")
+
+    def close(self):
+        self._drop()
@@ -0,0 +1,77 @@
+# surrogate.py
+import math
+
+import numpy as np
+
+# Modelo sustituto del fitness para el GA (run_ga_optimization(surrogate=True)).
+# Una simulación SUMO cuesta segundos; ajustar y predecir con este modelo cuesta microsegundos.
+# Modelo: ensamble bootstrap de regresiones ridge sobre genes normalizados a [0,1] y sus cuadrados.
+# La media del ensamble es la predicción y la desviación entre miembros mide la incertidumbre.
+# Usa su propio generador de numpy para no alterar la secuencia de random del GA.
+# La normalización usa los límites de cada gen del layout (genome_layout.genome_bounds), así que los
+# genes cortos del layout "topology" (3-20 s) quedan en la misma escala que los verdes principales.
+
+
+def _features(genomes, bounds):
+    lo, hi = np.asarray(bounds, dtype=float).T
+    x = (np.asarray(genomes, dtype=float) - lo) / np.maximum(hi - lo, 1.0)
+    return np.hstack([np.ones((x.shape[0], 1)), x, x * x])
+
+
+class SurrogateModel:
+    """
+    Ensamble de n_models regresiones ridge (alpha) entrenadas sobre remuestreos bootstrap.
+    bounds: [(mín, máx)] por gen (genome_layout.genome_bounds) para normalizar los genes a [0,1].
+    """
+
+    def __init__(self, bounds, n_models=10, alpha=1.0, seed=0):
+        self.bounds = [tuple(b) for b in bounds]
+        self.n_models = n_models
+        self.alpha = alpha
+        self.rng = np.random.default_rng(seed)
+        self.weights = None
+
+    def fit(self, genomes, fitnesses):
+        X = _features(genomes, self.bounds)
+        y = np.asarray(fitnesses, dtype=float)
+        n, d = X.shape
+        # Sin penalizar el intercepto
+        reg = self.alpha * np.eye(d)
+        reg[0, 0] = 0.0
+        weights = []
+        for _ in range(self.n_models):
+            idx = self.rng.integers(0, n, n)
+            Xb, yb = X[idx], y[idx]
+            weights.append(np.linalg.solve(Xb.T @ Xb + reg + 1e-9 * np.eye(d), Xb.T @ yb))
+        self.weights = np.array(weights)  # (n_models, d)
+        return self
+
+    def predict(self, genomes):
+        """Retorna (media, desviación) del ensamble para cada genoma."""
+        preds = _features(genomes, self.bounds) @ self.weights.T  # (n, n_models)
+        return preds.mean(axis=1), preds.std(axis=1)
+
+
+def select_for_simulation(mean, std, fraction):
+    """
+    Índices a simular: la mitad del cupo para los de mayor fitness predicho (prometedores)
+    y el resto para los de mayor incertidumbre entre los que quedan.
+    """
+    n = len(mean)
+    quota = min(n, max(1, int(math.ceil(fraction * n))))
+    promising = list(np.argsort(-mean, kind="stable")[: (quota + 1) // 2])
+    chosen = set(promising)
+    uncertain = [i for i in np.argsort(-std, kind="stable") if i not in chosen][: quota - len(promising)]
+    return sorted(int(i) for i in promising + uncertain)
+
+
+def accuracy(predicted, actual):
+    """(MAE, correlación de Pearson) entre predicción y fitness real; NaN si no hay datos suficientes."""
+    predicted = np.asarray(predicted, dtype=float)
+    actual = np.asarray(actual, dtype=float)
+    if len(actual) == 0:
+        return float("nan"), float("nan")
+    mae = float(np.mean(np.abs(predicted - actual)))
+    if len(actual) < 2 or np.std(predicted) == 0 or np.std(actual) == 0:
+        return mae, float("nan")
+    return mae, float(np.corrcoef(predicted, actual)[0, 1])
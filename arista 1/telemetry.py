@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# telemetry.py
+import argparse
+import csv
+import os
+from collections import defaultdict
+
+import numpy as np
+import traci.constants as tc
+
+# Telemetría de flota: sigue muchos vehículos (o flujos completos) a la vez en cualquier arista.
+# Reemplaza al seguidor de un solo vehículo de eval_2.py, que en cada paso pedía getIDList, buscaba
+# el id con un "in" lineal sobre la tupla e imprimía una línea.
+#   - Altas y bajas por suscripción de simulation (VAR_DEPARTED/ARRIVED_VEHICLES_IDS): cada vehículo
+#     que sale se suscribe a _VEHICLE_VARS y SUMO descarta la suscripción cuando llega.
+#   - Por paso un solo getAllSubscriptionResults; los agregados por vehículo viven en arreglos numpy
+#     (un slot por vehículo activo, reutilizado cuando llega) y se actualizan vectorizados.
+#   - Los vehículos que llegan pasan a un buffer y se escriben en lote (flush_every filas) a out_file.
+# Agregados por vehículo: velocidad media (ponderada por tiempo) y máxima, detenciones (pasos de
+# velocidad >= stop_speed a < stop_speed), time loss y distancia recorrida (acumulados de SUMO).
+
+TELEMETRY_FIELDS = ["vehicle", "flow", "depart", "arrive", "travel_time", "mean_speed", "max_speed", "stops",
+                    "time_loss", "distance"]
+
+_VEHICLE_VARS = (tc.VAR_SPEED, tc.VAR_TIMELOSS, tc.VAR_DISTANCE)
+_SIM_VARS = (tc.VAR_TIME, tc.VAR_DEPARTED_VEHICLES_IDS, tc.VAR_ARRIVED_VEHICLES_IDS)
+
+
+def flow_of(vehicle):
+    """Flujo de un vehículo: los de <flow id="veh1"> se llaman "veh1.N"; el resto es su propio flujo."""
+    return vehicle.rsplit(".", 1)[0] if "." in vehicle else vehicle
+
+
+class FleetTelemetry:
+    """
+    conn: conexión ya iniciada (módulo traci, traci.Connection o libsumo).
+    flows: ids de flujo a seguir (None = todos los vehículos).
+    Uso: crear después de iniciar SUMO, llamar step() después de cada simulationStep y close() al final.
+    """
+
+    def __init__(self, conn, flows=None, out_file=None, flush_every=1000, stop_speed=0.1, capacity=1024):
+        self.conn = conn
+        self.flows = set(flows) if flows else None
+        self.out_file = out_file
+        self.flush_every = flush_every
+        self.stop_speed = stop_speed
+        self.dt = conn.simulation.getDeltaT()
+        self.now = conn.simulation.getTime()
+
+        self.slot_of = {}  # vehículo -> slot
+        self.vehicle_of = [None] * capacity
+        self._free = list(range(capacity - 1, -1, -1))
+        self.depart = np.zeros(capacity)
+        self.speed_time = np.zeros(capacity)  # integral de la velocidad (m)
+        self.observed = np.zeros(capacity)  # tiempo observado (s)
+        self.max_speed = np.zeros(capacity)
+        self.stops = np.zeros(capacity, dtype=np.int32)
+        self.stopped = np.zeros(capacity, dtype=bool)
+        self.time_loss = np.zeros(capacity)
+        self.distance = np.zeros(capacity)
+
+        self._buffer = []
+        self._header_written = False
+        self.written = 0
+        # Agregados por flujo de los vehículos que ya llegaron: [n, tiempo de viaje, time loss, detenciones]
+        self.flow_totals = defaultdict(lambda: [0, 0.0, 0.0, 0])
+        conn.simulation.subscribe(_SIM_VARS)
+
+    # --- slots ---------------------------------------------------------------------------------
+
+    def _grow(self):
+        old = len(self.vehicle_of)
+        for name in ("depart", "speed_time", "observed", "max_speed", "stops", "stopped", "time_loss", "distance"):
+            arr = getattr(self, name)
+            setattr(self, name, np.concatenate([arr, np.zeros_like(arr)]))
+        self.vehicle_of.extend([None] * old)
+        self._free.extend(range(2 * old - 1, old - 1, -1))
+
+    def _add(self, vehicle):
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        self.slot_of[vehicle] = slot
+        self.vehicle_of[slot] = vehicle
+        self.depart[slot] = self.now
+        for arr in (self.speed_time, self.observed, self.max_speed, self.time_loss, self.distance):
+            arr[slot] = 0.0
+        self.stops[slot] = 0
+        self.stopped[slot] = False
+        self.conn.vehicle.subscribe(vehicle, _VEHICLE_VARS)
+
+    def _finish(self, vehicle, arrive):
+        slot = self.slot_of.pop(vehicle)
+        self.vehicle_of[slot] = None
+        self._free.append(slot)
+        row = self._row(vehicle, slot, arrive)
+        totals = self.flow_totals[row["flow"]]
+        totals[0] += 1
+        totals[1] += row["travel_time"]
+        totals[2] += row["time_loss"]
+        totals[3] += row["stops"]
+        self._buffer.append(row)
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def _row(self, vehicle, slot, arrive):
+        observed = self.observed[slot]
+        return {
+            "vehicle": vehicle,
+            "flow": flow_of(vehicle),
+            "depart": float(self.depart[slot]),
+            "arrive": arrive,
+            "travel_time": (arrive if arrive is not None else self.now) - float(self.depart[slot]),
+            "mean_speed": float(self.speed_time[slot] / observed) if observed > 0 else 0.0,
+            "max_speed": float(self.max_speed[slot]),
+            "stops": int(self.stops[slot]),
+            "time_loss": float(self.time_loss[slot]),
+            "distance": float(self.distance[slot]),
+        }
+
+    # --- loop ----------------------------------------------------------------------------------
+
+    def step(self):
+        """Actualiza los agregados con el paso recién simulado."""
+        sim = self.conn.simulation.getSubscriptionResults()
+        self.now = sim[tc.VAR_TIME]
+        for vehicle in sim[tc.VAR_ARRIVED_VEHICLES_IDS]:
+            if vehicle in self.slot_of:
+                self._finish(vehicle, self.now)
+        for vehicle in sim[tc.VAR_DEPARTED_VEHICLES_IDS]:
+            if self.flows is None or flow_of(vehicle) in self.flows:
+                self._add(vehicle)
+
+        results = self.conn.vehicle.getAllSubscriptionResults()
+        if not results:
+            return
+        slot_of = self.slot_of
+        slots = np.fromiter((slot_of[v] for v in results), dtype=np.intp, count=len(results))
+        values = list(results.values())
+        speed = np.fromiter((r[tc.VAR_SPEED] for r in values), dtype=float, count=len(values))
+        self.time_loss[slots] = np.fromiter((r[tc.VAR_TIMELOSS] for r in values), dtype=float, count=len(values))
+        self.distance[slots] = np.fromiter((r[tc.VAR_DISTANCE] for r in values), dtype=float, count=len(values))
+        self.speed_time[slots] += speed * self.dt
+        self.observed[slots] += self.dt
+        self.max_speed[slots] = np.maximum(self.max_speed[slots], speed)
+        stopped = speed < self.stop_speed
+        self.stops[slots] += stopped & ~self.stopped[slots]
+        self.stopped[slots] = stopped
+
+    # --- salida --------------------------------------------------------------------------------
+
+    def flush(self):
+        if not self._buffer:
+            return
+        if self.out_file:
+            new_file = not self._header_written and not (os.path.exists(self.out_file) and
+                                                         os.path.getsize(self.out_file) > 0)
+            with open(self.out_file, "a", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=TELEMETRY_FIELDS)
+                if new_file:
+                    writer.writeheader()
+                writer.writerows(self._buffer)
+            self._header_written = True
+        self.written += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        """Escribe también los vehículos que siguen en la red (arrive vacío) y retorna summary()."""
+        for vehicle, slot in list(self.slot_of.items()):
+            self._buffer.append(self._row(vehicle, slot, None))
+        self.flush()
+        return self.summary()
+
+    def summary(self):
+        """{flujo: {"vehicles", "mean_travel_time", "mean_time_loss", "mean_stops"}} de los que llegaron."""
+        return {flow: {"vehicles": n, "mean_travel_time": tt / n, "mean_time_loss": tl / n, "mean_stops": st / n}
+                for flow, (n, tt, tl, st) in sorted(self.flow_totals.items()) if n}
+
+
+def run_telemetry(net_file, route_file, out_file, flows=None, step_length=None, horizon=None, sumo_binary="sumo",
+                  backend="traci", flush_every=1000):
+    """Corre un escenario completo con telemetría de flota. Retorna el resumen por flujo."""
+    # Import diferido: el módulo se puede usar con una conexión propia sin cargar sim_eval
+    from sim_eval import resolve_backend, start_backend
+    cmd = [sumo_binary, "-n", net_file, "-r", route_file, "--no-step-log"]
+    if step_length:
+        cmd += ["--step-length", str(step_length)]
+    conn = start_backend(cmd, resolve_backend(backend, sumo_binary))
+    try:
+        telemetry = FleetTelemetry(conn, flows=flows, out_file=out_file, flush_every=flush_every)
+        while conn.simulation.getMinExpectedNumber() > 0:
+            if horizon is not None and telemetry.now >= horizon:
+                break
+            conn.simulationStep()
+            telemetry.step()
+        return telemetry.close()
+    finally:
+        conn.close()
+
+
+def print_summary(summary):
+    for flow, s in summary.items():
+        print(f"{flow}: vehículos={s['vehicles']} viaje={s['mean_travel_time']:.1f}s "
+              f"time_loss={s['mean_time_loss']:.1f}s detenciones={s['mean_stops']:.2f}")
+
+
+if __name__ == "__main__":
+    from scenarios import find_scenario
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--arista", type=int, default=1, help="Número de arista del escenario")
+    parser.add_argument("--flows", type=str, nargs="*", default=None, help="Flujos a seguir (default: todos)")
+    parser.add_argument("--step-length", type=float, default=None, help="--step-length de SUMO")
+    parser.add_argument("--horizon", type=float, default=None, help="Cortar la simulación en este tiempo (s)")
+    parser.add_argument("--backend", choices=["traci", "libsumo"], default="traci")
+    parser.add_argument("--out", type=str, default=None, help="CSV de salida (default: telemetry_{N}_arista.csv)")
+    args = parser.parse_args()
+
+    sc = find_scenario(args.arista)
+    out = args.out or f"telemetry_{args.arista}_arista.csv"
+    print_summary(run_telemetry(sc["net"], sc["route"], out, flows=args.flows, step_length=args.step_length,
+                                horizon=args.horizon, backend=args.backend))
+    print(f"Telemetría por vehículo -> {out}")
@@ -0,0 +1,6 @@
+# conftest.py
+import os
+import sys
+
+# Los módulos viven sueltos en "arista 1" (se corren desde esa carpeta); los tests los importan igual
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
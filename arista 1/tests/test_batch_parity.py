@@ -0,0 +1,70 @@
+# test_batch_parity.py
+import csv
+import shutil
+
+import pytest
+
+from genome_layout import build_layout
+from scenarios import discover_scenarios
+from sim_eval import evaluate_genome
+from warm_start import ensure_warm_state
+
+# El modo batch (batch_eval.py) lee contadores de detectores en vez de muestrear cada paso: las filas
+# por TLS deben coincidir con las de TraCI en estructura y quedar cerca en las métricas
+
+pytestmark = pytest.mark.skipif(shutil.which("sumo") is None, reason="requiere el binario sumo")
+
+SCENARIOS = discover_scenarios()
+HORIZON = 300
+WARMUP = 120
+# Columnas que deben ser idénticas entre modos
+EXACT = ("run_id", "tls", "fidelity", "phase_durations", "seed")
+# Tolerancias relativas: el laneData reparte el paso en que un vehículo cruza el borde del carril y
+# el E2 cuenta lo que ocupa el detector
+QUEUE_REL = 0.05
+WAIT_REL = 0.02
+COUNT_REL = 0.03
+
+
+def _rows(path):
+    with open(path, newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def _evaluate_both(tmp_path, monkeypatch, name, layout, genome, state_file=None):
+    monkeypatch.chdir(tmp_path)
+    sc = SCENARIOS[name]
+    if genome is None:
+        genome = build_layout(sc["net"]).default_genome()
+    for mode in ("traci", "batch"):
+        evaluate_genome(genome, sc["net"], sc["route"], f"p_{mode}", "r", mode=mode, horizon=HORIZON,
+                        layout=layout, state_file=state_file)
+    traci_rows, batch_rows = _rows("per_tls_p_traci_r.csv"), _rows("per_tls_p_batch_r.csv")
+    assert len(batch_rows) == len(traci_rows)
+    for batch, traci in zip(batch_rows, traci_rows):
+        assert {k: batch[k] for k in EXACT} == {k: traci[k] for k in EXACT}
+    return batch_rows, traci_rows
+
+
+@pytest.mark.parametrize("layout, genome", [("cyclic", [20, 3, 6, 3, 50, 3, 15, 40]), ("topology", None)])
+@pytest.mark.parametrize("name", list(SCENARIOS))
+def test_batch_matches_traci(tmp_path, monkeypatch, name, layout, genome):
+    batch_rows, traci_rows = _evaluate_both(tmp_path, monkeypatch, name, layout, genome)
+    for batch, traci in zip(batch_rows, traci_rows):
+        assert batch["vehicle_count_tls"] == traci["vehicle_count_tls"]
+        assert float(batch["avg_queue_tls"]) == pytest.approx(float(traci["avg_queue_tls"]), rel=QUEUE_REL)
+        assert float(batch["avg_wait_tls"]) == pytest.approx(float(traci["avg_wait_tls"]), rel=WAIT_REL)
+
+
+@pytest.mark.parametrize("name", list(SCENARIOS))
+def test_batch_matches_traci_from_warm_state(tmp_path, monkeypatch, name):
+    # El cambio de fase agendado en el snapshot debe caer en el mismo instante que en TraCI (con el
+    # programa desfasado la cola se aleja bastante más que QUEUE_REL). La espera no se compara: los E2
+    # arrancan en el snapshot y no ven lo que los vehículos detenidos ya llevaban esperando
+    sc = SCENARIOS[name]
+    state_file = ensure_warm_state(sc["net"], sc["route"], WARMUP, state_dir=str(tmp_path / "state"))
+    batch_rows, traci_rows = _evaluate_both(tmp_path, monkeypatch, name, "cyclic", [20, 3, 6, 3, 50, 3, 15, 40],
+                                            state_file)
+    for batch, traci in zip(batch_rows, traci_rows):
+        assert float(batch["avg_queue_tls"]) == pytest.approx(float(traci["avg_queue_tls"]), rel=QUEUE_REL)
+        assert float(batch["vehicle_count_tls"]) == pytest.approx(float(traci["vehicle_count_tls"]), rel=COUNT_REL)
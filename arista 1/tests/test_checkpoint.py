@@ -0,0 +1,39 @@
+# test_checkpoint.py
+import os
+import pickle
+
+import pytest
+
+import checkpoint
+from checkpoint import checkpoint_path, load_checkpoint, save_checkpoint, CHECKPOINT_VERSION
+
+
+def test_save_load_round_trip(tmp_path):
+    path = checkpoint_path("s", "r", str(tmp_path / "ck"))
+    save_checkpoint(path, {"generation": 3, "population": [[10, 20]]})
+    state = load_checkpoint(path)
+    assert state == {"generation": 3, "population": [[10, 20]], "version": CHECKPOINT_VERSION}
+    assert os.listdir(tmp_path / "ck") == ["ga_s_r.pkl"]
+
+
+def test_interrupted_save_keeps_previous_checkpoint(tmp_path, monkeypatch):
+    path = str(tmp_path / "ga_s_r.pkl")
+    save_checkpoint(path, {"generation": 1})
+
+    def broken_dump(*args, **kwargs):
+        raise OSError("disco lleno")
+
+    monkeypatch.setattr(checkpoint.pickle, "dump", broken_dump)
+    with pytest.raises(OSError):
+        save_checkpoint(path, {"generation": 2})
+    monkeypatch.undo()
+    assert load_checkpoint(path)["generation"] == 1
+
+
+def test_load_rejects_other_version(tmp_path):
+    path = tmp_path / "ga_s_r.pkl"
+    path.write_bytes(pickle.dumps({"generation": 1, "version": CHECKPOINT_VERSION + 1}))
+    with pytest.raises(ValueError):
+        load_checkpoint(str(path))
+    with pytest.raises(FileNotFoundError):
+        load_checkpoint(str(tmp_path / "missing.pkl"))
@@ -0,0 +1,97 @@
+# test_cross_analysis.py
+import csv
+import glob
+import json
+import shutil
+
+import numpy as np
+import pytest
+
+from cross_analysis import (analyze_all, load_tables, convergence_curves, load_baselines, run_default_baselines,
+                            _group_percentiles, PERCENTILES, BASELINE_DIR)
+from genome_layout import build_layout
+from scenarios import find_scenario
+from sim_eval import RESULTS_FIELDS
+
+
+def _write_csv(path, fieldnames, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def _eval_rows(scenario, run_id, fitnesses):
+    return [{"scenario": scenario, "run_id": run_id, "fitness": fit, "eval_time": 1.0, "status": "ok",
+             "fidelity": "full"} for fit in fitnesses]
+
+
+def _generational_summary(path, scenario, run_id, bests):
+    _write_csv(path, ["scenario", "run_id", "generation", "best_fitness", "mean_fitness", "std_fitness"],
+               [{"scenario": scenario, "run_id": run_id, "generation": g, "best_fitness": b, "mean_fitness": b,
+                 "std_fitness": 0} for g, b in enumerate(bests, start=1)])
+
+
+def _steady_summary(path, scenario, run_id, bests):
+    _write_csv(path, ["scenario", "run_id", "evaluations", "best_fitness", "mean_fitness", "std_fitness",
+                      "elapsed_sec"],
+               [{"scenario": scenario, "run_id": run_id, "evaluations": 4 * i, "best_fitness": b, "mean_fitness": b,
+                 "std_fitness": 0, "elapsed_sec": i} for i, b in enumerate(bests, start=1)])
+
+
+@pytest.mark.parametrize("steady_name", ["steady_summary_s_ss.csv", "summary_s_ss.csv"])
+def test_analysis_over_mixed_summaries(tmp_path, steady_name):
+    # Corrida generacional + steady-state, con el nombre actual y con el summary_* de corridas anteriores
+    _write_csv(tmp_path / "resultados_eval_1_s.csv", RESULTS_FIELDS,
+               _eval_rows("s", "gen", [1, 2, 3]) + _eval_rows("s", "ss", [4, 5]))
+    _generational_summary(tmp_path / "summary_s_gen.csv", "s", "gen", [10, 20, 30])
+    _steady_summary(tmp_path / steady_name, "s", "ss", [15, 25, 35, 45])
+
+    result = analyze_all(str(tmp_path), baselines={}, use_cache=False)
+
+    curve = [(r["generation"], r["runs"], r["mean_best"]) for r in result["convergence"]]
+    assert curve == [(1, 1, 10), (2, 1, 20), (3, 1, 30)]
+    assert result["scenarios"][0]["evaluations"] == 5
+
+
+def test_convergence_forward_fills_short_runs(tmp_path):
+    _generational_summary(tmp_path / "summary_s_a.csv", "s", "a", [10, 20, 30, 40])
+    _generational_summary(tmp_path / "summary_s_b.csv", "s", "b", [0, 50])
+
+    rows = convergence_curves(load_tables(str(tmp_path), use_cache=False))
+
+    assert [r["runs"] for r in rows] == [2, 2, 2, 2]
+    # La corrida b se extiende con su último valor (50) en las generaciones 3 y 4
+    assert [r["mean_best"] for r in rows] == [5, 35, 40, 45]
+    assert [r["p50_best"] for r in rows] == [5, 35, 40, 45]
+
+
+def test_group_percentiles_match_numpy():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=200)
+    values[::17] = np.nan
+    inverse = rng.integers(0, 5, size=200)
+    inverse[inverse == 3] = 4  # grupo 3 sin filas
+
+    out = _group_percentiles(values, inverse, 6)
+
+    for g in range(6):
+        group = values[(inverse == g) & ~np.isnan(values)]
+        if len(group):
+            assert np.allclose(out[g], np.percentile(group, PERCENTILES))
+        else:
+            assert np.isnan(out[g]).all()
+
+
+@pytest.mark.skipif(shutil.which("sumo") is None, reason="requiere el binario sumo")
+def test_default_baselines_use_each_net_program(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    baselines = run_default_baselines(aristas=[1, 2], horizon=60, outdir=str(tmp_path / BASELINE_DIR))
+
+    assert set(baselines) == {"1_arista", "2_arista"}
+    assert load_baselines(str(tmp_path)) == baselines
+    with open(glob.glob(str(tmp_path / BASELINE_DIR / "baseline_default_*.csv"))[0], newline="") as f:
+        genomes = {r["scenario"]: json.loads(r["genome"]) for r in csv.DictReader(f)}
+    for name, genome in genomes.items():
+        sc = find_scenario(int(name.split("_")[0]))
+        assert genome == build_layout(sc["net"]).default_genome()
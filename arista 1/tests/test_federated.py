@@ -0,0 +1,28 @@
+# test_federated.py
+from federated import executed_evaluations, fedavg, round_seed
+from sim_eval import RESULTS_FIELDS
+from test_cross_analysis import _eval_rows, _write_csv
+
+
+def test_round_seed_differs_per_client_and_round():
+    seeds = {round_seed(42, client, r) for client in ("1_arista", "2_arista") for r in (1, 2, 3)}
+    assert len(seeds) == 6
+    assert round_seed(42, "1_arista", 1) == round_seed(42, "1_arista", 1)
+    assert round_seed(7, "1_arista", 1) != round_seed(42, "1_arista", 1)
+
+
+def test_executed_evaluations_counts_rows_of_the_round(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert executed_evaluations("s", "run_r1") == 0
+    _write_csv(tmp_path / "resultados_eval_1_s.csv", RESULTS_FIELDS,
+               _eval_rows("s", "run_r1", [1, 2, 3]) + _eval_rows("s", "run_r2", [4]))
+    assert executed_evaluations("s", "run_r1") == 3
+    assert executed_evaluations("s", "run_r2") == 1
+
+
+def test_fedavg_ignores_clients_without_executed_evaluations():
+    params = {"a": [10, 20]}
+    other = {"a": [30, 40]}
+    assert fedavg([(3, params), (1, other)], length=2) == [15, 25]
+    # Todo acierto de cache: el cliente no pesa y los genes sin peso conservan el modelo anterior
+    assert fedavg([(0, other)], previous=[11, 22], length=2) == [11, 22]
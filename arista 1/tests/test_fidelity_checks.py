@@ -0,0 +1,22 @@
+# test_fidelity_checks.py
+import pytest
+
+from ga_opt import run_ga_optimization
+from scenarios import find_scenario
+from sim_eval import evaluate_genome, SumoEvaluator
+
+
+def test_meso_rejects_micro_warm_state():
+    with pytest.raises(ValueError, match="mesosim"):
+        evaluate_genome([30] * 8, "net.xml", "rou.xml", "s", "r", state_file="warm.xml.gz", fidelity="meso")
+    sc = find_scenario(1)
+    evaluator = SumoEvaluator(sc["net"], sc["route"], "s", "r", state_file="warm.xml.gz")
+    with pytest.raises(ValueError, match="mesosim"):
+        evaluator.evaluate([30] * 8, fidelity="meso")
+
+
+def test_ga_rejects_meso_screening_with_warmup(tmp_path):
+    # Se valida antes de generar el snapshot o lanzar SUMO
+    with pytest.raises(ValueError, match="warmup"):
+        run_ga_optimization(4, 1, "net.xml", "rou.xml", "s", "r", screen_fidelity="meso", warmup=100,
+                            state_dir=str(tmp_path), cache_db=None, results_db=None)
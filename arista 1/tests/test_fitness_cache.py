@@ -0,0 +1,44 @@
+# test_fitness_cache.py
+import sqlite3
+
+from fitness_cache import FitnessCache
+
+
+def _disk_genomes(path):
+    with sqlite3.connect(path) as db:
+        return sorted(row[0] for row in db.execute("SELECT genome FROM fitness"))
+
+
+def test_disk_eviction_keeps_most_recent(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = FitnessCache("s", db_path=path, max_disk=3)
+    for g in range(5):
+        cache.put([g], float(g))
+    cache.put([4], 40.0)  # reemplazo: no suma filas
+    assert cache._disk_rows == 3
+    assert _disk_genomes(path) == ["[2]", "[3]", "[4]"]
+    cache.close()
+
+    reopened = FitnessCache("s", db_path=path, max_disk=3)
+    assert reopened._disk_rows == 3
+    assert reopened.get([4]) == 40.0
+    assert reopened.get([0]) is None
+    assert reopened.counters() == {"cache_hits": 1, "cache_misses": 1}
+    reopened.close()
+
+
+def test_eviction_recounts_rows_from_other_processes(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    a = FitnessCache("a", db_path=path, max_disk=4)
+    b = FitnessCache("b", db_path=path, max_disk=4)
+    for g in range(3):
+        a.put([g], 1.0)
+    for g in range(4):
+        b.put([g], 2.0)
+    # b solo cuenta sus filas: el límite se revisa cuando su conteo lo pasa y ahí se recuenta todo
+    assert len(_disk_genomes(path)) == 7
+    b.put([4], 2.0)
+    assert len(_disk_genomes(path)) == 4
+    assert b._disk_rows == 4
+    a.close()
+    b.close()
@@ -0,0 +1,29 @@
+# test_ga_replication.py
+import csv
+
+import ga_opt
+from ga_opt import run_ga_optimization
+from replication import DEFAULT_SUMO_SEED
+from scenarios import find_scenario
+
+
+def _fake_evaluate(genome, seed=None, **kwargs):
+    # Fitness determinado por el genoma más un ruido chico por semilla
+    noise = 0.01 * ((seed or DEFAULT_SUMO_SEED) - DEFAULT_SUMO_SEED)
+    return -float(sum(abs(g - 35) for g in genome)) + noise, "ok"
+
+
+def test_best_genome_stops_early(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ga_opt, "evaluate_genome", _fake_evaluate)
+    sc = find_scenario(1)
+    run_ga_optimization(6, 1, sc["net"], sc["route"], "s", "rep", cache_db=None, results_db=None,
+                        checkpoint_every=None, replications=5, min_replications=2)
+
+    with open("replications_s_rep.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    best = max(rows, key=lambda r: float(r["mean"]))
+    # Comparado con los demás genomas, no con su propia media: queda "better" con el mínimo de réplicas
+    assert best["decision"] == "better"
+    assert int(best["replications"]) == 2
+    assert all(int(r["replications"]) == 2 for r in rows)
@@ -0,0 +1,29 @@
+# test_genome_layout.py
+import numpy as np
+
+from genome_layout import build_layout, genome_bounds, GREEN_BOUNDS
+from scenarios import find_scenario
+from surrogate import SurrogateModel, _features
+
+
+def test_build_layout_cache_keyed_by_options():
+    net = find_scenario(1)["net"]
+    default = build_layout(net)
+    wide = build_layout(net, green_bounds=(5, 90))
+
+    assert build_layout(net) is default
+    assert wide is not default
+    assert GREEN_BOUNDS in default.bounds and (5, 90) not in default.bounds
+    assert (5, 90) in wide.bounds
+    assert genome_bounds(net, "topology", green_bounds=(5, 90)) == wide.bounds
+
+
+def test_surrogate_normalizes_with_layout_bounds():
+    bounds = [(10, 60), (3, 20)]
+    x = _features([[10, 3], [60, 20], [35, 11.5]], bounds)[:, 1:3]
+    assert np.allclose(x, [[0, 0], [1, 1], [0.5, 0.5]])
+
+    genomes = [[a, b] for a in range(10, 61, 10) for b in range(3, 21, 3)]
+    fitness = [-(a - 40) ** 2 - 10 * (b - 9) ** 2 for a, b in genomes]
+    mean, std = SurrogateModel(bounds, seed=0).fit(genomes, fitness).predict([[40, 9], [10, 20]])
+    assert mean[0] > mean[1]
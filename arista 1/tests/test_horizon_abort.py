@@ -0,0 +1,57 @@
+# test_horizon_abort.py
+import csv
+import os
+import shutil
+
+import pytest
+
+from scenarios import find_scenario
+from sim_eval import evaluate_genome
+
+pytestmark = pytest.mark.skipif(shutil.which("sumo") is None, reason="requiere el binario sumo")
+
+GENOME = [20, 3, 6, 3, 50, 3, 15, 40]
+
+
+def _evaluate(tmp_path, monkeypatch, run_id, **kwargs):
+    monkeypatch.chdir(tmp_path)
+    sc = find_scenario(1)
+    result = evaluate_genome(GENOME, sc["net"], sc["route"], "h", run_id, with_status=True, **kwargs)
+    with open("resultados_eval_1_h.csv", newline="") as f:
+        row = [r for r in csv.DictReader(f) if r["run_id"] == run_id][-1]
+    return result, row
+
+
+def test_horizon_bounds_simulated_time(tmp_path, monkeypatch):
+    (fitness, status), row = _evaluate(tmp_path, monkeypatch, "hz", horizon=100, drain=20)
+    assert status == "truncated" and row["status"] == "truncated"
+    # sim_time_sec conserva la escala del original: getTime() / 1000
+    assert float(row["sim_time_sec"]) == pytest.approx(0.120)
+    assert float(row["fitness"]) == fitness
+
+
+def test_abort_below_stops_early(tmp_path, monkeypatch):
+    (full, _), full_row = _evaluate(tmp_path, monkeypatch, "full", horizon=300)
+    # Umbral a mitad de camino entre la cota inicial (3000, acumuladores en cero) y el fitness final
+    threshold = (3000 + full) / 2
+    (fitness, status), row = _evaluate(tmp_path, monkeypatch, "abort", horizon=300, abort_below=threshold)
+
+    assert status == "aborted" and row["status"] == "aborted"
+    assert float(row["sim_time_sec"]) < float(full_row["sim_time_sec"])
+    # El fitness devuelto es una cota superior del final, ya por debajo del umbral
+    assert full <= fitness < threshold
+    # Sin filas por TLS para la corrida abortada
+    assert not os.path.exists("per_tls_h_abort.csv")
+
+
+def test_unreachable_threshold_does_not_abort(tmp_path, monkeypatch):
+    (full, _), _ = _evaluate(tmp_path, monkeypatch, "full", horizon=300)
+    (fitness, status), _ = _evaluate(tmp_path, monkeypatch, "low", horizon=300, abort_below=full - 1)
+    assert status == "truncated"
+    assert fitness == full
+
+
+def test_abort_below_requires_horizon():
+    sc = find_scenario(1)
+    with pytest.raises(ValueError):
+        evaluate_genome(GENOME, sc["net"], sc["route"], "h", "r", abort_below=0.0)
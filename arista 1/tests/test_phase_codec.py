@@ -0,0 +1,33 @@
+# test_phase_codec.py
+import pytest
+
+from phase_codec import encode_update, decode_update
+
+PARAMS = {"J1": [33, 3, 6, 3, 37, 3], "J2": [10.4, None, 60], "cluster_J3_J4": [42]}
+
+
+@pytest.mark.parametrize("compress", [False, True])
+@pytest.mark.parametrize("with_order", [False, True])
+def test_round_trip(compress, with_order):
+    order = list(PARAMS) if with_order else None
+    data = encode_update(PARAMS, round_index=7, weight=12, compress=compress, tls_order=order)
+    round_index, weight, params = decode_update(data, tls_order=order)
+    assert (round_index, weight) == (7, 12)
+    # Duraciones cuantizadas a enteros; None viaja como "sin dato"
+    assert params == {"J1": [33, 3, 6, 3, 37, 3], "J2": [10, None, 60], "cluster_J3_J4": [42]}
+
+
+def test_delta_round_trip_with_fallback():
+    reference = {"J1": [30, 3, 6, 3, 40, 3], "J2": [10, 20, 30], "cluster_J3_J4": [200]}
+    params = dict(PARAMS, cluster_J3_J4=[10])  # diferencia -190: no entra en int8, cae a uint8
+    data = encode_update(params, 2, 5, reference=reference, delta=True, compress=True)
+    _, _, decoded = decode_update(data, reference=reference)
+    assert decoded == {"J1": [33, 3, 6, 3, 37, 3], "J2": [10, None, 60], "cluster_J3_J4": [10]}
+
+
+def test_missing_tls_order_and_bad_magic():
+    data = encode_update(PARAMS, tls_order=list(PARAMS))
+    with pytest.raises(ValueError):
+        decode_update(data)
+    with pytest.raises(ValueError):
+        decode_update(b"XX" + data[2:], tls_order=list(PARAMS))
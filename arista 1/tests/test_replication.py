@@ -0,0 +1,33 @@
+# test_replication.py
+import math
+
+import numpy as np
+import pytest
+
+from replication import confidence_interval, decide, t_quantile
+
+
+@pytest.mark.parametrize("confidence, df, expected", [(0.95, 1, 12.706), (0.95, 4, 2.776), (0.99, 10, 3.169),
+                                                      (0.95, 30, 2.042), (0.90, 60, 1.671)])
+def test_t_quantile(confidence, df, expected):
+    # df > 10 usa Cornish-Fisher: valores de tabla con 3 decimales
+    assert t_quantile(confidence, df) == pytest.approx(expected, abs=2e-3)
+
+
+def test_confidence_interval():
+    values = [10.0, 12.0, 14.0, 16.0, 18.0]
+    mean, std, half = confidence_interval(values, 0.95)
+    assert mean == 14.0
+    assert std == pytest.approx(np.std(values, ddof=1))
+    assert half == pytest.approx(2.776 * std / math.sqrt(5))
+    assert confidence_interval([3.0]) == (3.0, 0.0, math.inf)
+
+
+def test_decide():
+    tight = [100.0, 101.0, 99.0]  # media 100, semiancho 4.303 * 1 / sqrt(3) ~ 2.48
+    assert decide(tight[:1], 0.0) is None  # menos de min_replications
+    assert decide(tight, None) == "min"
+    assert decide(tight, 97.0) == "better"
+    assert decide(tight, 103.0) == "worse"
+    assert decide(tight, 99.0) is None  # el intervalo contiene al incumbente: otra réplica
+    assert decide(tight, 99.0, max_replications=3) == "max"
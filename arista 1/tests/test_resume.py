@@ -0,0 +1,55 @@
+# test_resume.py
+import pytest
+
+import ga_opt
+from ga_opt import run_ga_optimization
+from results_store import ResultsStore
+from scenarios import find_scenario
+
+
+class _Interrupted(Exception):
+    pass
+
+
+def _fake_evaluator(fail_after=None):
+    def evaluate(genome, scenario, run_id, store=None, **kwargs):
+        # Corte en la primera evaluación después de que la generación fail_after llegó al store
+        if fail_after is not None and any(g["generation"] == fail_after for g in store.generations(scenario, run_id)):
+            raise _Interrupted()
+        fitness = 3000.0 - sum(abs(g - 35) for g in genome)  # positivo, como el real (selRoulette)
+        store.add_evaluation({"scenario": scenario, "run_id": run_id, "fitness": fitness, "status": "ok",
+                              "fidelity": "full"}, (), genome)
+        return fitness, "ok"
+    return evaluate
+
+
+def _run(tmp_path, run_id, **kwargs):
+    sc = find_scenario(1)
+    return run_ga_optimization(10, 5, sc["net"], sc["route"], "s", run_id, cache_db=None,
+                               results_db=str(tmp_path / "r.sqlite"), checkpoint_every=2,
+                               checkpoint_dir=str(tmp_path / "ck"), **kwargs)
+
+
+def _stored(tmp_path, run_id):
+    store = ResultsStore(str(tmp_path / "r.sqlite"))
+    try:
+        return ([(r["fitness"]) for r in store.evaluations("s", run_id)],
+                [(r["generation"], r["best_fitness"]) for r in store.generations("s", run_id)])
+    finally:
+        store.close()
+
+
+def test_resume_does_not_duplicate_store_rows(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ga_opt, "evaluate_genome", _fake_evaluator())
+    expected = _run(tmp_path, "straight")
+
+    # Corte en la generación 4: la 3 ya está en el store pero el último checkpoint es el de la 2
+    monkeypatch.setattr(ga_opt, "evaluate_genome", _fake_evaluator(fail_after=3))
+    with pytest.raises(_Interrupted):
+        _run(tmp_path, "cut")
+    assert [g for g, _ in _stored(tmp_path, "cut")[1]] == [1, 2, 3]
+    monkeypatch.setattr(ga_opt, "evaluate_genome", _fake_evaluator())
+    assert _run(tmp_path, "cut", resume=True) == expected
+
+    assert _stored(tmp_path, "cut") == _stored(tmp_path, "straight")
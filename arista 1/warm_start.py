@@ -0,0 +1,49 @@
+# warm_start.py
+import os
+
+from fitness_cache import scenario_key
+from sim_eval import start_backend, resolve_backend
+
+# Snapshot de warm-up por escenario: se simulan una sola vez los primeros `warmup` segundos
+# (programa TLS original) y se guarda con saveState. Cada evaluación hace loadState del snapshot
+# en vez de re-simular el llenado de la red desde t=0.
+# El nombre del archivo incluye el hash del contenido de net/route, así que si cambian
+# se genera un snapshot nuevo.
+
+
+def warm_state_path(net_file, route_file, warmup, state_dir="state_cache"):
+    key = scenario_key(net_file, route_file, {"warmup": float(warmup)})
+    return os.path.join(state_dir, f"warm_{key[:16]}_{int(warmup)}s.xml.gz")
+
+
+def ensure_warm_state(net_file, route_file, warmup, sumo_binary="sumo", backend="traci", state_dir="state_cache"):
+    """Retorna la ruta del snapshot de warm-up, generándolo si no existe en disco."""
+    path = warm_state_path(net_file, route_file, warmup, state_dir)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(state_dir, exist_ok=True)
+    # El warm-up no necesita GUI
+    if "sumo-gui" in os.path.basename(sumo_binary):
+        sumo_binary = "sumo"
+    backend = resolve_backend(backend, sumo_binary)
+    logfile = os.path.join(state_dir, os.path.basename(path).replace(".xml.gz", ".log"))
+    sumoCmd = [
+        sumo_binary,
+        "-n", net_file,
+        "-r", route_file,
+        "--no-step-log",
+        "--log-file", logfile
+    ]
+
+    # Se escribe a un temporal y se renombra para que un snapshot a medio escribir nunca se use
+    tmp_path = f"{path}.{os.getpid()}.tmp.xml.gz"
+    conn = start_backend(sumoCmd, backend)
+    try:
+        conn.simulationStep(float(warmup))
+        conn.simulation.saveState(tmp_path)
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    print(f"Snapshot de warm-up ({warmup}s) guardado en {path}")
+    return path
@@ -2,18 +2,24 @@
 # Step 1: Add modules
 import os
 import sys
+import shutil
+import argparse
 import traceback
 
+HERE = os.path.dirname(os.path.abspath(__file__))
+
 # Step 2: Establish path to SUMO (SUMO_HOME) and tools
+# NUEVO: SUMO_HOME ya no es obligatorio si traci se puede importar (pip install traci / sumo en PATH)
 SUMO_HOME = os.environ.get("SUMO_HOME")
-if not SUMO_HOME:
-    sys.exit("Please declare environment variable 'SUMO_HOME' (path to SUMO installation).")
+if SUMO_HOME:
+    tools = os.path.join(SUMO_HOME, "tools")
+    if os.path.isdir(tools):
+        sys.path.append(tools)  # needed so Python encuentre traci si viene con SUMO
+    else:
+        print("WARNING: SUMO/tools not found in SUMO_HOME. If traci import fails, add it to PYTHONPATH.")
 
-tools = os.path.join(SUMO_HOME, "tools")
-if os.path.isdir(tools):
-    sys.path.append(tools)  # needed so Python encuentre traci si viene con SUMO
-else:
-    print("WARNING: SUMO/tools not found in SUMO_HOME. If traci import fails, add it to PYTHONPATH.")
+# NUEVO: la telemetría de flota vive en "arista 1" junto al resto de los módulos compartidos
+sys.path.append(os.path.join(os.path.dirname(HERE), "arista 1"))
 
 # Step 3: Add Traci
 try:
@@ -22,26 +28,40 @@ except Exception:
     print("ERROR importing traci. Check SUMO_HOME and that 'tools' is in sys.path.")
     raise
 
+from telemetry import FleetTelemetry, print_summary
+
+# NUEVO: opciones de línea de comandos (antes se seguía un solo vehículo con prefijo fijo "veh1")
+parser = argparse.ArgumentParser()
+parser.add_argument("--flows", type=str, nargs="*", default=None,
+                    help="Flujos a seguir, p.ej. veh1 veh3 (default: todos los vehículos)")
+parser.add_argument("--out", type=str, default="telemetry_2_arista.csv", help="CSV con una fila por vehículo")
+parser.add_argument("--horizon", type=float, default=None, help="Cortar la simulación en este tiempo (s)")
+parser.add_argument("--gui", action="store_true", help="Usar sumo-gui")
+args = parser.parse_args()
+
 # Step 4: Define Sumo configuration (build full command to avoid connection issues)
-# Change this path if your sumocfg is elsewhere (use raw string r"...")
-SUMOCFG = r"C:\Users\oswal\Desktop\ITLA\IA Distribuida\sumo-federado\arista 2/simulacion_arista2.sumocfg"
+# NUEVO: el sumocfg se busca junto a este script en vez de una ruta absoluta de Windows
+SUMOCFG = os.path.join(HERE, "simulacion_arista2.sumocfg")
 
 # find sumo binary
-sumo_gui = os.path.join(SUMO_HOME, "bin", "sumo-gui.exe")
-sumo_cli = os.path.join(SUMO_HOME, "bin", "sumo.exe")
-if os.path.exists(sumo_gui):
-    sumo_bin = sumo_gui
-elif os.path.exists(sumo_cli):
-    sumo_bin = sumo_cli
-else:
-    sys.exit("No sumo binary found in SUMO_HOME/bin. Check your installation.")
+# NUEVO: SUMO_HOME/bin (con o sin .exe) y si no, el binario en PATH
+names = ["sumo-gui", "sumo"] if args.gui else ["sumo"]
+candidates = []
+for name in names:
+    if SUMO_HOME:
+        candidates += [os.path.join(SUMO_HOME, "bin", name + ".exe"), os.path.join(SUMO_HOME, "bin", name)]
+    candidates.append(shutil.which(name))
+sumo_bin = next((c for c in candidates if c and os.path.exists(c)), None)
+if sumo_bin is None:
+    sys.exit("No sumo binary found in SUMO_HOME/bin or PATH. Check your installation.")
 
 # build command (you can add --remote-port "8813" if you prefer connecting to a running SUMO)
 Sumo_config = [
     sumo_bin,
     "-c", SUMOCFG,
     "--step-length", "0.05",
-    "--lateral-resolution", "0.1"
+    "--lateral-resolution", "0.1",
+    "--no-step-log",
 ]
 
 # Step 5: Open connection between SUMO and Traci
@@ -54,53 +74,27 @@ except Exception:
     sys.exit(1)
 
 # Step 6: Define Variables
-vehicle_speed = 0.0
-total_speed = 0.0
-tracked = None
-samples = 0
+# NUEVO: FleetTelemetry reemplaza a update_speed: suscribe cada vehículo al salir (lo suelta al llegar),
+# acumula velocidad, detenciones y time loss en arreglos y escribe el CSV en lotes, sin prints por paso
+telemetry = FleetTelemetry(traci, flows=args.flows, out_file=args.out)
+summary = {}
 
-# Step 7: Define Functions
-def update_speed(tracked_id, total_speed, samples, flow_prefix="veh1"):
-    vehs = traci.vehicle.getIDList()
-    # si no tenemos tracked, buscar el primer veh que empiece por el prefijo
-    if not tracked_id and vehs:
-        candidates = [v for v in vehs if v.startswith(flow_prefix)]
-        if candidates:
-            tracked_id = candidates[0]
-            print(f"Siguiendo vehículo (prefijo='{flow_prefix}'): {tracked_id}")
-
-    # si hay tracked y aún está en la simulación, leer su velocidad y acumular
-    if tracked_id and tracked_id in vehs:
-        try:
-            vs = traci.vehicle.getSpeed(tracked_id)
-            total_speed += vs
-            samples += 1
-            print(f"Vehicle {tracked_id} → speed = {vs:.3f} m/s (acum={samples})")
-        except Exception as e:
-            print("Error leyendo velocidad:", e)
-    else:
-        # opcional: cuando tracked desaparece, lo reseteamos para buscar otro
-        if tracked_id and tracked_id not in vehs:
-            print(f"El vehículo {tracked_id} ya no está en la simulación.")
-            tracked_id = None
-
-    return tracked_id, total_speed, samples
-
-# Step 8: Simulation loop
+# Step 7: Simulation loop
 try:
     while traci.simulation.getMinExpectedNumber() > 0:
+        if args.horizon is not None and telemetry.now >= args.horizon:
+            break
         traci.simulationStep()
-        tracked, total_speed, samples = update_speed(tracked, total_speed, samples, flow_prefix="veh1")
+        telemetry.step()
+    summary = telemetry.close()
 finally:
-    # Step 9: Close connection
+    # Step 8: Close connection
     traci.close()
     print("TraCI closed.")
 
-# Resultado final (evita división por cero)
-if samples > 0:
-    print(f"Average observed speed for tracked samples: {total_speed/samples:.3f} m/s over {samples} samples")
+# Resultado final: un resumen por flujo de los vehículos que llegaron
+if summary:
+    print_summary(summary)
+    print(f"Telemetría por vehículo ({telemetry.written} filas) -> {args.out}")
 else:
-    print("No speed samples were collected.")
-
-
-    
\ No newline at end of file
+    print("No vehicle arrived; no telemetry summary.")